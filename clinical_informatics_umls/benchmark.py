@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmark of the pipeline against a synthetic release (see
+synthetic_release.py) - no UMLS license required.
+
+Stages (STAGES, run in order):
+    - generate                    : synthetic_release.generate_release()
+    - create_db                   : create_sqlite_db.create_db(bulk=True)
+    - extract_nodes_edges         : nodes_edges_part1 streaming export
+    - extract_nodes_edges_pandas  : nodes_edges_part1 pandas export
+    - create_nodes_edges          : every create_nodes_edges.SQLite.get_*()
+    - explode_mrhier              : edges_part2.stream_explode_mrhier()
+    - explode_mrhier_pandas       : edges_part2.explode_write_mrhier()
+Each stage runs within a fresh (spawned) process - modules being imported
+before the clock starts - from a work directory laid out as the scripts expect
+(<work>/run as working directory, <work>/sqlite, <work>/import &
+<work>/UMLS/synthetic/META), recording its wall time, rows processed, rows/s &
+peak resident memory (of the process & its workers).
+
+Results can be saved as a baseline (JSON) & later runs compared against it -
+a stage regresses when its rows/s drops, or its peak memory grows, by more
+than `tolerance` (exit status 1).
+
+Invoke via (the baseline defaults to ../output_data/benchmark_baseline.json):
+`python benchmark.py --atoms 100000 --save-baseline`
+`python benchmark.py --atoms 100000 --baseline`
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from clinical_informatics_umls import create_sqlite_db, nodes_edges_part1
+from clinical_informatics_umls.create_nodes_edges import SQLite
+from clinical_informatics_umls.edges_part2 import (
+    explode_write_mrhier,
+    read_transform_mrhier,
+    stream_explode_mrhier,
+)
+from clinical_informatics_umls.synthetic_release import generate_release
+
+baseline_path = "../output_data/benchmark_baseline.json"
+
+# Stages run by default (the pandas variants hold whole tables in memory)
+DEFAULT_STAGES = (
+    "generate",
+    "create_db",
+    "extract_nodes_edges",
+    "create_nodes_edges",
+    "explode_mrhier",
+)
+
+# Relative drop of rows/s (or growth of peak memory) flagged as a regression
+TOLERANCE = 0.25
+
+# Paths relative to the working directory of the stages (<work>/run)
+META_DIR = "../UMLS/synthetic/META/"
+IMPORT_DIR = "../import/"
+
+# Output files of the export stages
+EXTRACT_FILES = (
+    "semanticTypeNode.csv",
+    "conceptNode.csv",
+    "atomNode.csv",
+    "codeNode.csv",
+    "has_sty_rel.csv",
+    "has_aui_rel.csv",
+    "has_cui_rel.csv",
+    "tui_tui_rel.csv",
+    "concept_concept_rel.csv",
+    "child_of_rel.csv",
+    "cui_code_rel.csv",
+)
+SQLITE_FILES = (
+    "cuiNodes.csv",
+    "auiNodes.csv",
+    "styNodes.csv",
+    "codeNodes.csv",
+    "has_aui.csv",
+    "has_cui.csv",
+    "has_sty.csv",
+    "parent_child_rels.csv",
+    "cui_code_rel.csv",
+    "cui_cui_rel.csv",
+)
+
+
+def count_lines(paths, header: bool = True) -> int:
+    """
+    Summary:
+    --------
+    Number of rows of the (existing) files of `paths`, less one header line
+    per file when `header`.
+
+    """
+    rows = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            rows += sum(
+                block.count(b"\n") for block in iter(lambda: f.read(1 << 20), b"")
+            )
+        rows -= int(header)
+    return rows
+
+
+def run_generate(atoms: int, seed: int, workers: int):
+    generate_release(META_DIR, atoms, seed)
+
+
+def count_meta() -> int:
+    return count_lines(glob.glob(os.path.join(META_DIR, "*")), header=False)
+
+
+def run_create_db(atoms: int, seed: int, workers: int):
+    if os.path.exists("../sqlite/umls_py.db"):
+        os.remove("../sqlite/umls_py.db")
+    create_sqlite_db.umls_tables = META_DIR
+    create_sqlite_db.create_db(bulk=True, workers=workers)
+
+
+def run_extract(atoms: int, seed: int, workers: int, streaming: bool = True):
+    nodes_edges_part1.import_dir = IMPORT_DIR
+    if streaming:
+        nodes_edges_part1.extract_nodes_edges(
+            "../sqlite/", "umls_py.db", streaming=True, workers=workers
+        )
+        return
+    # the pandas export writes to ../../../../import/ -> <work>/import/ when
+    # run from <work>/run/a/b/c
+    os.makedirs("a/b/c", exist_ok=True)
+    os.chdir("a/b/c")
+    try:
+        nodes_edges_part1.extract_nodes_edges("../../../../sqlite/", "umls_py.db")
+    finally:
+        os.chdir("../../..")
+
+
+def run_extract_pandas(atoms: int, seed: int, workers: int):
+    run_extract(atoms, seed, workers, streaming=False)
+
+
+def count_extract() -> int:
+    return count_lines(os.path.join(IMPORT_DIR, name) for name in EXTRACT_FILES)
+
+
+def run_create_nodes_edges(atoms: int, seed: int, workers: int):
+    with SQLite(db_path="../sqlite/umls_py.db") as sqlite:
+        sqlite.get_cui_nodes()
+        sqlite.get_aui_nodes()
+        sqlite.get_sty_nodes()
+        sqlite.get_code_nodes()
+        sqlite.get_has_aui_rels()
+        sqlite.get_has_cui_rels()
+        sqlite.get_has_sty_rels()
+        sqlite.get_parent_child_rels()
+        sqlite.get_cui_code_rels()
+        sqlite.get_icdo3_code_nodes()
+        sqlite.get_concept_concept_rels(None)
+
+
+def count_create_nodes_edges() -> int:
+    return count_lines(os.path.join(IMPORT_DIR, name) for name in SQLITE_FILES)
+
+
+def run_explode(atoms: int, seed: int, workers: int):
+    stream_explode_mrhier(
+        os.path.join(META_DIR, "MRHIER.RRF"),
+        os.path.join(IMPORT_DIR, "child_of_rel_ptr.csv"),
+    )
+
+
+def run_explode_pandas(atoms: int, seed: int, workers: int):
+    # explode_write_mrhier() writes to /<root>/<home>/import/
+    root = os.path.abspath("..").lstrip(os.sep)
+    mrhier = read_transform_mrhier(os.path.join(META_DIR, "MRHIER.RRF"))
+    explode_write_mrhier(root, ".", mrhier)
+
+
+def count_explode() -> int:
+    return count_lines([os.path.join(IMPORT_DIR, "child_of_rel_ptr.csv")])
+
+
+# Stage -> (function running it, function counting the rows it processed)
+STAGES = {
+    "generate": (run_generate, count_meta),
+    "create_db": (run_create_db, count_meta),
+    "extract_nodes_edges": (run_extract, count_extract),
+    "extract_nodes_edges_pandas": (run_extract_pandas, count_extract),
+    "create_nodes_edges": (run_create_nodes_edges, count_create_nodes_edges),
+    "explode_mrhier": (run_explode, count_explode),
+    "explode_mrhier_pandas": (run_explode_pandas, count_explode),
+}
+
+
+def peak_memory_mb() -> float:
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak * scale / 2**20
+
+
+def run_stage(stage: str, work_dir: str, atoms: int, seed: int, workers: int) -> dict:
+    """
+    Summary:
+    --------
+    Run & measure one stage (within a fresh worker process, so that its peak
+    memory is its own).
+
+    """
+    os.chdir(os.path.join(work_dir, "run"))
+    run, count = STAGES[stage]
+    start = time.perf_counter()
+    run(atoms, seed, workers)
+    seconds = time.perf_counter() - start
+    rows = count()
+    return {
+        "seconds": round(seconds, 3),
+        "rows": rows,
+        "rows_per_sec": round(rows / max(seconds, 1e-9), 1),
+        "peak_mb": round(peak_memory_mb(), 1),
+    }
+
+
+def run_benchmark(
+    atoms: int = 10000,
+    seed: int = 0,
+    stages: tuple = DEFAULT_STAGES,
+    workers: int = 1,
+    work_dir: str = None,
+) -> dict:
+    """
+    Summary:
+    --------
+    Benchmark `stages` (see module docstring) against a synthetic release of
+    `atoms` atoms.
+
+    Parameters:
+    -----------
+    atoms : int.
+        Atoms (MRCONSO rows) of the synthetic release.
+    seed : int.
+        Seed of the synthetic release.
+    stages : tuple.
+        Keys of STAGES - run in the order of STAGES. Stages past "generate"
+        expect the outputs of the earlier stages within `work_dir`.
+    workers : int.
+        Worker processes of create_db & of the streaming export.
+    work_dir : str.
+        Work directory (kept) - a temporary directory (removed) when None.
+
+    Returns:
+    --------
+    results : dict.
+        Run settings & {stage: {seconds, rows, rows_per_sec, peak_mb}}.
+
+    """
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"Unknown stages {sorted(unknown)} - one of {list(STAGES)}")
+    temporary = work_dir is None
+    work_dir = os.path.abspath(work_dir or tempfile.mkdtemp(prefix="umls_bench_"))
+    for name in ("run", "sqlite", "import", "UMLS/synthetic/META"):
+        os.makedirs(os.path.join(work_dir, name), exist_ok=True)
+
+    results = {
+        "atoms": atoms,
+        "seed": seed,
+        "workers": workers,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    try:
+        for stage in [stage for stage in STAGES if stage in stages]:
+            print(f"Running {stage}")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(
+                    run_stage, stage, work_dir, atoms, seed, workers
+                ).result()
+            results["stages"][stage] = result
+            print(
+                f"\t{stage}: {result['rows']} rows in {result['seconds']:.2f}s "
+                f"({result['rows_per_sec']:,.0f} rows/sec, peak {result['peak_mb']:.0f} MiB)"
+            )
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare_results(
+    results: dict, baseline: dict, tolerance: float = TOLERANCE
+) -> list:
+    """
+    Summary:
+    --------
+    Compare the stages of `results` with those of `baseline` (recorded at the
+    same scale).
+
+    Returns:
+    --------
+    regressions : list.
+        Description of every stage whose rows/s dropped, or whose peak memory
+        grew, by more than `tolerance` - empty when there is none.
+
+    """
+    if (results["atoms"], results["seed"]) != (baseline["atoms"], baseline["seed"]):
+        raise ValueError(
+            f"baseline was recorded for {baseline['atoms']} atoms (seed "
+            f"{baseline['seed']}), not {results['atoms']} (seed {results['seed']})"
+        )
+    regressions = []
+    for stage, result in results["stages"].items():
+        reference = baseline["stages"].get(stage)
+        if reference is None:
+            continue
+        if result["rows"] != reference["rows"]:
+            print(
+                f"{stage}: {result['rows']} rows, {reference['rows']} within the "
+                "baseline (recorded with another version of the pipeline?)"
+            )
+        rate = result["rows_per_sec"] / max(reference["rows_per_sec"], 1e-9)
+        memory = result["peak_mb"] / max(reference["peak_mb"], 1e-9)
+        print(f"{stage}: {rate:.2f}x rows/sec, {memory:.2f}x peak memory")
+        if rate < 1 - tolerance:
+            regressions.append(
+                f"{stage}: {result['rows_per_sec']:,.0f} rows/sec "
+                f"(baseline {reference['rows_per_sec']:,.0f})"
+            )
+        if memory > 1 + tolerance:
+            regressions.append(
+                f"{stage}: peak {result['peak_mb']:.0f} MiB "
+                f"(baseline {reference['peak_mb']:.0f} MiB)"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="*", default=list(DEFAULT_STAGES))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--work", default=None, help="Work directory (kept)")
+    parser.add_argument("--baseline", nargs="?", const=baseline_path, default=None)
+    parser.add_argument("--save-baseline", nargs="?", const=baseline_path, default=None)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.atoms, args.seed, tuple(args.stages), args.workers, args.work
+    )
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION - {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""
+Optional compact schema for umls_py.db (create_db(compact=True)).
+
+The large tables loaded by `create_sqlite_db.py` store every column as an
+untyped varchar. Compacting rewrites each of them into <TABLE>_C where:
+    - UMLS identifiers (CUI, AUI, SUI, LUI, CUI1/2, AUI1/2, PAUI) are stored as
+      integers with their prefix letter stripped (C0000005 -> 5)
+    - low cardinality columns (SAB, TTY, REL, RELA, ATN, LAT, SUPPRESS) are
+      stored as integer keys of small dictionary tables (DICT_SAB, ...)
+A view named after the original table (MRCONSO, MRREL, ...) reproduces the
+original columns & values so that existing queries keep working unchanged.
+
+Identifier columns containing any value that does not round trip
+(i.e. 'C' + zero padded digits) are left as text.
+"""
+
+import sqlite3
+
+from clinical_informatics_umls import rrf
+
+# Tables rewritten by compact_db()
+COMPACT_TABLES = ("MRCONSO", "MRREL", "MRHIER", "MRSAT", "MRSTY", "MRDEF")
+
+# Suffix of the compacted (base) tables backing each view
+COMPACT_SUFFIX = "_C"
+
+# Identifier column -> prefix letter
+ID_COLUMNS = {
+    "CUI": "C",
+    "CUI1": "C",
+    "CUI2": "C",
+    "AUI": "A",
+    "AUI1": "A",
+    "AUI2": "A",
+    "PAUI": "A",
+    "SUI": "S",
+    "LUI": "L",
+}
+
+# Columns replaced by keys of a dictionary table (DICT_<column>)
+DICTIONARY_COLUMNS = ("SAB", "TTY", "REL", "RELA", "ATN", "LAT", "SUPPRESS")
+
+
+def id_expression(col: str, prefix: str) -> str:
+    """
+    Summary:
+    --------
+    SQL expression reconstructing an identifier from its integer form. Shared
+    by the compatibility views and the expression indexes built on the compact
+    tables (the two must match exactly for the indexes to be used).
+
+    """
+    return f"CASE WHEN {col} IS NULL THEN '' ELSE printf('{prefix}%07d', {col}) END"
+
+
+# Queries below only fetch integers, as create_db() sets a custom text_factory
+
+
+def is_compact(conn: sqlite3.Connection, table: str) -> bool:
+    (views,) = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'view' AND name = ?;",
+        (table,),
+    ).fetchone()
+    return bool(views)
+
+
+def integer_columns(conn: sqlite3.Connection, table: str) -> set:
+    """
+    Summary:
+    --------
+    Identifier columns stored as integers within a compact table.
+
+    """
+    return {
+        col
+        for col in ID_COLUMNS
+        if conn.execute(
+            "SELECT COUNT(*) FROM pragma_table_info(?) WHERE name = ? AND type = 'INTEGER';",
+            (f"{table}{COMPACT_SUFFIX}", col),
+        ).fetchone()[0]
+    }
+
+
+def index_columns(conn: sqlite3.Connection, table: str, columns: tuple) -> tuple:
+    """
+    Summary:
+    --------
+    Translate an index on a compacted table (view) into the table & column
+    expressions to index on the compact (base) table.
+
+    Returns:
+    --------
+    (base table, list of column expressions)
+
+    """
+    converted = integer_columns(conn, table)
+    return f"{table}{COMPACT_SUFFIX}", [
+        id_expression(col, ID_COLUMNS[col]) if col in converted else col
+        for col in columns
+    ]
+
+
+def convertible(conn: sqlite3.Connection, table: str, col: str) -> bool:
+    """
+    Summary:
+    --------
+    Whether every (non empty) value of an identifier column round trips
+    through its integer form.
+
+    """
+    prefix = ID_COLUMNS[col]
+    (invalid,) = conn.execute(
+        f"""SELECT EXISTS (
+            SELECT 1 FROM {table}
+            WHERE {col} != ''
+            AND ({col} NOT GLOB '{prefix}[0-9]*'
+                OR printf('{prefix}%07d', CAST(substr({col}, 2) AS INTEGER)) != {col})
+        );"""
+    ).fetchone()
+    return not invalid
+
+
+def compact_table(conn: sqlite3.Connection, table: str):
+    """
+    Summary:
+    --------
+    Rewrite a single table into <table>_C and replace it with a view.
+
+    """
+    columns = rrf.RRF_COLUMNS[table]
+    ids = {
+        col for col in columns if col in ID_COLUMNS and convertible(conn, table, col)
+    }
+    dicts = [col for col in columns if col in DICTIONARY_COLUMNS]
+
+    for col in dicts:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS DICT_{col}( ID INTEGER PRIMARY KEY, VALUE varchar UNIQUE ) ;"
+        )
+        conn.execute(
+            f"INSERT OR IGNORE INTO DICT_{col}( VALUE ) SELECT DISTINCT {col} FROM {table};"
+        )
+
+    definitions, selects, view_columns = [], [], []
+    for col in columns:
+        if col in ids:
+            definitions.append(f"{col} INTEGER")
+            selects.append(
+                f"CASE WHEN {col} = '' THEN NULL ELSE CAST(substr({col}, 2) AS INTEGER) END"
+            )
+            view_columns.append(f"{id_expression(col, ID_COLUMNS[col])} AS {col}")
+        elif col in dicts:
+            definitions.append(f"{col} INTEGER")
+            selects.append(f"(SELECT ID FROM DICT_{col} WHERE VALUE = {col})")
+            view_columns.append(f"d_{col}.VALUE AS {col}")
+        else:
+            definitions.append(f"{col} varchar")
+            selects.append(col)
+            view_columns.append(col)
+
+    compact = f"{table}{COMPACT_SUFFIX}"
+    conn.execute(f"CREATE TABLE {compact}( {', '.join(definitions)} ) ;")
+    conn.execute(
+        f"INSERT INTO {compact}( {', '.join(columns)} ) SELECT {', '.join(selects)} FROM {table};"
+    )
+    conn.execute(f"DROP TABLE {table};")
+
+    joins = " ".join(
+        f"JOIN DICT_{col} d_{col} ON d_{col}.ID = {compact}.{col}" for col in dicts
+    )
+    conn.execute(
+        f"CREATE VIEW {table} AS SELECT {', '.join(view_columns)} FROM {compact} {joins};"
+    )
+    print(f"\t{table}: integer identifiers {sorted(ids)}, dictionary encoded {dicts}")
+
+
+def compact_db(conn: sqlite3.Connection, tables: tuple = COMPACT_TABLES):
+    """
+    Summary:
+    --------
+    Convert the large tables of a freshly loaded umls_py.db to the compact
+    schema (see module docstring) & VACUUM the database. Indexes should be
+    created afterwards via create_sqlite_db.create_indexes(), which builds
+    them on the compact tables.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    tables : tuple.
+        Tables to compact.
+
+    """
+    for table in tables:
+        if not is_compact(conn, table):
+            compact_table(conn, table)
+    conn.commit()
+    conn.execute("VACUUM;")
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""
+Memory-mapped, in-process concept lookup engine.
+
+`build_lookup()` exports the lookups services resolve most often from a loaded
+umls_py.db into a single binary file:
+    - cui_name  : CUI -> preferred (English) name
+    - aui_cui   : AUI -> CUI
+    - code_cui  : SAB|CODE -> CUI(s) ('|' delimited)
+    - cui_sty   : CUI -> semantic type name(s) ('|' delimited)
+Each section is a sorted array of fixed-width (NUL padded) keys, binary
+searched via numpy, along with an array of offsets into a shared string heap.
+`ConceptLookup` memory-maps the file read-only, so opening it takes
+milliseconds, worker processes share its pages through the OS page cache and
+lookups need no database connection.
+
+File layout (little endian):
+    header   : MAGIC, number of sections, heap offset
+    sections : name, key width, count, keys offset, offsets offset
+    keys     : count * key width bytes (per section)
+    offsets  : (count + 1) uint64 heap offsets (per section)
+    heap     : utf-8 values
+
+Invoke via:
+`python concept_lookup.py --db ../sqlite/umls_py.db --out ../sqlite/umls_lookup.bin`
+
+Example:
+--------
+from clinical_informatics_umls.concept_lookup import ConceptLookup
+
+with ConceptLookup("../sqlite/umls_lookup.bin") as lookup:
+    lookup.preferred_name("C0011849")  # -> 'Diabetes Mellitus'
+    lookup.cuis_for_code("SNOMEDCT_US", "73211009")  # -> ['C0011849']
+
+"""
+
+import argparse
+import mmap
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+db_path = "../sqlite/umls_py.db"
+lookup_path = "../sqlite/umls_lookup.bin"
+
+MAGIC = b"UMLSLKP1"
+HEADER = struct.Struct("<8sIQ")  # magic, sections, heap offset
+SECTION = struct.Struct("<16sIQQQ")  # name, key width, count, keys, offsets
+
+# Separator of multi-part keys (SAB|CODE) & of multi-valued values - pipes
+# never occur within .RRF fields
+SEPARATOR = "|"
+
+# Section name -> query returning (key, value) rows ordered by key
+LOOKUP_QUERIES = {
+    "cui_name": """
+    SELECT CUI, MIN(STR)
+    FROM MRCONSO
+    WHERE LAT = 'ENG' AND TS = 'P' AND STT = 'PF' AND ISPREF = 'Y'
+    GROUP BY CUI
+    ORDER BY CUI
+    """,
+    "aui_cui": """
+    SELECT AUI, CUI
+    FROM MRCONSO
+    ORDER BY AUI
+    """,
+    "code_cui": """
+    SELECT K, group_concat(CUI, '|')
+    FROM (SELECT DISTINCT SAB || '|' || CODE AS K, CUI FROM MRCONSO ORDER BY K, CUI)
+    GROUP BY K
+    ORDER BY K
+    """,
+    "cui_sty": """
+    SELECT CUI, group_concat(STY, '|')
+    FROM (SELECT DISTINCT CUI, STY FROM MRSTY ORDER BY CUI, STY)
+    GROUP BY CUI
+    ORDER BY CUI
+    """,
+}
+
+# Rows fetched per batch while building
+BUILD_BATCH_SIZE = 100000
+
+
+def align(f, boundary: int = 8):
+    f.write(b"\0" * (-f.tell() % boundary))
+
+
+def write_section(
+    conn: sqlite3.Connection, query: str, keys_file, offsets_file, heap_file
+) -> tuple:
+    """
+    Summary:
+    --------
+    Stream the (key, value) rows of `query` into a keys file (fixed width),
+    an offsets file (uint64 offsets of each value within the heap) & the heap.
+
+    Returns:
+    --------
+    (key width, count)
+
+    """
+    (width,) = conn.execute(
+        f"WITH q(k, v) AS ({query}) SELECT MAX(LENGTH(CAST(k AS BLOB))) FROM q;"
+    ).fetchone()
+    width = width or 1
+    count = 0
+    offset = heap_file.tell()
+    offsets_file.write(np.array([offset], dtype="<u8").tobytes())
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(BUILD_BATCH_SIZE)
+        if not rows:
+            break
+        keys_file.write(
+            b"".join(key.encode("utf-8").ljust(width, b"\0") for key, _ in rows)
+        )
+        values = [(value or "").encode("utf-8") for _, value in rows]
+        heap_file.write(b"".join(values))
+        ends = offset + np.cumsum([len(value) for value in values], dtype=np.uint64)
+        offsets_file.write(ends.astype("<u8").tobytes())
+        offset = int(ends[-1])
+        count += len(rows)
+    return width, count
+
+
+def build_lookup(
+    conn: sqlite3.Connection, out_path: str, sections: tuple = tuple(LOOKUP_QUERIES)
+) -> str:
+    """
+    Summary:
+    --------
+    Build the lookup file from a loaded umls_py.db (see module docstring).
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    out_path : str.
+        Path of the lookup file (written to a temporary file & renamed, so
+        readers never observe a partial file).
+    sections : tuple.
+        Sections (keys of LOOKUP_QUERIES) to build.
+
+    Returns:
+    --------
+    out_path : str.
+
+    """
+    start = time.perf_counter()
+    heap = tempfile.TemporaryFile()
+    built = []
+    for name in sections:
+        keys, offsets = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+        width, count = write_section(conn, LOOKUP_QUERIES[name], keys, offsets, heap)
+        built.append((name, width, count, keys, offsets))
+        print(f"\t{name}: {count} keys (width {width})")
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.seek(HEADER.size + SECTION.size * len(built))
+        align(f)
+        entries = []
+        for name, width, count, keys, offsets in built:
+            keys_offset = f.tell()
+            keys.seek(0)
+            shutil.copyfileobj(keys, f)
+            align(f)
+            offsets_offset = f.tell()
+            offsets.seek(0)
+            shutil.copyfileobj(offsets, f)
+            entries.append((name, width, count, keys_offset, offsets_offset))
+            keys.close()
+            offsets.close()
+        heap_offset = f.tell()
+        heap.seek(0)
+        shutil.copyfileobj(heap, f)
+        heap.close()
+
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, len(entries), heap_offset))
+        for name, width, count, keys_offset, offsets_offset in entries:
+            f.write(
+                SECTION.pack(
+                    name.encode("ascii"), width, count, keys_offset, offsets_offset
+                )
+            )
+    os.replace(tmp_path, out_path)
+    print(f"{out_path} built ({time.perf_counter() - start:.2f}s)")
+    return out_path
+
+
+class ConceptLookup:
+    """
+    Read-only, memory-mapped view of a lookup file built by build_lookup().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_sections, self.heap_offset = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a concept lookup file")
+        self.sections = {}
+        for i in range(n_sections):
+            name, width, count, keys_offset, offsets_offset = SECTION.unpack_from(
+                self.mm, HEADER.size + i * SECTION.size
+            )
+            keys = np.frombuffer(
+                self.mm, dtype=f"S{width}", count=count, offset=keys_offset
+            )
+            offsets = np.frombuffer(
+                self.mm, dtype="<u8", count=count + 1, offset=offsets_offset
+            )
+            self.sections[name.rstrip(b"\0").decode("ascii")] = (width, keys, offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        # numpy views hold buffer exports of the mmap -> release them first
+        self.sections = {}
+        self.mm.close()
+        self.file.close()
+
+    def value(self, index: int, offsets: np.ndarray) -> str:
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        return self.mm[self.heap_offset + start : self.heap_offset + end].decode(
+            "utf-8"
+        )
+
+    def get(self, section: str, key: str):
+        """
+        Summary:
+        --------
+        Binary search `key` within a section - its value, or None when absent.
+
+        """
+        width, keys, offsets = self.sections[section]
+        encoded = key.encode("utf-8")
+        if len(encoded) > width:
+            return None
+        i = int(keys.searchsorted(encoded))
+        if i < len(keys) and keys[i] == encoded:
+            return self.value(i, offsets)
+        return None
+
+    def get_many(self, section: str, keys_to_find: list) -> list:
+        """
+        Summary:
+        --------
+        Vectorized get() of a batch of keys (None for each key absent).
+
+        """
+        width, keys, offsets = self.sections[section]
+        encoded = np.array([key.encode("utf-8") for key in keys_to_find], dtype=object)
+        fits = np.array([len(key) <= width for key in encoded], dtype=bool)
+        wanted = np.array(
+            [key if ok else b"" for key, ok in zip(encoded, fits)], dtype=f"S{width}"
+        )
+        idx = keys.searchsorted(wanted)
+        found = fits & (idx < len(keys))
+        found[found] = keys[idx[found]] == wanted[found]
+        return [
+            self.value(int(i), offsets) if ok else None for i, ok in zip(idx, found)
+        ]
+
+    def preferred_name(self, cui: str):
+        return self.get("cui_name", cui)
+
+    def cui_for_aui(self, aui: str):
+        return self.get("aui_cui", aui)
+
+    def cuis_for_code(self, sab: str, code: str) -> list:
+        value = self.get("code_cui", f"{sab}{SEPARATOR}{code}")
+        return value.split(SEPARATOR) if value else []
+
+    def semantic_types(self, cui: str) -> list:
+        value = self.get("cui_sty", cui)
+        return value.split(SEPARATOR) if value else []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--out", default=lookup_path)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    build_lookup(conn, args.out)
+    conn.close()
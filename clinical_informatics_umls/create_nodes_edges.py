@@ -1,50 +1,108 @@
 import csv
+import gzip
+import queue
 import sqlite3
+import threading
+import time
 
 import numpy as np
 import pandas as pd
 
+# Rows fetched per cursor.fetchmany() call within SQLite.execute_query
+FETCH_BATCH_SIZE = 50000
+
+# Batches fetched ahead of the writer thread (bounds memory use)
+QUEUE_BATCHES = 4
+
+# Buffer size of (uncompressed) output files
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Rows between progress reports
+PROGRESS_ROWS = 1000000
+
 
 class SQLite:
     def __init__(self, db_path: str):
+        self.db_path = db_path
         self.connection = sqlite3.connect(db_path)
         self.cursor = self.connection.cursor()
+        self.cui_set_loaded = False
 
     def __enter__(self):
-        self.connection = sqlite3.connect(self.db_path)
-        self.cursor = self.connection.cursor()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.cursor.close()
         self.connection.close()
 
-    def execute_query(self, query: str, file_name: str) -> str:
-        """ """
+    def execute_query(
+        self,
+        query: str,
+        file_name: str,
+        batch_size: int = FETCH_BATCH_SIZE,
+        compress: bool = None,
+    ) -> str:
+        """
+        Stream the result of `query` to `file_name` (.csv). Rows are fetched in
+        batches of `batch_size` and handed to a writer thread through a bounded
+        queue, so writing overlaps with query execution and memory use stays
+        constant. Output is gzip compressed when `compress` (by default when
+        `file_name` ends with .gz).
+        """
+        if compress is None:
+            compress = file_name.endswith(".gz")
+        batches = queue.Queue(maxsize=QUEUE_BATCHES)
+        errors = []
+
+        def write(column_names):
+            try:
+                if compress:
+                    csvfile = gzip.open(file_name, "wt", newline="")
+                else:
+                    csvfile = open(
+                        file_name, "w", newline="", buffering=WRITE_BUFFER_BYTES
+                    )
+                with csvfile:
+                    writer = csv.writer(
+                        csvfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
+                    )
+                    # Write the column names as the first row in the file
+                    writer.writerow(column_names)
+                    # Write the data rows
+                    while (batch := batches.get()) is not None:
+                        writer.writerows(batch)
+            except Exception as e:
+                errors.append(e)
+                # keep consuming so that the fetching thread never blocks
+                while batches.get() is not None:
+                    pass
+
         try:
+            start = time.perf_counter()
+            rows = 0
             # Execute the query
             self.cursor.execute(query)
-            # Fetch all rows of the query result
-            result = self.cursor.fetchall()
             # Get the column names from the cursor description
             column_names = [desc[0] for desc in self.cursor.description]
-            # Write the result to csv file
-            with open(file_name, "w") as csvfile:
-                writer = csv.writer(
-                    csvfile, delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL
-                )
-                # Write the column names as the first row in the file
-                writer.writerow(column_names)
-                # Write the data rows
-                for row in result:
-                    writer.writerow(row)
-            print(f"{file_name} :{len(result)}  records exported")
+            writer = threading.Thread(target=write, args=(column_names,), daemon=True)
+            writer.start()
+            try:
+                while batch := self.cursor.fetchmany(batch_size):
+                    batches.put(batch)
+                    rows += len(batch)
+                    if rows // PROGRESS_ROWS > (rows - len(batch)) // PROGRESS_ROWS:
+                        rate = rows / (time.perf_counter() - start)
+                        print(f"\t{file_name}: {rows:,} rows ({rate:,.0f} rows/sec)")
+            finally:
+                batches.put(None)
+                writer.join()
+            if errors:
+                raise errors[0]
+            rate = rows / max(time.perf_counter() - start, 1e-9)
+            print(f"{file_name} :{rows}  records exported ({rate:,.0f} rows/sec)")
         except Exception as e:
             print(f"Error while executing query: {e}")
             raise e
-        # finally:
-        #     self.cursor.close()
-        #     self.connection.close()
         return f"{file_name} exported"
 
     def get_cui_nodes(self, file_name: str = "../import/cuiNodes.csv") -> str:
@@ -52,62 +110,79 @@ class SQLite:
         query = "SELECT DISTINCT CUI AS `CuiId:ID`, STR AS name, 'Cui' AS `:LABEL` FROM MRCONSO WHERE SUPPRESS = 'N';"
         return self.execute_query(query, file_name)
 
-    def get_cui_set(self, file_name: str = "../import/cuiNodes.csv"):
-        df = pd.read_csv(file_name, sep=",")
-        return set(df["CuiId:ID"])
+    def load_cui_set(self):
+        """
+        Load the CUIs of get_cui_nodes() (non suppressed CUIs of MRCONSO) once
+        per connection into the indexed temp.CUI_SET table, which every query
+        below joins against (rather than inlining an IN (...) list of CUIs).
+        The set is selected from MRCONSO rather than read back from the
+        cuiNodes file, whose path & compression vary. Later calls on the same
+        connection are no-ops (see cui_set_loaded).
+        """
+        if self.cui_set_loaded:
+            return
+        self.cursor.execute("DROP TABLE IF EXISTS temp.CUI_SET;")
+        self.cursor.execute(
+            "CREATE TEMP TABLE CUI_SET( CUI varchar PRIMARY KEY ) WITHOUT ROWID;"
+        )
+        self.cursor.execute(
+            "INSERT INTO temp.CUI_SET( CUI ) SELECT DISTINCT CUI FROM MRCONSO WHERE SUPPRESS = 'N';"
+        )
+        self.connection.commit()
+        self.cui_set_loaded = True
 
     def get_aui_nodes(self, file_name: str = "../import/auiNodes.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT AUI as `AuiId:ID`, STR AS name, SAB AS sab, CODE AS code, 
                         TTY AS tty, ISPREF AS ispref, TS AS ts, STT AS stt, 'Aui' AS `:LABEL` 
-        FROM MRCONSO WHERE CUI IN {tuple(cui_set)} AND SUPPRESS = 'N';"""
+        FROM MRCONSO WHERE CUI IN (SELECT CUI FROM temp.CUI_SET) AND SUPPRESS = 'N';"""
         return self.execute_query(query, file_name)
 
     def get_sty_nodes(self, file_name: str = "../import/styNodes.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"SELECT DISTINCT TUI as `TuiId:ID`, STY as sty, STN as stn, 'SemanticType' AS `:LABEL` FROM MRSTY WHERE CUI IN {tuple(cui_set)};"
+        self.load_cui_set()
+        query = "SELECT DISTINCT TUI as `TuiId:ID`, STY as sty, STN as stn, 'SemanticType' AS `:LABEL` FROM MRSTY WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);"
         return self.execute_query(query, file_name)
 
     def get_code_nodes(self, file_name: str = "../import/codeNodes.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT (SAB||'#'||CODE) AS `CodeId:ID`, SAB as sab, CODE as code, ('Code'||';'||SAB) AS `:LABEL` 
         FROM MRCONSO 
-        WHERE CUI IN {tuple(cui_set)};
+        WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);
         """
         return self.execute_query(query, file_name)
 
     def get_has_aui_rels(self, file_name: str = "../import/has_aui.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
             SELECT DISTINCT (SAB || '#' || CODE) AS `:START_ID`, AUI AS `:END_ID`, 'HAS_AUI' AS `:TYPE`
             FROM MRCONSO 
-            WHERE CUI IN {tuple(cui_set)};
+            WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);
             """
         return self.execute_query(query, file_name)
 
     def get_has_cui_rels(self, file_name: str = "../import/has_cui.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
          SELECT DISTINCT AUI as `:START_ID`, CUI as `:END_ID`, 'HAS_CUI' AS `:TYPE`
          FROM MRCONSO
-         WHERE CUI IN {tuple(cui_set)};
+         WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);
          """
         return self.execute_query(query, file_name)
 
     def get_has_sty_rels(self, file_name: str = "../import/has_sty.csv") -> str:
         """ """
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT CUI AS `:START_ID`, TUI AS `:END_ID`, 'HAS_STY' AS `:TYPE`
         FROM MRSTY
-        WHERE CUI IN {tuple(cui_set)};
+        WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);
         """
         return self.execute_query(query, file_name)
 
@@ -115,33 +190,33 @@ class SQLite:
         self, file_name: str = "../import/parent_child_rels.csv"
     ) -> str:
         """"""
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT h.PAUI AS `:START_ID`, c.AUI AS `:END_ID`, 'CHILD_OF' AS `:TYPE`
         FROM MRHIER h
         JOIN MRCONSO c ON h.AUI = c.AUI
         JOIN MRCONSO c2 ON h.PAUI = c2.AUI
-        WHERE h.CUI IN {tuple(cui_set)};   
+        WHERE h.CUI IN (SELECT CUI FROM temp.CUI_SET);   
         """
         return self.execute_query(query, file_name)
 
     def get_cui_code_rels(self, file_name: str = "../import/cui_code_rel.csv") -> str:
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT CUI AS `:START_ID`, (SAB || '#' || CODE) AS `:END_ID`, 'HAS_SOURCE_CODE' AS `:TYPE`
         FROM MRCONSO
-        WHERE CUI IN {tuple(cui_set)};
+        WHERE CUI IN (SELECT CUI FROM temp.CUI_SET);
         """
         return self.execute_query(query, file_name)
 
     def get_icdo3_code_nodes(self, file_name: str = "../import/icdoNode.csv") -> str:
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         SELECT DISTINCT ATV AS code, (SAB||'#'||CODE) AS `:END_ID`, SAB AS sab
         FROM MRSAT
         WHERE SAB = 'NCI'
         AND ATN = 'ICD-O-3_CODE'
-        AND CUI IN {tuple(cui_set)};        
+        AND CUI IN (SELECT CUI FROM temp.CUI_SET);        
         """
         self.execute_query(query, file_name)
         df = pd.read_csv("../import/icdoNode.csv", sep=",")
@@ -175,12 +250,12 @@ class SQLite:
     def get_concept_concept_rels(
         self, query: str, file_path: str = "../import/cui_cui_rel.csv"
     ):
-        cui_set = self.get_cui_set()
-        query = f"""
+        self.load_cui_set()
+        query = """
         WITH query AS (
             SELECT DISTINCT SAB
             FROM MRCONSO
-            WHERE CUI IN {tuple(cui_set)})
+            WHERE CUI IN (SELECT CUI FROM temp.CUI_SET))
         SELECT MRREL.CUI2, MRREL.CUI1, CASE WHEN MRREL.RELA = '' THEN MRREL.REL ELSE MRREL.RELA END AS relationship, MRREL.SAB AS sab
         FROM MRREL
         JOIN query ON MRREL.SAB = query.SAB
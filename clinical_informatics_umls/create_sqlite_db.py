@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 
+import argparse
 import os
+import re
 import sqlite3
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 if not sys.warnoptions:
     import warnings
@@ -12,6 +17,13 @@ if not sys.warnoptions:
 from io import StringIO
 from os.path import dirname, join
 
+from clinical_informatics_umls import (
+    compact_sqlite_db,
+    release_archive,
+    rrf,
+    term_search,
+)
+
 umls_tables = "../UMLS/subset/2022AA/META/"
 conn = None
 success = False
@@ -31,6 +43,76 @@ MRDEF_TABLE_FILE = None
 MRSAT_TABLE_FILE = None
 SRGRP_TABLE_FILE = None
 
+# Rows per executemany() call when loading with create_db(bulk=True)
+BULK_BATCH_SIZE = 100000
+
+# Approximate size of each byte range parsed by a worker process when loading
+# with create_db(workers=N)
+PARSE_CHUNK_BYTES = 16 * 1024 * 1024
+
+# PRAGMAs applied for the duration of a bulk load. Durability is traded for
+# speed - a failed load is discarded by umls_db_cleanup() regardless.
+# (page_size only takes effect if set before the first table is created)
+LOADER_PRAGMAS = {
+    "page_size": 32768,
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "cache_size": -1048576,  # negative value -> KiB (i.e. 1 GiB)
+    "temp_store": "MEMORY",
+}
+
+# PRAGMAs restored once a bulk load has committed
+DEFAULT_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+}
+
+# Indexes as (index name, table, columns)
+DEFAULT_INDEXES = [
+    ("X_mrsty_cui", "MRSTY", ("CUI",)),
+    ("X_mrconso_cui", "MRCONSO", ("CUI",)),
+    ("X_mrconso_sab", "MRCONSO", ("SAB",)),
+    ("X_mrrel_cui2", "MRREL", ("CUI2",)),
+    ("X_mrrel_cui1", "MRREL", ("CUI1",)),
+    ("X_mrrel_aui1", "MRREL", ("AUI1",)),
+    ("X_mrrel_aui2", "MRREL", ("AUI2",)),
+    ("X_mrhier_aui", "MRHIER", ("AUI",)),
+    ("X_mrhier_paui", "MRHIER", ("PAUI",)),
+    ("X_mrsat_cui", "MRSAT", ("CUI",)),
+]
+
+# Composite/covering indexes derived from the queries issued by
+# nodes_edges_part1.extract_nodes_edges() (and create_nodes_edges.SQLite)
+EXTRACTION_INDEXES = [
+    # SAB IN (...) AND LAT = 'ENG' AND SUPPRESS = 'N' [AND STT/ISPREF/TS]
+    # -> covers conceptNode, codeNode, has_aui_rel, has_cui_rel & cui_code_rel
+    (
+        "X_mrconso_sab_lat_suppress",
+        "MRCONSO",
+        ("SAB", "LAT", "SUPPRESS", "STT", "ISPREF", "TS", "CUI", "AUI", "CODE", "TTY"),
+    ),
+    # semanticTypeNode & has_sty_rel (MRSTY JOIN MRCONSO ON CUI)
+    ("X_mrsty_cui_tui", "MRSTY", ("CUI", "TUI", "STN", "STY")),
+    # child_of_rel (MRHIER.AUI/PAUI JOIN MRCONSO.AUI)
+    ("X_mrconso_aui", "MRCONSO", ("AUI", "SUPPRESS", "LAT", "CODE", "CUI")),
+    ("X_mrhier_sab_aui_paui", "MRHIER", ("SAB", "AUI", "PAUI")),
+    # concept_concept_rel (MRREL filtered on SAB & SUPPRESS)
+    (
+        "X_mrrel_sab_suppress",
+        "MRREL",
+        ("SAB", "SUPPRESS", "CUI1", "CUI2", "REL", "RELA"),
+    ),
+    # ICD-O-3 codes (MRSAT WHERE SAB = 'NCI' AND ATN = 'ICD-O-3_CODE')
+    ("X_mrsat_sab_atn", "MRSAT", ("SAB", "ATN", "SUPPRESS", "ATV", "CODE", "CUI")),
+    # tui_tui_rel (SRSTR JOIN SRDEF ON STY_RL)
+    ("X_srdef_sty_rl", "SRDEF", ("STY_RL", "UI")),
+]
+
+INDEX_PROFILES = {
+    "default": DEFAULT_INDEXES,
+    "extraction": DEFAULT_INDEXES + EXTRACTION_INDEXES,
+}
+
 
 def umls_db_cleanup():
     global conn
@@ -99,12 +181,309 @@ def umls_db_cleanup():
         print("\n\tError: umls_py.db was not created successfully.\n")
 
 
-def create_db():
+def apply_pragmas(conn: sqlite3.Connection, pragmas: dict):
+    """
+    Summary:
+    --------
+    Apply each PRAGMA in `pragmas` (name -> value) to the connection.
+
+    """
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value};")
+
+
+def report_load_rate(table: str, rows: int, start: float):
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    print(f"\t{table}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+
+
+def insert_rows(c: sqlite3.Cursor, table: str, table_file) -> int:
+    """
+    Summary:
+    --------
+    Insert a table one row (i.e. one `execute`) at a time.
+
+    Parameters:
+    -----------
+    c : sqlite3.Cursor.
+    table : str.
+        Table name (key of rrf.RRF_COLUMNS).
+    table_file : file object.
+        Open .RRF/.pipe file for the table.
+
+    Returns:
+    --------
+    rows : int.
+        Number of rows inserted.
+
+    """
+    columns = rrf.RRF_COLUMNS[table]
+    insert = f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );"
+    start = time.perf_counter()
+    rows = 0
+    for row in rrf.iter_rows(table_file.name, table):
+        c.execute(insert, row)
+        rows += 1
+    report_load_rate(table, rows, start)
+    return rows
+
+
+def bulk_insert(
+    conn: sqlite3.Connection,
+    table: str,
+    table_file,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Summary:
+    --------
+    Insert a table in `executemany` batches within a single explicit
+    transaction. Connection is expected to be in autocommit mode
+    (isolation_level=None) with LOADER_PRAGMAS applied.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    table : str.
+        Table name (key of rrf.RRF_COLUMNS).
+    table_file : file object.
+        Open .RRF/.pipe file for the table.
+    batch_size : int.
+        Rows per executemany() call.
+
+    Returns:
+    --------
+    rows : int.
+        Number of rows inserted.
+
+    """
+    columns = rrf.RRF_COLUMNS[table]
+    insert = f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );"
+    start = time.perf_counter()
+    rows = 0
+    conn.execute("BEGIN;")
+    for batch in rrf.iter_chunks(table_file.name, table, chunk_size=batch_size):
+        conn.executemany(insert, batch)
+        rows += len(batch)
+    conn.execute("COMMIT;")
+    report_load_rate(table, rows, start)
+    return rows
+
+
+def stream_insert(
+    conn: sqlite3.Connection,
+    table: str,
+    source,
+    batch_size: int = BULK_BATCH_SIZE,
+) -> int:
+    """
+    Summary:
+    --------
+    bulk_insert() of a table streamed out of a release_archive.ReleaseSource
+    (tables of release_archive.OPTIONAL_TABLES absent from the source are
+    left empty).
+
+    """
+    if table in release_archive.OPTIONAL_TABLES and not source.members(table):
+        print(f"\tNo file for {table} within the release source - skipped")
+        return 0
+    columns = rrf.RRF_COLUMNS[table]
+    insert = f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );"
+    start = time.perf_counter()
+    rows = 0
+    conn.execute("BEGIN;")
+    for batch in source.iter_chunks(table, chunk_size=batch_size):
+        conn.executemany(insert, batch)
+        rows += len(batch)
+    conn.execute("COMMIT;")
+    report_load_rate(table, rows, start)
+    return rows
+
+
+def parallel_insert(
+    conn: sqlite3.Connection,
+    table_paths: list,
+    workers: int,
+    chunk_bytes: int = PARSE_CHUNK_BYTES,
+) -> int:
+    """
+    Summary:
+    --------
+    Parse all tables in parallel and insert them through a single writer.
+    Each file is split into line aligned byte ranges which are parsed by a
+    pool of worker processes; this (main) process consumes the parsed batches
+    in file order and inserts them with `executemany`, one transaction per
+    table. At most 2 * workers parsed ranges are held in memory at once.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+        Connection in autocommit mode (isolation_level=None).
+    table_paths : list.
+        (table name, path to .RRF/.pipe file) pairs in load order.
+    workers : int.
+        Number of parser processes.
+    chunk_bytes : int.
+        Approximate size of each byte range handed to a worker.
+
+    Returns:
+    --------
+    total : int.
+        Number of rows inserted across all tables.
+
+    """
+    tasks = deque(
+        (table, path, start, end)
+        for table, path in table_paths
+        for start, end in rrf.byte_ranges(path, chunk_bytes)
+    )
+    total = 0
+    current, rows, start_time = None, 0, None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+
+        def submit():
+            table, path, start, end = tasks.popleft()
+            future = pool.submit(rrf.read_rows, path, table, start, end)
+            pending.append((table, future))
+
+        while tasks and len(pending) < 2 * workers:
+            submit()
+
+        while pending:
+            table, future = pending.popleft()
+            if tasks:
+                submit()
+            if table != current:
+                if current is not None:
+                    conn.execute("COMMIT;")
+                    report_load_rate(current, rows, start_time)
+                print(f"Inserting data into {table} table")
+                current, rows, start_time = table, 0, time.perf_counter()
+                conn.execute("BEGIN;")
+            batch = future.result()
+            columns = rrf.RRF_COLUMNS[table]
+            conn.executemany(
+                f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );",
+                batch,
+            )
+            rows += len(batch)
+            total += len(batch)
+
+    if current is not None:
+        conn.execute("COMMIT;")
+        report_load_rate(current, rows, start_time)
+    return total
+
+
+def create_indexes(conn: sqlite3.Connection, profile: str = "default"):
+    """
+    Summary:
+    --------
+    Create the indexes of an index profile (see INDEX_PROFILES) and refresh
+    the query planner statistics (ANALYZE). Indexes that already exist are
+    skipped, so this may also be run against a previously created umls_py.db.
+    Tables converted to the compact schema (see compact_sqlite_db.py) are
+    indexed on their compact table.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    profile : str.
+        "default" (single column indexes) or "extraction" (default plus the
+        composite/covering indexes used by the node/edge extraction queries).
+
+    """
+    for name, table, columns in INDEX_PROFILES[profile]:
+        start = time.perf_counter()
+        if compact_sqlite_db.is_compact(conn, table):
+            table, columns = compact_sqlite_db.index_columns(conn, table, columns)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});"
+        )
+        print(f"\t{name}: {time.perf_counter() - start:.2f}s")
+    conn.execute("ANALYZE;")
+    conn.commit()
+
+
+def record_release(conn: sqlite3.Connection, release: str):
+    """
+    Summary:
+    --------
+    Record the UMLS release (i.e. '2022AB') loaded into the database within the
+    UMLS_METADATA table (KEY -> VALUE) - committed unless run within the
+    caller's transaction.
+
+    """
+    owned = not conn.in_transaction
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS UMLS_METADATA( KEY varchar PRIMARY KEY, VALUE varchar ) ;"
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO UMLS_METADATA( KEY, VALUE ) VALUES( ?, ? );",
+        [
+            ("release", release),
+            ("updated", time.strftime("%Y-%m-%dT%H:%M:%S")),
+        ],
+    )
+    if owned:
+        conn.commit()
+
+
+def release_from_path(path: str) -> str:
+    """
+    Summary:
+    --------
+    Infer the UMLS release (i.e. '2022AB') from a path such as
+    ../UMLS/subset/2022AB/META/ - returns None if there is none.
+
+    """
+    match = re.search(r"(\d{4}A[AB])", path)
+    return match.group(1) if match else None
+
+
+def create_db(
+    bulk: bool = False,
+    batch_size: int = BULK_BATCH_SIZE,
+    workers: int = 1,
+    index_profile: str = "default",
+    release: str = None,
+    compact: bool = False,
+    fts: bool = False,
+    source=None,
+):
     """
     Summary:
     --------
     Create a sqlite3 db using .RRF files generated via UMLS MetamorphoSys.
 
+    Parameters:
+    -----------
+    bulk : bool.
+        Load each table in `executemany` batches (one transaction per table)
+        under LOADER_PRAGMAS rather than one INSERT per .RRF line.
+    batch_size : int.
+        Rows per batch when bulk=True.
+    workers : int.
+        When > 1, .RRF files are parsed by this many worker processes (see
+        parallel_insert()) and written by a single writer. Implies bulk=True.
+    index_profile : str.
+        Key of INDEX_PROFILES - indexes created once all tables are loaded.
+    release : str.
+        UMLS release recorded in UMLS_METADATA (inferred from `umls_tables`
+        when not provided).
+    compact : bool.
+        Convert the large tables to the integer keyed, dictionary encoded
+        schema of compact_sqlite_db.py (original table names become views).
+    fts : bool.
+        Build the FTS5 term search indexes of term_search.py (MRCONSO_FTS &
+        MRDEF_FTS).
+    source : str or list.
+        Release directories/zip archives (see release_archive.py) to stream
+        the tables from - compressed (.gz/.zst), split & archived .RRF files
+        are read without unpacking them to disk. Implies bulk=True.
+
     """
 
     global conn
@@ -125,102 +504,114 @@ def create_db():
     global MRSAT_TABLE_FILE
     global SRGRP_TABLE_FILE
 
+    if source is not None and workers > 1:
+        raise ValueError("workers > 1 requires unpacked .RRF files (byte ranges)")
+
     print("\ncreating umls_py.db")
     db_path = "../sqlite/umls_py.db"
     conn = sqlite3.connect(db_path)
     conn.text_factory = StringIO
-
-    print("opening files")
-    try:
-        mrsty_path = join(dirname(umls_tables), "MRSTY.RRF")
-        MRSTY_TABLE_FILE = open(mrsty_path, "r")
-    except IOError:
-        print("No file to use for creating MRSTY.RRF table")
-        sys.exit()
-
-    try:
-        mrconso_path = join(dirname(umls_tables), "MRCONSO.RRF")
-        MRCONSO_TABLE_FILE = open(mrconso_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRCONSO.RRF table\n")
-        sys.exit()
-
-    try:
-        mrhier_path = join(dirname(umls_tables), "MRHIER.RRF")
-        MRHIER_TABLE_FILE = open(mrhier_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRHIER.RRF table\n")
-        sys.exit()
-
-    try:
-        mrrank_path = join(dirname(umls_tables), "MRRANK.RRF")
-        MRRANK_TABLE_FILE = open(mrrank_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRRANK.RRF table\n")
-        sys.exit()
-
-    try:
-        mrrel_path = join(dirname(umls_tables), "MRREL.RRF")
-        MRREL_TABLE_FILE = open(mrrel_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRREL.RRF table\n")
-        sys.exit()
-
-    try:
-        srdef_path = join(dirname(umls_tables), "SRDEF.pipe")
-        SRDEF_TABLE_FILE = open(srdef_path, "r")
-    except IOError:
-        print("\nNo file to use for creating SRDEF table\n")
-        sys.exit()
-
-    try:
-        srstr_path = join(dirname(umls_tables), "SRSTR.pipe")
-        SRSTR_TABLE_FILE = open(srstr_path, "r")
-    except IOError:
-        print("\nNo file to use for creating SRSTR table\n")
-        sys.exit()
-
-    try:
-        srstre1_path = join(dirname(umls_tables), "SRSTRE1.pipe")
-        SRSTRE1_TABLE_FILE = open(srstre1_path, "r")
-    except IOError:
-        print("\nNo file to use for creating SRSTRE1 table\n")
-        sys.exit()
-
-    try:
-        srstre2_path = join(dirname(umls_tables), "SRSTRE2.pipe")
-        SRSTRE2_TABLE_FILE = open(srstre2_path, "r")
-    except IOError:
-        print("\nNo file to use for creating SRSTRE2 table\n")
-        sys.exit()
-
-    try:
-        mrsab_path = join(dirname(umls_tables), "MRSAB.RRF")
-        MRSAB_TABLE_FILE = open(mrsab_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRSAB table\n")
-        sys.exit()
-
-    try:
-        mrdef_path = join(dirname(umls_tables), "MRDEF.RRF")
-        MRDEF_TABLE_FILE = open(mrdef_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRDEF table\n")
-        sys.exit()
-
-    try:
-        mrsat_path = join(dirname(umls_tables), "MRSAT.RRF")
-        MRSAT_TABLE_FILE = open(mrsat_path, "r")
-    except IOError:
-        print("\nNo file to use for creating MRSAT table\n")
-        sys.exit()
-
-    try:
-        srgrp_path = join(dirname(umls_tables), "semantic_groups.pipe")
-        SRGRP_TABLE_FILE = open(srgrp_path, "r")
-    except IOError:
-        print("\nNo file to use for creating SRGRP table\n")
-        sys.exit()
+    bulk = bulk or workers > 1 or source is not None
+    if bulk:
+        conn.isolation_level = None  # transactions are managed by bulk_insert()
+        apply_pragmas(conn, LOADER_PRAGMAS)
+
+    release_source = None
+    if source is not None:
+        print("opening release source")
+        release_source = release_archive.ReleaseSource(source)
+    else:
+        print("opening files")
+        try:
+            mrsty_path = join(dirname(umls_tables), "MRSTY.RRF")
+            MRSTY_TABLE_FILE = open(mrsty_path, "r")
+        except IOError:
+            print("No file to use for creating MRSTY.RRF table")
+            sys.exit()
+
+        try:
+            mrconso_path = join(dirname(umls_tables), "MRCONSO.RRF")
+            MRCONSO_TABLE_FILE = open(mrconso_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRCONSO.RRF table\n")
+            sys.exit()
+
+        try:
+            mrhier_path = join(dirname(umls_tables), "MRHIER.RRF")
+            MRHIER_TABLE_FILE = open(mrhier_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRHIER.RRF table\n")
+            sys.exit()
+
+        try:
+            mrrank_path = join(dirname(umls_tables), "MRRANK.RRF")
+            MRRANK_TABLE_FILE = open(mrrank_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRRANK.RRF table\n")
+            sys.exit()
+
+        try:
+            mrrel_path = join(dirname(umls_tables), "MRREL.RRF")
+            MRREL_TABLE_FILE = open(mrrel_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRREL.RRF table\n")
+            sys.exit()
+
+        try:
+            srdef_path = join(dirname(umls_tables), "SRDEF.pipe")
+            SRDEF_TABLE_FILE = open(srdef_path, "r")
+        except IOError:
+            print("\nNo file to use for creating SRDEF table\n")
+            sys.exit()
+
+        try:
+            srstr_path = join(dirname(umls_tables), "SRSTR.pipe")
+            SRSTR_TABLE_FILE = open(srstr_path, "r")
+        except IOError:
+            print("\nNo file to use for creating SRSTR table\n")
+            sys.exit()
+
+        try:
+            srstre1_path = join(dirname(umls_tables), "SRSTRE1.pipe")
+            SRSTRE1_TABLE_FILE = open(srstre1_path, "r")
+        except IOError:
+            print("\nNo file to use for creating SRSTRE1 table\n")
+            sys.exit()
+
+        try:
+            srstre2_path = join(dirname(umls_tables), "SRSTRE2.pipe")
+            SRSTRE2_TABLE_FILE = open(srstre2_path, "r")
+        except IOError:
+            print("\nNo file to use for creating SRSTRE2 table\n")
+            sys.exit()
+
+        try:
+            mrsab_path = join(dirname(umls_tables), "MRSAB.RRF")
+            MRSAB_TABLE_FILE = open(mrsab_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRSAB table\n")
+            sys.exit()
+
+        try:
+            mrdef_path = join(dirname(umls_tables), "MRDEF.RRF")
+            MRDEF_TABLE_FILE = open(mrdef_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRDEF table\n")
+            sys.exit()
+
+        try:
+            mrsat_path = join(dirname(umls_tables), "MRSAT.RRF")
+            MRSAT_TABLE_FILE = open(mrsat_path, "r")
+        except IOError:
+            print("\nNo file to use for creating MRSAT table\n")
+            sys.exit()
+
+        try:
+            srgrp_path = join(dirname(umls_tables), "semantic_groups.pipe")
+            SRGRP_TABLE_FILE = open(srgrp_path, "r")
+        except IOError:
+            print("\nNo file to use for creating SRGRP table\n")
+            sys.exit()
 
     print("Creating tables")
     c = conn.cursor()
@@ -394,194 +785,85 @@ def create_db():
         "CREATE TABLE SRGRP( STY_GROUP_ABBREV text, STY_GROUP text, TUI varchar, STY text ) ;"
     )
 
-    print("Inserting data into MRSTY table")
-    for line in MRSTY_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 6
-        c.execute(
-            """INSERT INTO MRSTY( CUI, TUI, STN, STY, ATUI, CVF ) VALUES( ?, ?, ?, ?, ?, ?)
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into MRCONSO table")
-    for line in MRCONSO_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 18
-        c.execute(
-            """INSERT INTO MRCONSO( CUI, LAT, TS, LUI, STT, SUI, ISPREF, AUI, SAUI, SCUI, SDUI, SAB, TTY, CODE, STR, SRL, SUPPRESS, CVF )
-            VALUES ( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? );
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into MRREL table")
-    for line in MRREL_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 16
-        c.execute(
-            """INSERT INTO MRREL( CUI1, AUI1, STYPE1, REL, CUI2, AUI2, STYPE2,
-            RELA, RUI, SRUI, SAB, SL, RG, DIR, SUPPRESS, CVF ) VALUES( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? );
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into MRHIER table")
-    for line in MRHIER_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 9
-        c.execute(
-            """INSERT INTO MRHIER( CUI, AUI, CXN, PAUI, SAB, RELA, PTR, HCD, CVF )
-            VALUES( ?, ?, ?, ?, ?, ?, ?, ?, ? );
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into MRRANK table")
-    for line in MRRANK_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 4
-        c.execute(
-            "INSERT INTO MRRANK( MRRANK_RANK, SAB, TTY, SUPPRESS ) VALUES( ?, ?, ?, ? );",
-            tuple(line),
-        )
-
-    print("Inserting data into SRDEF table")
-    for line in SRDEF_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 10
-        c.execute(
-            """INSERT INTO SRDEF( RT, UI, STY_RL, STN_RTN, DEF, EX, UN, NH, ABR, RIN )
-            VALUES( ?, ?, ?, ?, ?, ?, ?, ?, ?, ? );""",
-            tuple(line),
-        )
-
-    print("Inserting data into SRSTR table")
-    for line in SRSTR_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 4
-        c.execute(
-            "INSERT INTO SRSTR( STY_RL1, RL, STY_RL2, LS ) VALUES( ?, ?, ?, ? );",
-            tuple(line),
-        )
-
-    print("Inserting data into SRSTRE1 table")
-    for line in SRSTRE1_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 3
-        c.execute(
-            "INSERT INTO SRSTRE1( UI1, UI2, UI3 ) VALUES( ?, ?, ? );", tuple(line)
-        )
-    print("Inserting data into SRSTRE2 table")
-    for line in SRSTRE2_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 3
-        c.execute(
-            "INSERT INTO SRSTRE2( STY1, RL, STY2 ) VALUES( ?, ?, ? );", tuple(line)
-        )
-
-    print("Inserting data into MRSAB table")
-    for line in MRSAB_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 25
-        c.execute(
-            """INSERT INTO MRSAB( VCUI, RCUI, VSAB, RSAB, SON, SF, SVER, VSTART, VEND, IMETA, RMETA, SLC, SCC, SRL, TRF, CFR, CXTY, TTYL, ATNL, LAT, CENC, CURVER, SABIN, SSN, SCIT )
-			VALUES( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? );
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into MRDEF table")
-    for line in MRDEF_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 8
-        c.execute(
-            """INSERT INTO MRDEF( CUI, AUI, ATUI, SATUI, SAB, DEF, SUPPRESS, CVF ) 
-                VALUES( ?, ?, ?, ?, ?, ?, ?, ? ) ;""",
-            tuple(line),
-        )
-
-    print("Inserting data into MRSAT table")
-    for line in MRSAT_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 13
-        c.execute(
-            """INSERT INTO MRSAT( CUI, LUI, SUI, METAUI, STYPE, CODE, ATUI, SATUI, ATN, SAB, ATV, SUPPRESS, CVF )
-				VALUES( ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ? );
-            """,
-            tuple(line),
-        )
-
-    print("Inserting data into SRGRP table")
-    for line in SRGRP_TABLE_FILE:
-        line = line.strip("\n")
-        assert line[-1] == "|", f"str: {line}, char: "
-        line = line.split("|")
-        line.pop()
-        assert len(line) == 4
-        c.execute(
-            """ INSERT INTO SRGRP ( STY_GROUP_ABBREV, STY_GROUP, TUI, STY )
-                VALUES ( ?, ?, ?, ? ); 
-            """,
-            tuple(line),
+    table_files = [
+        ("MRSTY", MRSTY_TABLE_FILE),
+        ("MRCONSO", MRCONSO_TABLE_FILE),
+        ("MRREL", MRREL_TABLE_FILE),
+        ("MRHIER", MRHIER_TABLE_FILE),
+        ("MRRANK", MRRANK_TABLE_FILE),
+        ("SRDEF", SRDEF_TABLE_FILE),
+        ("SRSTR", SRSTR_TABLE_FILE),
+        ("SRSTRE1", SRSTRE1_TABLE_FILE),
+        ("SRSTRE2", SRSTRE2_TABLE_FILE),
+        ("MRSAB", MRSAB_TABLE_FILE),
+        ("MRDEF", MRDEF_TABLE_FILE),
+        ("MRSAT", MRSAT_TABLE_FILE),
+        ("SRGRP", SRGRP_TABLE_FILE),
+    ]
+
+    if release_source is not None:
+        for table, _ in table_files:
+            print(f"Inserting data into {table} table")
+            stream_insert(conn, table, release_source, batch_size)
+        release_source.close()
+    elif workers > 1:
+        parallel_insert(
+            conn, [(table, f.name) for table, f in table_files], workers=workers
         )
+    else:
+        for table, table_file in table_files:
+            print(f"Inserting data into {table} table")
+            if bulk:
+                bulk_insert(conn, table, table_file, batch_size)
+            else:
+                insert_rows(c, table, table_file)
+
+    if compact:
+        print("Converting to compact schema")
+        compact_sqlite_db.compact_db(conn)
 
     # create indices for faster queries
+    # (built once all tables are loaded, followed by ANALYZE)
     print("Creating indices")
-    c.execute("CREATE INDEX X_mrsty_cui ON MRSTY (CUI);")
-    c.execute("CREATE INDEX X_mrconso_cui ON MRCONSO (CUI);")
-    c.execute("CREATE INDEX X_mrconso_sab ON MRCONSO (SAB);")
-    c.execute("CREATE INDEX X_mrrel_cui2 ON MRREL (CUI2);")
-    c.execute("CREATE INDEX X_mrrel_cui1 ON MRREL (CUI1);")
-    c.execute("CREATE INDEX X_mrrel_aui1 ON MRREL (AUI1);")
-    c.execute("CREATE INDEX X_mrrel_aui2 ON MRREL (AUI2);")
-    c.execute("CREATE INDEX X_mrhier_aui ON MRHIER (AUI);")
-    c.execute("CREATE INDEX X_mrhier_paui ON MRHIER (PAUI);")
-    c.execute("CREATE INDEX X_mrsat_cui ON MRSAT (CUI);")
+    create_indexes(conn, index_profile)
+
+    if fts:
+        print("Creating FTS5 term search indexes")
+        term_search.build_fts(conn)
 
     # Commit changes to umls_py.db
     conn.commit()
+    if bulk:
+        apply_pragmas(conn, DEFAULT_PRAGMAS)
+    if release is None and source is not None:
+        release = release_from_path(
+            " ".join([source] if isinstance(source, str) else source)
+        )
+    record_release(conn, release or release_from_path(umls_tables))
 
     success = True
     print("\nSQLite database created - umls_py.db")
 
 
 if __name__ == "__main__":
-    create_db()
+    parser = argparse.ArgumentParser(description=create_db.__doc__)
+    parser.add_argument("--bulk", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--index-profile", choices=sorted(INDEX_PROFILES), default="default"
+    )
+    parser.add_argument("--compact", action="store_true")
+    parser.add_argument("--fts", action="store_true")
+    parser.add_argument("--source", nargs="*", default=None)
+    args = parser.parse_args()
+
+    create_db(
+        bulk=args.bulk,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        index_profile=args.index_profile,
+        compact=args.compact,
+        fts=args.fts,
+        source=args.source,
+    )
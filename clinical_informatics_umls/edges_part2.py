@@ -12,10 +12,16 @@ Note: script run time will range from 30 seconds to 20 minutes depending on
         more a more efficient python library/libraries (rather than pandas).
     -> relative directory ../conf/config.prop contains properties file used
         at creation of this script.
+    -> The default engine (`--engine stream`, see stream_explode_mrhier())
+        streams MRHIER in chunks & explodes PTR paths into integer arrays,
+        keeping memory bounded. `--engine pandas` runs the original pandas
+        implementation.
 
 """
 
+import argparse
 import sys
+import time
 
 if not sys.warnoptions:
     import warnings
@@ -26,56 +32,74 @@ import numpy as np
 import pandas as pd
 import getpass
 
+from clinical_informatics_umls import rrf
+
 ####################################################################
 root = "Users"  # root directory
 home = getpass.getuser()
 path_to_mrhier = "../UMLS/subset/2022AA/META/MRHIER.RRF"
 ####################################################################
 
+# sab_list should contain same vocabs used in `nodes_edges_part1.py`
+sab_list = {"ATC", "GO", "ICD10CM", "NCI", "SNOMEDCT_US", "RXNORM"}
+
+# Zero padded width of the digits of an AUI (A0000001 ... A12345678)
+AUI_WIDTH = 7
+
+# MRHIER rows per chunk of the streaming engine (see stream_explode_mrhier())
+EXPLODE_CHUNK_SIZE = 1000000
+
 # Read MRHIER.RRF
 # Script assumes MRHIER.RRF is located in the relative directory ->
 # ../UMLS/subset/2021AB/META/MRHIER.RRF
 
 
-def read_transform_mrhier(path_to_mrhier: str):
+def read_transform_mrhier(path_to_mrhier: str, cache_dir: str = None):
     """
     Summary:
     --------
 
     Parameters:
     -----------
+    path_to_mrhier : str.
+        Path to MRHIER.RRF.
+    cache_dir : str.
+        Optional root directory of the Parquet cache (see parquet_cache.py) -
+        when provided MRHIER is read from the cache (SAB partitions of sab_list
+        only) instead of MRHIER.RRF.
 
     Returns:
     --------
+    mrhier : pd.DataFrame.
+        columns=['AUI', 'PTR']
 
     """
-    mrhier_rrf = pd.read_csv(path_to_mrhier, sep="|", header=None, dtype=object)
-    # sab_list should contain same vocabs used in `nodes_edges_part1.py`
-    sab_list = ["ATC", "GO", "ICD10CM", "NCI", "SNOMEDCT_US", "RXNORM"]
-    # Where axis=1 drop 9th index (align columns correctly)
-    # -> .RRF has extra column that needs to be dropped)
-    mrhier = mrhier_rrf.drop(9, axis=1)
-    print("Complete - MRHIER.RRF read in as .csv and empty column dropped")
-
-    # Assign column names (preserving source assigned names from UMLS)
-    mrhier.columns = ["CUI", "AUI", "CXN", "PAUI", "SAB", "RELA", "PTR", "HCD", "CVF"]
-    mrhier = mrhier[mrhier["SAB"].isin(sab_list)].drop_duplicates().replace(np.nan, "")
-
-    # We are only interested in the AUI & PTR cols --> filter dataframe
-    # accordingly
+    if cache_dir is not None:
+        from clinical_informatics_umls.parquet_cache import read_table
+
+        mrhier = read_table(cache_dir, "MRHIER", columns=["AUI", "PTR"], sabs=sab_list)
+        print("Complete - MRHIER read in from the parquet cache")
+        return mrhier.drop_duplicates()
+
+    # We are only interested in the AUI & PTR cols (of sab_list vocabularies)
+    # -> MRHIER.RRF is streamed in chunks projected onto AUI, PTR & SAB so only
+    # the rows kept are ever materialized.
     # PTR is a column containing '.' delimited AUIs where left -> right is
     # the descendant path of root node to PAUI (PARENT AUI).
     # -> The AUI column associated to each PTR column would be the next AUI
     # in the descendant path.
-    mrhier = mrhier[["AUI", "PTR"]]
+    rows = []
+    for chunk in rrf.iter_chunks(
+        path_to_mrhier, "MRHIER", columns=("AUI", "PTR", "SAB")
+    ):
+        rows.extend((aui, ptr) for aui, ptr, sab in chunk if sab in sab_list)
+    mrhier = pd.DataFrame(rows, columns=["AUI", "PTR"]).drop_duplicates()
+    print("Complete - MRHIER.RRF read in and filtered to sab_list")
     print("Complete. Beginning transforming table. (this may take ~15min)...")
 
     return mrhier
 
 
-mrhier = read_transform_mrhier(path_to_mrhier)
-
-
 def explode_write_mrhier(root: str, home: str, mrhier: pd.DataFrame):
     """
     Summary:
@@ -124,6 +148,141 @@ def explode_write_mrhier(root: str, home: str, mrhier: pd.DataFrame):
     )  # file ready for import
 
 
+def iter_ptr_chunks(
+    path_to_mrhier: str, cache_dir: str = None, chunk_size: int = EXPLODE_CHUNK_SIZE
+):
+    """
+    Summary:
+    --------
+    Stream (AUIs, PTRs) list pairs of the sab_list rows of MRHIER - from
+    MRHIER.RRF or from the Parquet cache (see parquet_cache.py).
+
+    """
+    if cache_dir is not None:
+        from clinical_informatics_umls.parquet_cache import iter_batches
+
+        for batch in iter_batches(
+            cache_dir, "MRHIER", columns=["AUI", "PTR"], sabs=sab_list
+        ):
+            yield batch.column("AUI").to_pylist(), batch.column("PTR").to_pylist()
+        return
+
+    for chunk in rrf.iter_chunks(
+        path_to_mrhier, "MRHIER", columns=("AUI", "PTR", "SAB"), chunk_size=chunk_size
+    ):
+        rows = [(aui, ptr) for aui, ptr, sab in chunk if sab in sab_list]
+        if rows:
+            auis, ptrs = zip(*rows)
+            yield list(auis), list(ptrs)
+
+
+def encode_auis(auis: str, count: int) -> np.ndarray:
+    """
+    Summary:
+    --------
+    Parse '.' delimited AUIs (i.e. 'A0000001.A0000002') into an int64 array
+    (prefix letter stripped) - validating that every AUI round trips through
+    the 'A' + AUI_WIDTH zero padded digits format used when writing them back.
+
+    """
+    codes = np.fromstring(auis.replace("A", ""), dtype=np.int64, sep=".")
+    digits = np.maximum(
+        AUI_WIDTH, np.floor(np.log10(np.maximum(codes, 1))).astype(int) + 1
+    )
+    if len(codes) != count or int(digits.sum()) + 2 * count - 1 != len(auis):
+        raise ValueError("MRHIER contains AUIs not of the form 'A' + digits")
+    return codes
+
+
+def stream_explode_mrhier(
+    path_to_mrhier: str,
+    out_path: str,
+    cache_dir: str = None,
+    chunk_size: int = EXPLODE_CHUNK_SIZE,
+) -> int:
+    """
+    Summary:
+    --------
+    Streaming, vectorized replacement of read_transform_mrhier() +
+    explode_write_mrhier(). MRHIER is read in chunks; each chunk's PTR paths
+    are split into flat int64 arrays of (ancestor, AUI) pairs - every AUI of
+    a PTR is an ancestor of the row's AUI. Pairs are packed into a single
+    uint64 key, deduplicated via sort-unique against the (sorted) keys already
+    written & only new edges are appended to `out_path`.
+    Rows without a PTR (hierarchy roots) produce no edge.
+
+    Parameters:
+    -----------
+    path_to_mrhier : str.
+        Path to MRHIER.RRF.
+    out_path : str.
+        Path of the output .csv (i.e. /Users/<home>/import/child_of_rel_ptr.csv).
+    cache_dir : str.
+        Optional root directory of the Parquet cache (read instead of
+        MRHIER.RRF).
+    chunk_size : int.
+        MRHIER rows per chunk.
+
+    Returns:
+    --------
+    edges : int.
+        Number of CHILD_OF edges written.
+
+    """
+    start = time.perf_counter()
+    seen = np.empty(0, dtype=np.uint64)
+    with open(out_path, "w") as f:
+        f.write(":START_ID,:END_ID,:TYPE\n")
+        for auis, ptrs in iter_ptr_chunks(path_to_mrhier, cache_dir, chunk_size):
+            keep = [i for i, ptr in enumerate(ptrs) if ptr]
+            if not keep:
+                continue
+            ptrs = [ptrs[i] for i in keep]
+            children = encode_auis(".".join(auis[i] for i in keep), len(keep))
+            lengths = np.fromiter(
+                (ptr.count(".") + 1 for ptr in ptrs), np.int64, len(ptrs)
+            )
+            parents = encode_auis(".".join(ptrs), int(lengths.sum()))
+            children = np.repeat(children, lengths)
+
+            mask = parents != children
+            keys = np.unique(
+                (parents[mask].astype(np.uint64) << np.uint64(32))
+                | children[mask].astype(np.uint64)
+            )
+            new = keys[~np.isin(keys, seen, assume_unique=True)]
+            if len(new):
+                np.savetxt(
+                    f,
+                    np.column_stack(
+                        (new >> np.uint64(32), new & np.uint64(0xFFFFFFFF))
+                    ),
+                    fmt=f"A%0{AUI_WIDTH}d,A%0{AUI_WIDTH}d,CHILD_OF",
+                )
+                seen = np.concatenate((seen, new))
+                seen.sort(kind="mergesort")  # merge of two sorted runs
+            print(f"\t{len(seen):,} edges ({time.perf_counter() - start:.2f}s)")
+    return len(seen)
+
+
 if __name__ == "__main__":
-    explode_write_mrhier(root, home, mrhier)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cache", default=None, help="Parquet cache directory")
+    parser.add_argument(
+        "--engine",
+        choices=("stream", "pandas"),
+        default="stream",
+        help="stream -> stream_explode_mrhier(), pandas -> explode_write_mrhier()",
+    )
+    args = parser.parse_args()
+
+    if args.engine == "stream":
+        stream_explode_mrhier(
+            path_to_mrhier,
+            f"/{root}/{home}/import/child_of_rel_ptr.csv",
+            cache_dir=args.cache,
+        )
+    else:
+        mrhier = read_transform_mrhier(path_to_mrhier, cache_dir=args.cache)
+        explode_write_mrhier(root, home, mrhier)
     print("child_of_rel_ptr.csv written out...")
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+"""
+Approximate (fuzzy) term matching over normalized MRCONSO strings.
+
+`build_fuzzy_index()` normalizes the strings of the filtered MRCONSO atoms
+(lower case, no diacritics, punctuation -> spaces) & stores character trigram
+postings of every distinct normalized string:
+    - FUZZY_STRING  : ID, NORM (normalized string), STR (an original string)
+    - FUZZY_CONCEPT : ID -> CUI
+    - FUZZY_TRIGRAM : TRIGRAM -> DF & IDS (sorted uint32 string IDs, as blob)
+    - FUZZY_NGRAMS  : number of trigrams of every string (uint16 blob)
+
+`fuzzy_match()` resolves batches of (possibly misspelled or abbreviated)
+input terms to CUIs by trigram similarity (|A & B| / |A | B|, as pg_trgm).
+The postings of a whole batch are fetched within a single query. For each
+term, candidates are taken from the postings of its rarest trigrams only
+(prefix filtering), strings whose trigram count makes the threshold
+unreachable are dropped (length filtering) & the overlap of the remaining
+candidates is counted against the postings via numpy binary searches.
+Matches above the threshold are mapped onto CUIs & ranked within SQLite.
+
+Invoke via:
+`python fuzzy_match.py --db ../sqlite/umls_py.db --sabs SNOMEDCT_US NCI`
+`python fuzzy_match.py --match terms.txt --threshold 0.4`
+
+Example:
+--------
+from clinical_informatics_umls import fuzzy_match
+
+conn = sqlite3.connect("../sqlite/umls_py.db")
+fuzzy_match.fuzzy_match(conn, ["carcinoma of brest", "myocardial infarcton"])
+# -> [[('C0678222', 'Carcinoma of breast', 0.72), ...], [...]]
+"""
+
+import argparse
+import json
+import math
+import re
+import sqlite3
+import time
+import unicodedata
+
+import numpy as np
+
+from clinical_informatics_umls.nodes_edges_part1 import sab_list
+
+db_path = "../sqlite/umls_py.db"
+
+# Default similarity threshold & number of CUIs returned per term
+FUZZY_THRESHOLD = 0.5
+FUZZY_LIMIT = 5
+
+# Strings indexed per batch while building
+FUZZY_BUILD_BATCH_SIZE = 100000
+
+# Input terms matched per batch
+FUZZY_QUERY_BATCH_SIZE = 1000
+
+NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """
+    Summary:
+    --------
+    Lower case, strip diacritics & collapse everything but letters and
+    digits into single spaces ('Carcinoma of the Breast, NOS' ->
+    'carcinoma of the breast nos').
+
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(norm: str) -> set:
+    """
+    Summary:
+    --------
+    Character trigrams of a normalized string, each word padded with two
+    leading & one trailing space ('mi' -> {'  m', ' mi', 'mi '}).
+
+    """
+    grams = set()
+    for word in norm.split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def build_fuzzy_index(
+    conn: sqlite3.Connection,
+    sabs=sab_list,
+    lat: str = "ENG",
+    batch_size: int = FUZZY_BUILD_BATCH_SIZE,
+) -> int:
+    """
+    Summary:
+    --------
+    (Re)build the FUZZY_* tables from the atoms of `sabs` (see module
+    docstring).
+
+    Strings are read in batches; the postings of each batch are staged per
+    trigram & concatenated (in ID order) into FUZZY_TRIGRAM at the end, so
+    memory is bounded by `batch_size`.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    sabs : iterable.
+        Vocabularies (MRCONSO.SAB) to index.
+    lat : str.
+        Language (MRCONSO.LAT) to index.
+    batch_size : int.
+        Strings whose trigrams are computed per batch.
+
+    Returns:
+    --------
+    strings : int.
+        Number of distinct normalized strings indexed.
+
+    """
+    sabs = sorted(sabs)
+    params = ", ".join("?" * len(sabs))
+    start = time.perf_counter()
+    conn.create_function("umls_normalize", 1, normalize, deterministic=True)
+    # committed here unless run within the caller's transaction
+    owned = not conn.in_transaction
+    if owned:
+        conn.execute("BEGIN;")
+    for table in ("FUZZY_STRING", "FUZZY_CONCEPT", "FUZZY_TRIGRAM", "FUZZY_NGRAMS"):
+        conn.execute(f"DROP TABLE IF EXISTS {table};")
+    conn.execute(
+        "CREATE TABLE FUZZY_STRING( ID integer PRIMARY KEY, NORM varchar UNIQUE, STR varchar ) ;"
+    )
+    conn.execute(
+        "CREATE TABLE FUZZY_CONCEPT( ID integer, CUI varchar, PRIMARY KEY (ID, CUI) ) WITHOUT ROWID;"
+    )
+    conn.execute(
+        "CREATE TABLE FUZZY_TRIGRAM( TRIGRAM varchar PRIMARY KEY, DF integer, IDS blob ) ;"
+    )
+    conn.execute("CREATE TABLE FUZZY_NGRAMS( NGRAMS blob ) ;")
+
+    # 1. distinct normalized strings (& a representative original string)
+    conn.execute("DROP TABLE IF EXISTS temp.FUZZY_ATOM;")
+    conn.execute(
+        f"""CREATE TEMP TABLE FUZZY_ATOM AS
+        SELECT DISTINCT umls_normalize(STR) AS NORM, STR, CUI FROM MRCONSO
+        WHERE SAB IN ({params}) AND LAT = ? AND SUPPRESS = 'N';""",
+        (*sabs, lat),
+    )
+    conn.execute(
+        """INSERT INTO FUZZY_STRING( ID, NORM, STR )
+        SELECT ROW_NUMBER() OVER (ORDER BY NORM) - 1, NORM, MIN(STR)
+        FROM temp.FUZZY_ATOM WHERE NORM != ''
+        GROUP BY NORM;"""
+    )
+    conn.execute(
+        """INSERT OR IGNORE INTO FUZZY_CONCEPT( ID, CUI )
+        SELECT f.ID, a.CUI FROM temp.FUZZY_ATOM a JOIN FUZZY_STRING f ON f.NORM = a.NORM;"""
+    )
+    conn.execute("DROP TABLE temp.FUZZY_ATOM;")
+
+    # 2. postings, staged per (trigram, batch)
+    conn.execute("DROP TABLE IF EXISTS temp.FUZZY_POSTING;")
+    conn.execute(
+        "CREATE TEMP TABLE FUZZY_POSTING( TRIGRAM varchar, BATCH integer, IDS blob );"
+    )
+    ngrams = []
+    cursor = conn.cursor()
+    cursor.execute("SELECT ID, NORM FROM FUZZY_STRING ORDER BY ID;")
+    batch = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        postings = {}
+        for id_, norm in rows:
+            grams = trigrams(norm)
+            ngrams.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(id_)
+        conn.executemany(
+            "INSERT INTO temp.FUZZY_POSTING( TRIGRAM, BATCH, IDS ) VALUES( ?, ?, ? );",
+            (
+                (gram, batch, np.array(ids, dtype="<u4").tobytes())
+                for gram, ids in postings.items()
+            ),
+        )
+        batch += 1
+
+    # 3. one (sorted) posting list per trigram
+    cursor.execute(
+        "SELECT TRIGRAM, IDS FROM temp.FUZZY_POSTING ORDER BY TRIGRAM, BATCH;"
+    )
+    current, parts = None, []
+
+    def flush():
+        ids = b"".join(parts)
+        conn.execute(
+            "INSERT INTO FUZZY_TRIGRAM( TRIGRAM, DF, IDS ) VALUES( ?, ?, ? );",
+            (current, len(ids) // 4, ids),
+        )
+
+    for gram, ids in cursor:
+        if gram != current and parts:
+            flush()
+            parts = []
+        current = gram
+        parts.append(ids)
+    if parts:
+        flush()
+    conn.execute("DROP TABLE temp.FUZZY_POSTING;")
+    conn.execute(
+        "INSERT INTO FUZZY_NGRAMS( NGRAMS ) VALUES( ? );",
+        (np.array(ngrams, dtype="<u2").tobytes(),),
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS UMLS_METADATA( KEY varchar PRIMARY KEY, VALUE varchar ) ;"
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO UMLS_METADATA( KEY, VALUE ) VALUES( 'fuzzy_index', ? );",
+        (json.dumps({"sabs": sabs, "lat": lat}),),
+    )
+    if owned:
+        conn.commit()
+    print(f"FUZZY_STRING: {len(ngrams)} strings ({time.perf_counter() - start:.2f}s)")
+    return len(ngrams)
+
+
+def fuzzy_index_config(conn: sqlite3.Connection):
+    """
+    Summary:
+    --------
+    Vocabularies & language the fuzzy index was built for (None when never
+    built).
+
+    """
+    try:
+        row = conn.execute(
+            "SELECT VALUE FROM UMLS_METADATA WHERE KEY = 'fuzzy_index';"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def load_ngrams(conn: sqlite3.Connection) -> np.ndarray:
+    (blob,) = conn.execute("SELECT NGRAMS FROM FUZZY_NGRAMS;").fetchone()
+    return np.frombuffer(blob, dtype="<u2")
+
+
+def match_term(
+    term_grams: set, postings: dict, ngrams: np.ndarray, threshold: float
+) -> tuple:
+    """
+    Summary:
+    --------
+    IDs & similarities of the strings reaching `threshold` for one term.
+
+    A string reaching `threshold` shares at least ceil(threshold * n) of the
+    n trigrams of the term, hence at least one of its (n - that + 1) rarest
+    trigrams, & has between ceil(threshold * n) and floor(n / threshold)
+    trigrams itself.
+
+    """
+    n = len(term_grams)
+    empty = np.empty(0, dtype="<u4"), np.empty(0)
+    if not n:
+        return empty
+    overlap = math.ceil(threshold * n - 1e-9)
+    ordered = sorted(term_grams, key=lambda gram: (len(postings.get(gram, ())), gram))
+    prefix = [postings[gram] for gram in ordered[: n - overlap + 1] if gram in postings]
+    if not prefix:
+        return empty
+    candidates = np.unique(np.concatenate(prefix))
+    sizes = ngrams[candidates]
+    keep = (sizes >= overlap) & (sizes <= math.floor(n / threshold + 1e-9))
+    candidates, sizes = candidates[keep], sizes[keep].astype(np.int64)
+    if not len(candidates):
+        return empty
+
+    shared = np.zeros(len(candidates), dtype=np.int64)
+    for gram in ordered:
+        ids = postings.get(gram)
+        if ids is None:
+            continue
+        idx = np.minimum(ids.searchsorted(candidates), len(ids) - 1)
+        shared += ids[idx] == candidates
+    similarity = shared / (n + sizes - shared)
+    found = similarity >= threshold - 1e-9
+    return candidates[found], similarity[found]
+
+
+def match_batch(
+    conn: sqlite3.Connection,
+    terms: list,
+    ngrams: np.ndarray,
+    threshold: float,
+    limit: int,
+) -> list:
+    grams = [trigrams(normalize(term)) for term in terms]
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS FUZZY_QUERY( TRIGRAM varchar PRIMARY KEY ) WITHOUT ROWID;"
+    )
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS FUZZY_RESULT( QID integer, ID integer, SIMILARITY real );"
+    )
+    conn.execute("DELETE FROM temp.FUZZY_QUERY;")
+    conn.execute("DELETE FROM temp.FUZZY_RESULT;")
+
+    # postings of every trigram of the batch
+    conn.executemany(
+        "INSERT INTO temp.FUZZY_QUERY( TRIGRAM ) VALUES( ? );",
+        ((gram,) for gram in set().union(*grams)),
+    )
+    postings = {
+        gram: np.frombuffer(ids, dtype="<u4")
+        for gram, ids in conn.execute(
+            """SELECT t.TRIGRAM, t.IDS FROM temp.FUZZY_QUERY q
+            JOIN FUZZY_TRIGRAM t ON t.TRIGRAM = q.TRIGRAM;"""
+        )
+    }
+    for qid, term_grams in enumerate(grams):
+        ids, similarity = match_term(term_grams, postings, ngrams, threshold)
+        conn.executemany(
+            "INSERT INTO temp.FUZZY_RESULT( QID, ID, SIMILARITY ) VALUES( ?, ?, ? );",
+            zip([qid] * len(ids), ids.tolist(), similarity.tolist()),
+        )
+
+    # best string of each CUI, top `limit` CUIs per term
+    result = conn.execute(
+        """SELECT QID, CUI, STR, SIMILARITY FROM (
+            SELECT QID, CUI, STR, SIMILARITY, ROW_NUMBER() OVER (
+                PARTITION BY QID ORDER BY SIMILARITY DESC, CUI
+            ) AS N
+            FROM (
+                SELECT r.QID, c.CUI, f.STR, r.SIMILARITY, ROW_NUMBER() OVER (
+                    PARTITION BY r.QID, c.CUI ORDER BY r.SIMILARITY DESC, f.STR
+                ) AS BEST
+                FROM temp.FUZZY_RESULT r
+                JOIN FUZZY_CONCEPT c ON c.ID = r.ID
+                JOIN FUZZY_STRING f ON f.ID = r.ID
+            )
+            WHERE BEST = 1
+        )
+        WHERE N <= ?
+        ORDER BY QID, N;""",
+        (limit,),
+    ).fetchall()
+
+    matches = [[] for _ in terms]
+    for qid, cui, string, similarity in result:
+        matches[qid].append((cui, string, round(similarity, 4)))
+    return matches
+
+
+def fuzzy_match(
+    conn: sqlite3.Connection,
+    terms: list,
+    threshold: float = FUZZY_THRESHOLD,
+    limit: int = FUZZY_LIMIT,
+    batch_size: int = FUZZY_QUERY_BATCH_SIZE,
+) -> list:
+    """
+    Summary:
+    --------
+    Resolve input terms to CUIs by trigram similarity of their normalized
+    forms, `batch_size` terms at a time.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+        Connection to a database built via build_fuzzy_index().
+    terms : list.
+        Input terms (i.e. "carcinoma of brest").
+    threshold : float.
+        Minimum similarity (0 < threshold <= 1).
+    limit : int.
+        Maximum number of CUIs returned per term.
+    batch_size : int.
+        Terms whose postings are fetched per query.
+
+    Returns:
+    --------
+    matches : list.
+        Per term (in the order of `terms`), a list of (CUI, matched string,
+        similarity) tuples by descending similarity.
+
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be within (0, 1]")
+    terms = list(terms)
+    ngrams = load_ngrams(conn)
+    matches = []
+    for i in range(0, len(terms), batch_size):
+        matches.extend(
+            match_batch(conn, terms[i : i + batch_size], ngrams, threshold, limit)
+        )
+    return matches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--sabs", nargs="*", default=list(sab_list))
+    parser.add_argument("--lat", default="ENG")
+    parser.add_argument(
+        "--match", default=None, help="file of terms (one per line) to match"
+    )
+    parser.add_argument("--threshold", type=float, default=FUZZY_THRESHOLD)
+    parser.add_argument("--limit", type=int, default=FUZZY_LIMIT)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.match:
+        with open(args.match, encoding="utf-8") as f:
+            terms = [line.strip() for line in f if line.strip()]
+        start = time.perf_counter()
+        results = fuzzy_match(conn, terms, args.threshold, args.limit)
+        for term, matches in zip(terms, results):
+            for cui, string, similarity in matches:
+                print(f"{term}\t{cui}\t{string}\t{similarity}")
+        print(f"{len(terms)} terms matched ({time.perf_counter() - start:.2f}s)")
+    else:
+        build_fuzzy_index(conn, args.sabs, args.lat)
+    conn.close()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Precomputed transitive closure of the source hierarchies within MRHIER.
+
+Every MRHIER row carries the full path (PTR) from the root of its hierarchy
+to the atom's parent, so each row yields an (ancestor, descendant, distance)
+pair for every AUI of the path. Pairs are mapped onto source codes (MRCONSO)
+and stored per SAB within the MRHIER_CLOSURE table (shortest distance across
+contexts), indexed in both directions - subsumption checks & subtree
+enumeration then become index lookups rather than recursive walks of PTR
+strings or multi-hop traversals of CHILD_OF edges.
+
+Invoke via:
+`python hierarchy_closure.py --db ../sqlite/umls_py.db --sabs SNOMEDCT_US NCI`
+
+Example:
+--------
+from clinical_informatics_umls import hierarchy_closure
+
+conn = sqlite3.connect("../sqlite/umls_py.db")
+hierarchy_closure.is_subsumed(
+    conn, "SNOMEDCT_US", [("44054006", "73211009"), ("22298006", "73211009")]
+)  # -> [True, False]
+hierarchy_closure.descendants(conn, "SNOMEDCT_US", "73211009")
+
+"""
+
+import argparse
+import sqlite3
+import time
+
+from clinical_informatics_umls.nodes_edges_part1 import sab_list
+
+db_path = "../sqlite/umls_py.db"
+
+# MRHIER rows exploded per batch
+CLOSURE_BATCH_SIZE = 100000
+
+
+def create_closure_table(conn: sqlite3.Connection):
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS MRHIER_CLOSURE(
+            SAB varchar,
+            ANCESTOR varchar,
+            DESCENDANT varchar,
+            DISTANCE integer,
+            PRIMARY KEY (SAB, ANCESTOR, DESCENDANT)
+        ) WITHOUT ROWID;"""
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS X_closure_desc ON MRHIER_CLOSURE (SAB, DESCENDANT, ANCESTOR, DISTANCE);"
+    )
+
+
+def explode_paths(rows) -> list:
+    """
+    Summary:
+    --------
+    (SAB, AUI, PTR) rows of MRHIER -> (SAB, ancestor AUI, AUI, distance) pairs.
+
+    """
+    pairs = []
+    for sab, aui, ptr in rows:
+        if not ptr:
+            continue
+        path = ptr.split(".")
+        depth = len(path)
+        pairs.extend((sab, ancestor, aui, depth - i) for i, ancestor in enumerate(path))
+    return pairs
+
+
+def build_closure(
+    conn: sqlite3.Connection, sabs=sab_list, batch_size: int = CLOSURE_BATCH_SIZE
+) -> int:
+    """
+    Summary:
+    --------
+    (Re)build MRHIER_CLOSURE for the hierarchies of `sabs`.
+
+    MRHIER is streamed in batches, each exploded into AUI level pairs which are
+    mapped onto codes & upserted into MRHIER_CLOSURE, keeping the shortest
+    distance of each (SAB, ANCESTOR, DESCENDANT).
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    sabs : iterable.
+        Vocabularies (MRHIER.SAB) to build the closure of.
+    batch_size : int.
+        MRHIER rows exploded per batch.
+
+    Returns:
+    --------
+    rows : int.
+        Number of closure rows of `sabs`.
+
+    """
+    sabs = sorted(sabs)
+    params = ", ".join("?" * len(sabs))
+    start = time.perf_counter()
+    # committed here unless run within the caller's transaction
+    owned = not conn.in_transaction
+    if owned:
+        conn.execute("BEGIN;")
+    create_closure_table(conn)
+    conn.execute(f"DELETE FROM MRHIER_CLOSURE WHERE SAB IN ({params});", sabs)
+
+    # AUI -> CODE of the atoms of `sabs`
+    conn.execute("DROP TABLE IF EXISTS temp.CLOSURE_AUI;")
+    conn.execute(
+        "CREATE TEMP TABLE CLOSURE_AUI( AUI varchar PRIMARY KEY, CODE varchar ) WITHOUT ROWID;"
+    )
+    conn.execute(
+        f"INSERT OR IGNORE INTO temp.CLOSURE_AUI( AUI, CODE ) SELECT AUI, CODE FROM MRCONSO WHERE SAB IN ({params});",
+        sabs,
+    )
+    conn.execute("DROP TABLE IF EXISTS temp.CLOSURE_PAIRS;")
+    conn.execute(
+        "CREATE TEMP TABLE CLOSURE_PAIRS( SAB varchar, ANCESTOR varchar, DESCENDANT varchar, DISTANCE integer );"
+    )
+
+    cursor = conn.execute(
+        f"SELECT SAB, AUI, PTR FROM MRHIER WHERE SAB IN ({params});", sabs
+    )
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        conn.executemany(
+            "INSERT INTO temp.CLOSURE_PAIRS( SAB, ANCESTOR, DESCENDANT, DISTANCE ) VALUES( ?, ?, ?, ? );",
+            explode_paths(rows),
+        )
+        conn.execute(
+            """INSERT INTO MRHIER_CLOSURE( SAB, ANCESTOR, DESCENDANT, DISTANCE )
+            SELECT p.SAB, a.CODE, d.CODE, MIN(p.DISTANCE)
+            FROM temp.CLOSURE_PAIRS p
+            JOIN temp.CLOSURE_AUI a ON a.AUI = p.ANCESTOR
+            JOIN temp.CLOSURE_AUI d ON d.AUI = p.DESCENDANT
+            WHERE a.CODE != d.CODE
+            GROUP BY p.SAB, a.CODE, d.CODE
+            ON CONFLICT (SAB, ANCESTOR, DESCENDANT)
+            DO UPDATE SET DISTANCE = MIN(DISTANCE, excluded.DISTANCE);"""
+        )
+        conn.execute("DELETE FROM temp.CLOSURE_PAIRS;")
+
+    conn.execute("DROP TABLE temp.CLOSURE_PAIRS;")
+    conn.execute("DROP TABLE temp.CLOSURE_AUI;")
+    (count,) = conn.execute(
+        f"SELECT COUNT(*) FROM MRHIER_CLOSURE WHERE SAB IN ({params});", sabs
+    ).fetchone()
+    if owned:
+        conn.commit()
+    conn.execute("ANALYZE MRHIER_CLOSURE;")
+    print(f"MRHIER_CLOSURE: {count} rows ({time.perf_counter() - start:.2f}s)")
+    return count
+
+
+def closure_sabs(conn: sqlite3.Connection) -> list:
+    """
+    Summary:
+    --------
+    Vocabularies MRHIER_CLOSURE has been built for (empty when never built).
+
+    """
+    try:
+        return [
+            sab for (sab,) in conn.execute("SELECT DISTINCT SAB FROM MRHIER_CLOSURE;")
+        ]
+    except sqlite3.OperationalError:
+        return []
+
+
+def is_subsumed(conn: sqlite3.Connection, sab: str, pairs: list) -> list:
+    """
+    Summary:
+    --------
+    Batched subsumption check - whether each descendant code is (at any depth)
+    below its ancestor code within the hierarchy of `sab`. A code subsumes
+    itself.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    sab : str.
+        Vocabulary (i.e. SNOMEDCT_US).
+    pairs : list.
+        (descendant code, ancestor code) tuples.
+
+    Returns:
+    --------
+    subsumed : list of bool (in the order of `pairs`).
+
+    """
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS SUBSUMPTION_QUERY( ID integer PRIMARY KEY, DESCENDANT varchar, ANCESTOR varchar );"
+    )
+    conn.execute("DELETE FROM temp.SUBSUMPTION_QUERY;")
+    conn.executemany(
+        "INSERT INTO temp.SUBSUMPTION_QUERY( ID, DESCENDANT, ANCESTOR ) VALUES( ?, ?, ? );",
+        ((i, desc, anc) for i, (desc, anc) in enumerate(pairs)),
+    )
+    result = conn.execute(
+        """SELECT q.DESCENDANT = q.ANCESTOR OR EXISTS (
+            SELECT 1 FROM MRHIER_CLOSURE c
+            WHERE c.SAB = ? AND c.ANCESTOR = q.ANCESTOR AND c.DESCENDANT = q.DESCENDANT
+        )
+        FROM temp.SUBSUMPTION_QUERY q
+        ORDER BY q.ID;""",
+        (sab,),
+    ).fetchall()
+    conn.execute("DELETE FROM temp.SUBSUMPTION_QUERY;")
+    return [bool(subsumed) for (subsumed,) in result]
+
+
+def descendants(
+    conn: sqlite3.Connection, sab: str, code: str, max_distance: int = None
+) -> list:
+    """
+    Summary:
+    --------
+    Subtree enumeration - every (descendant code, distance) below `code`
+    within the hierarchy of `sab` (optionally up to `max_distance` levels).
+
+    """
+    query = (
+        "SELECT DESCENDANT, DISTANCE FROM MRHIER_CLOSURE WHERE SAB = ? AND ANCESTOR = ?"
+    )
+    params = [sab, code]
+    if max_distance is not None:
+        query += " AND DISTANCE <= ?"
+        params.append(max_distance)
+    return conn.execute(query + " ORDER BY DISTANCE, DESCENDANT;", params).fetchall()
+
+
+def ancestors(
+    conn: sqlite3.Connection, sab: str, code: str, max_distance: int = None
+) -> list:
+    """
+    Summary:
+    --------
+    Every (ancestor code, distance) above `code` within the hierarchy of `sab`
+    (optionally up to `max_distance` levels).
+
+    """
+    query = (
+        "SELECT ANCESTOR, DISTANCE FROM MRHIER_CLOSURE WHERE SAB = ? AND DESCENDANT = ?"
+    )
+    params = [sab, code]
+    if max_distance is not None:
+        query += " AND DISTANCE <= ?"
+        params.append(max_distance)
+    return conn.execute(query + " ORDER BY DISTANCE, ANCESTOR;", params).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--sabs", nargs="*", default=list(sab_list))
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    build_closure(conn, args.sabs)
+    conn.close()
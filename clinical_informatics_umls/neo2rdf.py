@@ -1,11 +1,55 @@
 #!/usr/bin/env python3
+"""
+Serialize the Neo4j UMLS graph to RDF via the neosemantics (n10s) HTTP
+endpoint (NEO4J_HTTP_URL, i.e. http://localhost:7474/rdf/neo4j/cypher).
+
+    - neo_to_rdf()   : single query sample (LIMIT 100) re-serialized via rdflib
+    - export_graph() : full graph export. Every node label & relationship type
+                       is split into pages (lists of id()) walked once via
+                       the transactional endpoint (NEO4J_TX_URL, derived
+                       from NEO4J_HTTP_URL when not set) & kept in a .pages
+                       file. Pages are fetched concurrently by id seek
+                       (`WHERE id(x) IN $ids`) as N-Triples/Turtle &
+                       appended as is to one file per label/type - no
+                       rdflib.Graph is built. Completed pages are recorded
+                       within a state file, so an interrupted export resumes
+                       where it stopped.
+
+Invoke via:
+`python neo2rdf.py --paginated --out ../output_data/rdf/ --workers 4`
+"""
+
+import argparse
 import json
 import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
 
 import rdflib
 import requests
 from dotenv import load_dotenv
 
+from clinical_informatics_umls.umls_downloader import pooled_session
+
+# Nodes/relationships per page
+PAGE_SIZE = 10000
+
+# Pages walked per keyset query of page_ids()
+BOUNDS_PER_QUERY = 100
+
+# Concurrent page fetches
+EXPORT_WORKERS = 4
+
+# n10s serialization format -> file extension (formats whose documents can
+# be appended to one another)
+RDF_FORMATS = {"N-Triples": ".nt", "Turtle": ".ttl"}
+
+# Name of the resume state file within the output directory
+STATE_FILE = "export_state.json"
+
+# Seconds before an HTTP request is abandoned
+REQUEST_TIMEOUT = 600
+
 
 def neo_to_rdf(dot: str) -> rdflib.Graph:
     """
@@ -54,5 +98,317 @@ def neo_to_rdf(dot: str) -> rdflib.Graph:
     return graph
 
 
+def tx_url_from(url: str, database: str = "neo4j") -> str:
+    """
+    Summary:
+    --------
+    Transactional Cypher endpoint of the server hosting the n10s endpoint
+    (http://host:7474/rdf/neo4j/cypher -> http://host:7474/db/neo4j/tx/commit).
+
+    """
+    parts = urlsplit(url)
+    segments = [segment for segment in parts.path.split("/") if segment]
+    if len(segments) >= 2 and segments[0] == "rdf":
+        database = segments[1]
+    return f"{parts.scheme}://{parts.netloc}/db/{database}/tx/commit"
+
+
+def run_cypher(
+    session: requests.Session, tx_url: str, statement: str, params: dict = None
+) -> list:
+    """
+    Summary:
+    --------
+    Rows of a Cypher statement run via the transactional HTTP endpoint.
+
+    """
+    response = session.post(
+        tx_url,
+        json={"statements": [{"statement": statement, "parameters": params or {}}]},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get("errors"):
+        raise RuntimeError(f"Cypher error: {body['errors']}")
+    return [record["row"] for record in body["results"][0]["data"]]
+
+
+def export_targets(
+    session: requests.Session, tx_url: str, labels: list = None, rel_types: list = None
+) -> list:
+    """
+    Summary:
+    --------
+    (kind, name) of every node label ("node") & relationship type ("rel") to
+    export - all of the graph's unless provided.
+
+    """
+    if labels is None:
+        labels = [row[0] for row in run_cypher(session, tx_url, "CALL db.labels()")]
+    if rel_types is None:
+        rel_types = [
+            row[0] for row in run_cypher(session, tx_url, "CALL db.relationshipTypes()")
+        ]
+    return [("node", label) for label in sorted(labels)] + [
+        ("rel", rel_type) for rel_type in sorted(rel_types)
+    ]
+
+
+def match_clause(kind: str, name: str) -> tuple:
+    if kind == "node":
+        return f"MATCH (x:`{name}`)", "x"
+    return f"MATCH ()-[x:`{name}`]->()", "x"
+
+
+def page_ids(
+    session: requests.Session,
+    tx_url: str,
+    kind: str,
+    name: str,
+    page_size: int,
+    path: str,
+) -> int:
+    """
+    Summary:
+    --------
+    Write the pages of a label/relationship type to `path` - one JSON list of
+    `page_size` id()s per line, in id() order. The ids are walked
+    BOUNDS_PER_QUERY pages per query (WHERE id(x) > $last ... LIMIT), so no
+    query holds more than page_size * BOUNDS_PER_QUERY ids.
+
+    Returns:
+    --------
+    pages : int.
+        Number of pages written.
+
+    """
+    match, var = match_clause(kind, name)
+    limit = page_size * BOUNDS_PER_QUERY
+    pages, last = 0, -1
+    # written to a temporary file & renamed, so the pages are never partial
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        while True:
+            rows = run_cypher(
+                session,
+                tx_url,
+                f"""{match} WHERE id({var}) > $last
+                WITH id({var}) AS k ORDER BY k LIMIT $limit
+                RETURN collect(k)""",
+                {"last": last, "limit": limit},
+            )
+            ids = rows[0][0] if rows else []
+            for i in range(0, len(ids), page_size):
+                f.write(json.dumps(ids[i : i + page_size]) + "\n")
+                pages += 1
+            if len(ids) < limit:
+                break
+            last = ids[-1]
+    os.replace(f"{path}.tmp", path)
+    return pages
+
+
+def page_cypher(kind: str, name: str, ids: list) -> tuple:
+    # id(x) IN $ids is planned as a node/relationship by id seek
+    match, var = match_clause(kind, name)
+    return f"{match} WHERE id({var}) IN $ids RETURN {var}", {"ids": ids}
+
+
+def fetch_page(
+    session: requests.Session,
+    url: str,
+    kind: str,
+    name: str,
+    ids: list,
+    rdf_format: str,
+) -> bytes:
+    """
+    Summary:
+    --------
+    RDF serialization of one page via the n10s endpoint.
+
+    """
+    cypher, params = page_cypher(kind, name, ids)
+    response = session.post(
+        url,
+        json={"cypher": cypher, "cypherParams": params, "format": rdf_format},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    content = response.content
+    return content if not content or content.endswith(b"\n") else content + b"\n"
+
+
+def iter_pages(out_dir: str, targets: list, files: dict):
+    """
+    Summary:
+    --------
+    (file name, kind, name, page index, ids) of every page not yet done, read
+    lazily from the .pages files.
+
+    """
+    for file_name, kind, name in targets:
+        done = set(files[file_name]["done"])
+        with open(os.path.join(out_dir, f"{file_name}.pages"), encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                if i not in done:
+                    yield file_name, kind, name, i, json.loads(line)
+
+
+def load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    # written to a temporary file & renamed, so the state is never partial
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def export_graph(
+    dot: str,
+    out_dir: str = "../output_data/rdf/",
+    labels: list = None,
+    rel_types: list = None,
+    page_size: int = PAGE_SIZE,
+    workers: int = EXPORT_WORKERS,
+    rdf_format: str = "N-Triples",
+    resume: bool = True,
+) -> dict:
+    """
+    Summary:
+    --------
+    Paginated, streaming export of the full graph (see module docstring).
+
+    Each label/relationship type is written to <out_dir>/<node|rel>_<name>
+    (.nt or .ttl), its pages kept in <out_dir>/<node|rel>_<name>.<ext>.pages.
+    After every page is appended, the state file records the page as done
+    along with the file's size - on resume, files are truncated back to that
+    size (dropping a partially written page) & only pages not yet done are
+    fetched.
+
+    Parameters:
+    -----------
+    dot : str.
+        .env file via python-dotenv containing database authentication information.
+    out_dir : str.
+        Output directory.
+    labels, rel_types : list.
+        Node labels/relationship types to export (all of the graph's when None).
+    page_size : int.
+        Nodes/relationships per page.
+    workers : int.
+        Concurrent page fetches.
+    rdf_format : str.
+        "N-Triples" or "Turtle".
+    resume : bool.
+        Continue from the state file of a previous (interrupted) export
+        rather than starting over.
+
+    Returns:
+    --------
+    pages : dict.
+        Output file name -> number of pages exported.
+
+    """
+    if rdf_format not in RDF_FORMATS:
+        raise ValueError(f"rdf_format must be one of {list(RDF_FORMATS)}")
+    load_dotenv(dot)
+    url = os.getenv("NEO4J_HTTP_URL")
+    tx_url = os.getenv("NEO4J_TX_URL") or tx_url_from(url)
+    auth = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
+    # pooled (one connection per worker) & retrying transient errors - the
+    # n10s & transactional endpoints only run read queries here
+    session = pooled_session(workers)
+    session.auth = auth
+
+    os.makedirs(out_dir, exist_ok=True)
+    state_path = os.path.join(out_dir, STATE_FILE)
+    state = load_state(state_path) if resume else {}
+    if state.get("format", rdf_format) != rdf_format:
+        raise ValueError(f"{state_path} was written for {state['format']}")
+    state["format"] = rdf_format
+    files = state.setdefault("files", {})
+
+    # pages are walked once & kept, so a resumed export fetches the same pages
+    targets = []
+    for kind, name in export_targets(session, tx_url, labels, rel_types):
+        file_name = f"{kind}_{name}{RDF_FORMATS[rdf_format]}"
+        if file_name not in files:
+            pages = page_ids(
+                session,
+                tx_url,
+                kind,
+                name,
+                page_size,
+                os.path.join(out_dir, f"{file_name}.pages"),
+            )
+            files[file_name] = {"pages": pages, "done": [], "size": 0}
+            print(f"{file_name}: {pages} pages")
+        entry = files[file_name]
+        with open(os.path.join(out_dir, file_name), "ab") as f:
+            f.truncate(entry["size"])
+        targets.append((file_name, kind, name))
+    save_state(state_path, state)
+    remaining = sum(
+        files[file_name]["pages"] - len(files[file_name]["done"])
+        for file_name, _, _ in targets
+    )
+    print(f"{remaining} pages to export")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        queue, running = iter_pages(out_dir, targets, files), {}
+        page = next(queue, None)
+        while page or running:
+            while page and len(running) < 2 * workers:
+                file_name, kind, name, i, ids = page
+                future = executor.submit(
+                    fetch_page, session, url, kind, name, ids, rdf_format
+                )
+                running[future] = (file_name, i)
+                page = next(queue, None)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file_name, i = running.pop(future)
+                content = future.result()
+                entry = files[file_name]
+                with open(os.path.join(out_dir, file_name), "ab") as f:
+                    f.write(content)
+                    entry["size"] = f.tell()
+                entry["done"].append(i)
+                save_state(state_path, state)
+
+    print("complete serialization")
+    return {file_name: len(entry["done"]) for file_name, entry in files.items()}
+
+
 if __name__ == "__main__":
-    neo_to_rdf(dot="../.env")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dot", default="../.env")
+    parser.add_argument("--paginated", action="store_true")
+    parser.add_argument("--out", default="../output_data/rdf/")
+    parser.add_argument("--labels", nargs="*", default=None)
+    parser.add_argument("--rel-types", nargs="*", default=None)
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    parser.add_argument("--format", default="N-Triples", choices=list(RDF_FORMATS))
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    if args.paginated:
+        export_graph(
+            args.dot,
+            args.out,
+            labels=args.labels,
+            rel_types=args.rel_types,
+            page_size=args.page_size,
+            workers=args.workers,
+            rdf_format=args.format,
+            resume=not args.restart,
+        )
+    else:
+        neo_to_rdf(dot=args.dot)
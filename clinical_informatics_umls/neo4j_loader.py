@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+"""
+Load the UMLS graph from umls_py.db into a running Neo4j database over bolt.
+This is an online alternative to writing the node/edge .csv files of
+nodes_edges_part1.py & running `neo4j-admin import`, which requires the
+database to be offline & not to exist yet.
+
+Rows are those of the graph import (see nodes_edges_part1.stream_jobs()),
+sent as parameterized `UNWIND $rows ... MERGE` transactions of BATCH_SIZE rows
+across concurrent sessions (one per worker thread):
+    1. constraints & indexes - the schema of cypher_queries/part1.cypher for
+       the labels & keys of the import (a uniqueness constraint on the :ID of
+       every node label, indexes on SAB/CODE of AUI & Code nodes)
+    2. nodes - every node file, including the ICD-O-3 appends
+    3. relationships - once every node they MATCH on exists
+Nodes & relationships mirror `neo4j-admin import` of the .csv files: the :ID
+column is stored as a property named after its ID space (i.e. AUI:ID -> AUI),
+empty values are not stored & relationships with a missing endpoint are
+skipped. Every write is a MERGE, so a populated graph is refreshed in place.
+
+The target is any object with write(statement, parameters) & close() methods
+- Neo4jTarget (neo4j driver, NEO4J_BOLT_URI/NEO4J_USERNAME/NEO4J_PASSWORD of
+the .env file) or a local stand-in.
+
+Invoke via:
+`python neo4j_loader.py --dot ../.env --batch-size 10000 --workers 4`
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+from clinical_informatics_umls.create_sqlite_db import apply_pragmas
+from clinical_informatics_umls.nodes_edges_part1 import (
+    QUERIES,
+    STREAM_MEMORY_MB,
+    stream_jobs,
+    stream_settings,
+)
+from clinical_informatics_umls.sqlite2rdf import EDGE_ENDPOINTS, iter_query
+
+db_path = "../sqlite/umls_py.db"
+
+# Rows per UNWIND transaction
+BATCH_SIZE = 10000
+
+# Concurrent sessions
+LOAD_WORKERS = 4
+
+# Properties indexed per node label (as the indexes of part1.cypher)
+SCHEMA_INDEXES = {"AUI": ("SAB", "CODE"), "Code": ("SAB", "CODE")}
+
+# Seconds to wait for new indexes to come online before loading
+INDEX_TIMEOUT = 600
+
+
+class Neo4jTarget:
+    """
+    Neo4j database written to via the neo4j driver - one session per thread,
+    each write within a managed (retried on transient errors, i.e.
+    deadlocks) write transaction.
+    """
+
+    def __init__(self, uri: str, auth: tuple, database: str = None):
+        self.driver = GraphDatabase.driver(uri, auth=auth)
+        self.database = database
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = self.driver.session(database=self.database)
+            with self.lock:
+                self.sessions.append(self.local.session)
+        return self.local.session
+
+    def write(self, statement: str, parameters: dict = None):
+        self.session().write_transaction(
+            lambda tx: tx.run(statement, parameters or {}).consume()
+        )
+
+    def close(self):
+        for session in self.sessions:
+            session.close()
+        self.driver.close()
+
+
+def name(identifier: str) -> str:
+    # label, property & relationship type names are escaped (i.e. `MED-RT`)
+    return "`" + identifier.replace("`", "``") + "`"
+
+
+def schema_statements(node_headers: list) -> list:
+    """
+    Summary:
+    --------
+    Constraint & index statements (idempotent) of the node labels & keys of
+    the node file headers.
+
+    """
+    statements = []
+    for header in node_headers:
+        label = header[0].split(":")[0]
+        statements.append(
+            f"CREATE CONSTRAINT IF NOT EXISTS FOR (x:{name(label)}) "
+            f"REQUIRE x.{name(label)} IS UNIQUE"
+        )
+        statements.extend(
+            f"CREATE INDEX IF NOT EXISTS FOR (x:{name(label)}) ON (x.{name(column)})"
+            for column in SCHEMA_INDEXES.get(label, ())
+        )
+    statements.append(f"CALL db.awaitIndexes({INDEX_TIMEOUT})")
+    return statements
+
+
+def node_batches(header: list, chunk: list) -> dict:
+    """
+    Summary:
+    --------
+    Group the rows of a node file chunk per MERGE statement (the labels
+    beyond the ID space, i.e. 'Code;SNOMEDCT_US', cannot be parameters).
+
+    Returns:
+    --------
+    batches : dict.
+        Statement -> list of {"id": ..., "properties": {...}}.
+
+    """
+    label = header[0].split(":")[0]
+    label_column = header.index(":LABEL")
+    columns = [
+        (i, column) for i, column in enumerate(header[1:], 1) if i != label_column
+    ]
+    batches = {}
+    for row in chunk:
+        extra = "".join(
+            f":{name(extra)}"
+            for extra in row[label_column].split(";")
+            if extra and extra != label
+        )
+        statement = (
+            f"UNWIND $rows AS row MERGE (n:{name(label)} {{{name(label)}: row.id}}) "
+            + f"SET n += row.properties{', n' + extra if extra else ''}"
+        )
+        properties = {
+            column: str(row[i]) for i, column in columns if row[i] not in (None, "")
+        }
+        batches.setdefault(statement, []).append(
+            {"id": str(row[0]), "properties": properties}
+        )
+    return batches
+
+
+def relationship_batches(file_name: str, chunk: list) -> dict:
+    """
+    Summary:
+    --------
+    Group the rows of a relationship file chunk per MERGE statement (one per
+    relationship type) - rows missing an endpoint or type are skipped.
+
+    """
+    start_space, end_space = EDGE_ENDPOINTS[file_name]
+    batches = {}
+    for start, end, rel_type in chunk:
+        if not (start and end and rel_type):
+            continue
+        statement = (
+            "UNWIND $rows AS row "
+            f"MATCH (s:{name(start_space)} {{{name(start_space)}: row.start}}) "
+            f"MATCH (e:{name(end_space)} {{{name(end_space)}: row.end}}) "
+            f"MERGE (s)-[:{name(rel_type)}]->(e)"
+        )
+        batches.setdefault(statement, []).append({"start": start, "end": end})
+    return batches
+
+
+def load_sources(
+    target,
+    conn: sqlite3.Connection,
+    sources: list,
+    batch_size: int,
+    workers: int,
+    chunk_rows: int,
+) -> dict:
+    """
+    Summary:
+    --------
+    Stream the rows of every (file name, sql, header) source out of `conn` &
+    write them as batches over `workers` concurrent sessions. At most
+    2 * `workers` batches are pending at once, so memory stays bounded by the
+    batch size rather than the size of the graph.
+
+    Returns:
+    --------
+    rows : dict.
+        File name -> number of rows written.
+
+    """
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def drain(limit: int):
+            while len(pending) > limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_name, rows = pending.pop(future)
+                    future.result()
+                    counts[file_name] = counts.get(file_name, 0) + rows
+
+        for file_name, sql, header in sources:
+            start = time.perf_counter()
+            loaded = counts.get(file_name, 0)
+            for chunk in iter_query(conn, sql, min(chunk_rows, batch_size)):
+                if file_name in EDGE_ENDPOINTS:
+                    batches = relationship_batches(file_name, chunk)
+                else:
+                    batches = node_batches(header, chunk)
+                for statement, rows in batches.items():
+                    for i in range(0, len(rows), batch_size):
+                        batch = rows[i : i + batch_size]
+                        drain(2 * workers - 1)
+                        future = executor.submit(
+                            target.write, statement, {"rows": batch}
+                        )
+                        pending[future] = (file_name, len(batch))
+            drain(0)
+            elapsed = time.perf_counter() - start
+            rows = counts.get(file_name, 0) - loaded
+            print(
+                f"{file_name}: {rows} rows loaded in {elapsed:.1f}s "
+                f"({rows / max(elapsed, 1e-9):,.0f} rows/s)"
+            )
+    return counts
+
+
+def load_graph(
+    target,
+    db: str = db_path,
+    queries: dict = QUERIES,
+    batch_size: int = BATCH_SIZE,
+    workers: int = LOAD_WORKERS,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+    schema: bool = True,
+) -> dict:
+    """
+    Summary:
+    --------
+    Load the UMLS graph into a live graph database (see module docstring).
+
+    Parameters:
+    -----------
+    target : Neo4jTarget (or any object with write(statement, parameters)).
+        Graph database written to - not closed by load_graph().
+    db : str.
+        Path to the sqlite3 database (umls_py.db), opened read-only.
+    queries : dict.
+        Query name -> SQL (see nodes_edges_part1.stream_nodes_edges()).
+    batch_size : int.
+        Rows per UNWIND transaction.
+    workers : int.
+        Concurrent sessions.
+    memory_limit_mb : int.
+        Memory ceiling (MiB) of the sqlite3 queries.
+    schema : bool.
+        Create the constraints & indexes first.
+
+    Returns:
+    --------
+    rows : dict.
+        File name -> number of rows written (nodes, then relationships).
+
+    """
+    jobs, appends = stream_jobs(queries)
+    headers = {file_name: header for file_name, _, header in jobs}
+    sources = jobs + [
+        (file_name, sql, headers[file_name]) for file_name, sql, _ in appends
+    ]
+    node_sources = [job for job in sources if job[0] not in EDGE_ENDPOINTS]
+    edge_sources = [job for job in sources if job[0] in EDGE_ENDPOINTS]
+
+    if schema:
+        print("Creating constraints & indexes")
+        node_headers = [
+            header for file_name, _, header in jobs if header[0].endswith(":ID")
+        ]
+        for statement in schema_statements(node_headers):
+            target.write(statement)
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    pragmas, chunk_rows = stream_settings(memory_limit_mb)
+    apply_pragmas(conn, pragmas)
+    try:
+        print("Loading nodes")
+        counts = load_sources(
+            target, conn, node_sources, batch_size, workers, chunk_rows
+        )
+        print("Loading relationships")
+        counts.update(
+            load_sources(target, conn, edge_sources, batch_size, workers, chunk_rows)
+        )
+    finally:
+        conn.close()
+    print(f"{sum(counts.values())} rows loaded")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dot", default="../.env")
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--database", default=None)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=LOAD_WORKERS)
+    parser.add_argument("--memory-limit-mb", type=int, default=STREAM_MEMORY_MB)
+    parser.add_argument("--skip-schema", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv(args.dot)
+    target = Neo4jTarget(
+        os.getenv("NEO4J_BOLT_URI"),
+        (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+        database=args.database,
+    )
+    try:
+        load_graph(
+            target,
+            args.db,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            memory_limit_mb=args.memory_limit_mb,
+            schema=not args.skip_schema,
+        )
+    finally:
+        target.close()
@@ -41,8 +41,15 @@ pgconn = psycopg2.connect(
     )
 """
 
+import argparse
+import csv
+import gzip
 import sys
 import os
+import queue
+import threading
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 if not sys.warnoptions:
     import warnings
@@ -54,16 +61,1041 @@ import numpy as np
 import pandas as pd
 import sqlite3
 
+from clinical_informatics_umls.create_sqlite_db import apply_pragmas
+from clinical_informatics_umls.working_set import materialize_working_set
+
 # umls_py.db SQLite database path (db_dir : str) & name (db_name : str)
 db_dir = "../sqlite/"
 db_name = "umls_py.db"
 
+# Directory the node/edge .csv files are written to
+import_dir = "../../../../import/"
+
+# Vocabularies extracted (same as the SAB IN (...) lists of each query below)
+sab_list = ["ATC", "HGNC", "ICD9CM", "ICD10CM", "NCI", "RXNORM", "SNOMEDCT_US"]
+
+
+def read_cached(cache_dir: str, name: str) -> pd.DataFrame:
+    """
+    Summary:
+    --------
+    Equivalent of each extraction query of `extract_nodes_edges` read from the
+    Parquet cache (see parquet_cache.py) rather than SQLite. Only the SAB
+    partitions & columns required are read, with the LAT/SUPPRESS/... filters
+    pushed down to the Parquet files.
+
+    Parameters:
+    -----------
+    cache_dir : str.
+        Root directory of the Parquet cache.
+    name : str.
+        Name of the query variable within `extract_nodes_edges`
+        (i.e. "concept_node").
+
+    Returns:
+    --------
+    df : pd.DataFrame.
+        Same columns (by position) as the SQL query.
+
+    """
+    from clinical_informatics_umls.parquet_cache import read_table
+
+    def mrconso(columns, **filters):
+        return read_table(
+            cache_dir,
+            "MRCONSO",
+            columns=columns,
+            sabs=sab_list,
+            filters={"SUPPRESS": "N", "LAT": "ENG", **filters},
+        )
+
+    def sab_code(df):
+        return df["SAB"] + "#" + df["CODE"]
+
+    if name in ("semantic_node", "has_sty_r"):
+        cuis = mrconso(["CUI"])["CUI"].unique().tolist()
+        mrsty = read_table(
+            cache_dir,
+            "MRSTY",
+            columns=["CUI", "TUI", "STY", "STN"],
+            filters={"CUI": cuis},
+        )
+        if name == "semantic_node":
+            df = mrsty[["TUI", "STY", "STN"]].assign(LABEL="TUI")
+        else:
+            df = mrsty[["CUI", "TUI"]].assign(TYPE="HAS_STY")
+    elif name == "concept_node":
+        df = mrconso(["CUI", "STR"], ISPREF="Y", TS="P", STT="PF")
+        df = df.assign(LABEL="Concept")
+    elif name == "atom_node":
+        columns = ["AUI", "STR", "SAB", "CODE", "TTY", "ISPREF", "TS"]
+        df = mrconso(columns, STT="PF")[columns].assign(LABEL="AUI")
+    elif name == "code_node":
+        df = mrconso(["SAB", "CODE"])
+        df = df.assign(ID=sab_code(df), LABEL="Code;" + df["SAB"])
+        df = df[["ID", "SAB", "CODE", "LABEL"]]
+    elif name == "has_umls_aui":
+        df = mrconso(["SAB", "CODE", "AUI"])
+        df = df.assign(ID=sab_code(df), TYPE="HAS_AUI")[["ID", "AUI", "TYPE"]]
+    elif name == "has_concept":
+        df = mrconso(["AUI", "CUI"]).assign(TYPE="HAS_CUI")
+    elif name == "cui_code_rel":
+        df = mrconso(["CUI", "SAB", "CODE"])
+        df = df.assign(ID=sab_code(df), TYPE="HAS_SOURCE_CODE")[["CUI", "ID", "TYPE"]]
+    elif name == "tui_tui":
+        srstr = read_table(cache_dir, "SRSTR", filters={"RL": "isa"})
+        srdef = read_table(cache_dir, "SRDEF", columns=["STY_RL", "UI"])
+        df = srstr.merge(srdef, left_on="STY_RL1", right_on="STY_RL").merge(
+            srdef, left_on="STY_RL2", right_on="STY_RL", suffixes=("_1", "_2")
+        )
+        df = df[df["UI_1"] != df["UI_2"]][["UI_1", "UI_2", "RL"]]
+    elif name == "concept_concept":
+        sabs = mrconso(["SAB"])["SAB"].unique().tolist()
+        df = read_table(
+            cache_dir,
+            "MRREL",
+            columns=["CUI2", "CUI1", "REL", "RELA"],
+            sabs=sabs,
+            filters={"SUPPRESS": "N"},
+        )
+        df = df.assign(TYPE=df["RELA"].where(df["RELA"] != "", df["REL"]))
+        df = df[["CUI2", "CUI1", "TYPE"]]
+    elif name == "child_of":
+        mrhier = read_table(cache_dir, "MRHIER", columns=["AUI", "PAUI"], sabs=sab_list)
+        atoms = read_table(
+            cache_dir,
+            "MRCONSO",
+            columns=["AUI", "CODE", "CUI"],
+            filters={"SUPPRESS": "N", "LAT": "ENG"},
+        )
+        df = mrhier.merge(atoms, on="AUI").merge(
+            atoms, left_on="PAUI", right_on="AUI", suffixes=("", "_2")
+        )
+        df = df[(df["CODE"] != df["CODE_2"]) & (df["CUI"] != df["CUI_2"])]
+        df = df[["PAUI", "AUI"]].assign(TYPE="CHILD_OF")
+    elif name == "icdo":
+        df = read_table(
+            cache_dir,
+            "MRSAT",
+            columns=["ATV", "SAB", "CODE"],
+            sabs=["NCI"],
+            filters={"ATN": "ICD-O-3_CODE", "SUPPRESS": "N"},
+        )
+        df = df[df["ATV"] != "0000/0"]
+        df = df.assign(ID=sab_code(df))[["ATV", "ID", "SAB"]]
+    else:
+        raise KeyError(f"No cached equivalent of query: {name}")
+
+    return df.drop_duplicates().reset_index(drop=True)
+
+
+# Extraction queries of `extract_nodes_edges` (keyed by output, see read_cached())
+QUERIES = {
+    "semantic_node": """
+    SELECT DISTINCT s.TUI, s.STY, s.STN, 'TUI' AS ":LABEL"
+    FROM MRSTY s
+    JOIN MRCONSO c ON s.CUI = c.CUI
+    WHERE c.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND c.SUPPRESS = 'N'
+    AND c.LAT = 'ENG';
+    """,
+    "concept_node": """
+    SELECT DISTINCT CUI, STR, 'Concept' AS ':LABEL'
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG'
+    AND ISPREF = 'Y'
+    AND TS = 'P'
+    AND STT = 'PF';
+    """,
+    "atom_node": """
+    SELECT DISTINCT AUI,STR,SAB,CODE,TTY,ISPREF,TS,'AUI'
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI', 'RXNORM', 'SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG'
+    AND STT = 'PF';
+    """,
+    "code_node": """
+    SELECT DISTINCT (SAB||'#'||CODE), SAB, CODE, ('Code'||';'||SAB)
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG';
+    """,
+    "has_sty_r": """
+    SELECT DISTINCT MRCONSO.CUI, MRSTY.TUI, 'HAS_STY' AS ":TYPE"
+    FROM MRSTY
+    JOIN MRCONSO ON MRSTY.CUI = MRCONSO.CUI
+    WHERE MRCONSO.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND MRCONSO.SUPPRESS = 'N'
+    AND MRCONSO.LAT = 'ENG';
+    """,
+    "has_umls_aui": """
+    SELECT DISTINCT (SAB || '#' || CODE), AUI, 'HAS_AUI'
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG';
+    """,
+    "has_concept": """
+    SELECT DISTINCT AUI, CUI, 'HAS_CUI'
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG';
+    """,
+    "tui_tui": """
+    SELECT DISTINCT s2.UI, s3.UI, s.RL
+    FROM SRSTR s
+    JOIN SRDEF s2 ON s.STY_RL1 = s2.STY_RL
+    JOIN SRDEF s3 ON s.STY_RL2 = s3.STY_RL
+    WHERE s2.UI != s3.UI
+    AND s.RL = 'isa';
+    """,
+    "concept_concept": """
+    WITH q AS (
+        SELECT DISTINCT SAB
+        FROM MRCONSO
+        WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+        AND SUPPRESS = 'N'
+        AND LAT = 'ENG')
+    SELECT CUI2, CUI1, CASE WHEN RELA = '' THEN REL ELSE RELA END AS ":TYPE"
+    FROM MRREL r
+    JOIN q ON r.SAB = q.SAB
+    WHERE r.SUPPRESS = 'N'
+    GROUP BY CUI2, CUI1, ":TYPE";
+    """,
+    "child_of": """
+    SELECT DISTINCT h.PAUI, c.AUI, 'CHILD_OF'
+    FROM MRHIER h
+    JOIN MRCONSO c ON h.AUI = c.AUI
+    JOIN MRCONSO c2 ON h.PAUI = c2.AUI
+    WHERE h.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND c.SUPPRESS = 'N'
+    AND c2.SUPPRESS = 'N'
+    AND c.LAT = 'ENG'
+    AND c2.LAT = 'ENG'
+    AND c.CODE != c2.CODE
+    AND c.CUI != c2.CUI;
+    """,
+    "cui_code_rel": """
+    SELECT DISTINCT CUI, (SAB || '#' || CODE), 'HAS_SOURCE_CODE'
+    FROM MRCONSO
+    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
+    AND SUPPRESS = 'N'
+    AND LAT = 'ENG';
+    """,
+    "icdo": """
+    SELECT DISTINCT ATV, (SAB||'#'||CODE), SAB
+    FROM MRSAT
+    WHERE SAB = 'NCI'
+    AND ATN = 'ICD-O-3_CODE'
+    AND SUPPRESS = 'N'
+    AND ATV != '0000/0';
+    """,
+}
+
+# Extraction queries joining the materialized working set (see working_set.py)
+# rather than filtering MRCONSO - formatted with the working set table names
+WS_QUERIES = {
+    "semantic_node": """
+    SELECT DISTINCT s.TUI, s.STY, s.STN, 'TUI' AS ":LABEL"
+    FROM MRSTY s
+    JOIN {cui} w ON s.CUI = w.CUI;
+    """,
+    "concept_node": """
+    SELECT DISTINCT CUI, STR, 'Concept' AS ':LABEL'
+    FROM {atom}
+    WHERE ISPREF = 'Y'
+    AND TS = 'P'
+    AND STT = 'PF';
+    """,
+    "atom_node": """
+    SELECT AUI,STR,SAB,CODE,TTY,ISPREF,TS,'AUI'
+    FROM {atom}
+    WHERE STT = 'PF';
+    """,
+    "code_node": """
+    SELECT CODE_ID, SAB, CODE, ('Code'||';'||SAB)
+    FROM {code};
+    """,
+    "has_sty_r": """
+    SELECT DISTINCT s.CUI, s.TUI, 'HAS_STY' AS ":TYPE"
+    FROM MRSTY s
+    JOIN {cui} w ON s.CUI = w.CUI;
+    """,
+    "has_umls_aui": """
+    SELECT DISTINCT (SAB || '#' || CODE), AUI, 'HAS_AUI'
+    FROM {atom};
+    """,
+    "has_concept": """
+    SELECT AUI, CUI, 'HAS_CUI'
+    FROM {atom};
+    """,
+    "tui_tui": QUERIES["tui_tui"],
+    "concept_concept": """
+    SELECT CUI2, CUI1, CASE WHEN RELA = '' THEN REL ELSE RELA END AS ":TYPE"
+    FROM MRREL r
+    JOIN {sab} q ON r.SAB = q.SAB
+    WHERE r.SUPPRESS = 'N'
+    GROUP BY CUI2, CUI1, ":TYPE";
+    """,
+    # the parent atom (c2) is not restricted to the vocabularies of the working set
+    "child_of": """
+    SELECT DISTINCT h.PAUI, c.AUI, 'CHILD_OF'
+    FROM MRHIER h
+    JOIN {atom} c ON h.AUI = c.AUI
+    JOIN {sab} q ON h.SAB = q.SAB
+    JOIN MRCONSO c2 ON h.PAUI = c2.AUI
+    WHERE c2.SUPPRESS = 'N'
+    AND c2.LAT = 'ENG'
+    AND c.CODE != c2.CODE
+    AND c.CUI != c2.CUI;
+    """,
+    "cui_code_rel": """
+    SELECT DISTINCT CUI, (SAB || '#' || CODE), 'HAS_SOURCE_CODE'
+    FROM {atom};
+    """,
+    "icdo": QUERIES["icdo"],
+}
+
+# MRCONSO columns read by the fused scan (see scan_mrconso())
+FUSED_COLUMNS = ("CUI", "STR", "SAB", "CODE", "AUI", "TTY", "ISPREF", "TS", "STT")
+
+# Rows fetched per chunk by the fused scan
+FUSED_CHUNK_SIZE = 100000
+
+
+def iter_source(
+    table: str,
+    columns: tuple,
+    conn: sqlite3.Connection = None,
+    cache_dir: str = None,
+    filtered: bool = True,
+    chunk_size: int = FUSED_CHUNK_SIZE,
+):
+    """
+    Summary:
+    --------
+    Stream the rows of a table from sqlite3 (cursor.fetchmany) or from the
+    Parquet cache (record batches) as lists of tuples.
+
+    Parameters:
+    -----------
+    table : str.
+        MRCONSO or MRSTY.
+    columns : tuple.
+        Columns of each yielded tuple.
+    conn : sqlite3.Connection.
+        Source database (when `cache_dir` is None).
+    cache_dir : str.
+        Root directory of the Parquet cache (see parquet_cache.py).
+    filtered : bool.
+        Restrict rows to `sab_list`, SUPPRESS = 'N' & LAT = 'ENG' (MRCONSO).
+    chunk_size : int.
+        Rows per fetchmany() call.
+
+    Returns:
+    --------
+    Generator yielding lists of tuples.
+
+    """
+    if cache_dir is not None:
+        from clinical_informatics_umls.parquet_cache import iter_batches
+
+        kwargs = {}
+        if filtered:
+            kwargs = {"sabs": sab_list, "filters": {"SUPPRESS": "N", "LAT": "ENG"}}
+        for batch in iter_batches(cache_dir, table, columns=list(columns), **kwargs):
+            yield list(zip(*(batch.column(col).to_pylist() for col in columns)))
+        return
+
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    if filtered:
+        sabs = ", ".join(f"'{sab}'" for sab in sab_list)
+        query += f" WHERE SAB IN ({sabs}) AND SUPPRESS = 'N' AND LAT = 'ENG'"
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def scan_mrconso(conn: sqlite3.Connection = None, cache_dir: str = None) -> dict:
+    """
+    Summary:
+    --------
+    Fused alternative to the separate MRCONSO queries of `extract_nodes_edges`.
+    The filtered MRCONSO rows are streamed once and each row is fanned out to
+    every MRCONSO derived output, each deduplicated on the fly (an insertion
+    ordered dict per output). MRSTY is then streamed once for both semantic
+    type outputs, keeping rows whose CUI was seen within MRCONSO.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+        Source database (when `cache_dir` is None).
+    cache_dir : str.
+        Root directory of the Parquet cache (see parquet_cache.py).
+
+    Returns:
+    --------
+    frames : dict.
+        Query variable name of `extract_nodes_edges` (i.e. "concept_node") ->
+        pd.DataFrame with the same columns (by position) as the query.
+
+    """
+    concepts, atoms, codes, has_aui, has_cui, cui_code = {}, {}, {}, {}, {}, {}
+    cuis = set()
+    for chunk in iter_source("MRCONSO", FUSED_COLUMNS, conn, cache_dir):
+        for cui, string, sab, code, aui, tty, ispref, ts, stt in chunk:
+            code_id = f"{sab}#{code}"
+            cuis.add(cui)
+            codes[code_id, sab, code] = None
+            has_aui[code_id, aui] = None
+            has_cui[aui, cui] = None
+            cui_code[cui, code_id] = None
+            if stt == "PF":
+                atoms.setdefault(aui, (aui, string, sab, code, tty, ispref, ts))
+                if ispref == "Y" and ts == "P":
+                    concepts[cui, string] = None
+
+    semantic_types, has_sty = {}, {}
+    mrsty_columns = ("CUI", "TUI", "STY", "STN")
+    for chunk in iter_source("MRSTY", mrsty_columns, conn, cache_dir, filtered=False):
+        for cui, tui, sty, stn in chunk:
+            if cui in cuis:
+                semantic_types[tui, sty, stn] = None
+                has_sty[cui, tui] = None
+
+    def frame(rows, columns, **constants):
+        return pd.DataFrame(list(rows), columns=columns).assign(**constants)
+
+    return {
+        "semantic_node": frame(semantic_types, ["TUI", "STY", "STN"], LABEL="TUI"),
+        "has_sty_r": frame(has_sty, ["CUI", "TUI"], TYPE="HAS_STY"),
+        "concept_node": frame(concepts, ["CUI", "STR"], LABEL="Concept"),
+        "atom_node": frame(
+            atoms.values(),
+            ["AUI", "STR", "SAB", "CODE", "TTY", "ISPREF", "TS"],
+            LABEL="AUI",
+        ),
+        "code_node": frame(
+            ((code_id, sab, code, f"Code;{sab}") for code_id, sab, code in codes),
+            ["ID", "SAB", "CODE", "LABEL"],
+        ),
+        "has_umls_aui": frame(has_aui, ["ID", "AUI"], TYPE="HAS_AUI"),
+        "has_concept": frame(has_cui, ["AUI", "CUI"], TYPE="HAS_CUI"),
+        "cui_code_rel": frame(cui_code, ["CUI", "ID"], TYPE="HAS_SOURCE_CODE"),
+    }
+
+
+# Default memory ceiling (MiB) of the streaming export (see stream_nodes_edges())
+STREAM_MEMORY_MB = 1024
+
+# Estimated size (bytes) of a fetched row, used to size fetchmany() chunks
+STREAM_ROW_BYTES = 512
+
+# Streaming export of each output: (file name, query, header, select
+# expressions over the query columns c0, c1, ..., WHERE clause, GROUP BY)
+# - DISTINCT (or GROUP BY when only part of a row is deduplicated on) and the
+# filters/casing applied via pandas by `extract_nodes_edges` are done in SQL.
+STREAM_OUTPUTS = (
+    (
+        "semanticTypeNode.csv",
+        "semantic_node",
+        ["TUI:ID", "STY", "STN", ":LABEL"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "conceptNode.csv",
+        "concept_node",
+        ["Concept:ID", "STR", ":LABEL"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "atomNode.csv",
+        "atom_node",
+        ["AUI:ID", "STR", "SAB", "CODE", "TTY", "ISPREF", "TS", ":LABEL"],
+        None,
+        None,
+        "c0",
+    ),
+    (
+        "codeNode.csv",
+        "code_node",
+        ["Code:ID", "SAB", "CODE", ":LABEL"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "has_sty_rel.csv",
+        "has_sty_r",
+        [":START_ID", ":END_ID", ":TYPE"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "has_aui_rel.csv",
+        "has_umls_aui",
+        [":START_ID", ":END_ID", ":TYPE"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "has_cui_rel.csv",
+        "has_concept",
+        [":START_ID", ":END_ID", ":TYPE"],
+        None,
+        None,
+        None,
+    ),
+    (
+        "tui_tui_rel.csv",
+        "tui_tui",
+        [":START_ID", ":END_ID", ":TYPE"],
+        ["c0", "c1", "UPPER(c2)"],
+        "c0 != c1",
+        "c0, c1, c2",
+    ),
+    (
+        "concept_concept_rel.csv",
+        "concept_concept",
+        [":START_ID", ":END_ID", ":TYPE"],
+        ["c0", "c1", "REPLACE(UPPER(c2), '-', '_')"],
+        "c0 != c1 AND c2 NOT IN ('SIB', 'SY')",
+        "c0, c1, c2",
+    ),
+    (
+        "child_of_rel.csv",
+        "child_of",
+        [":START_ID", ":END_ID", ":TYPE"],
+        None,
+        "c0 != c1",
+        None,
+    ),
+    (
+        "cui_code_rel.csv",
+        "cui_code_rel",
+        [":START_ID", ":END_ID", ":TYPE"],
+        None,
+        None,
+        None,
+    ),
+)
+
+
+def export_query(
+    query: str,
+    n_columns: int,
+    select: list = None,
+    where: str = None,
+    group_by: str = None,
+) -> str:
+    """
+    Summary:
+    --------
+    Wrap an extraction query (columns renamed c0, c1, ...) so that the
+    deduplication, NULL handling & filters of the export happen in SQL.
+
+    """
+    names = [f"c{i}" for i in range(n_columns)]
+    columns = ", ".join(f"IFNULL({col}, '')" for col in select or names)
+    sql = f"WITH export({', '.join(names)}) AS ({query.strip().rstrip(';')}) "
+    sql += (
+        f"SELECT {columns} FROM export"
+        if group_by
+        else f"SELECT DISTINCT {columns} FROM export"
+    )
+    if where:
+        sql += f" WHERE {where}"
+    if group_by:
+        sql += f" GROUP BY {group_by}"
+    return sql + ";"
+
+
+def stream_query(
+    conn: sqlite3.Connection,
+    sql: str,
+    file_name: str,
+    header: list = None,
+    chunk_rows: int = 100000,
+) -> int:
+    """
+    Summary:
+    --------
+    Write the result of `sql` to a .csv file chunk by chunk (fetchmany), so
+    that at most `chunk_rows` rows are held in memory.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    sql : str.
+    file_name : str.
+        Path to the .csv file.
+    header : list.
+        Header row - the file is appended to (without a header) when None.
+    chunk_rows : int.
+        Rows per fetchmany() call.
+
+    Returns:
+    --------
+    rows : int.
+        Number of rows written.
+
+    """
+    rows = 0
+    cursor = conn.execute(sql)
+    with open(file_name, "w" if header else "a", newline="") as csvfile:
+        writer = csv.writer(csvfile, lineterminator="\n")
+        if header:
+            writer.writerow(header)
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            writer.writerows(chunk)
+            rows += len(chunk)
+    cursor.close()
+    return rows
+
+
+def stream_jobs(queries: dict) -> tuple:
+    """
+    Summary:
+    --------
+    SQL of every streaming export job.
+
+    Returns:
+    --------
+    jobs : list.
+        (file name, sql, header) of each output - independent of each other.
+    appends : list.
+        (file name, sql, None) of the ICD-O-3 appends to codeNode.csv &
+        cui_code_rel.csv - each run once its file has been written.
+
+    """
+    jobs = [
+        (
+            file_name,
+            export_query(queries[name], len(header), select, where, group_by),
+            header,
+        )
+        for file_name, name, header, select, where, group_by in STREAM_OUTPUTS
+    ]
+
+    # Append both codeNode.csv & cui_code_rel.csv w/ ICDO3T & ICDO3M CODEs
+    icdo = f"WITH icdo(c0, c1, c2) AS ({queries['icdo'].strip().rstrip(';')})"
+    rel = f"rel(c0, c1, c2) AS ({queries['cui_code_rel'].strip().rstrip(';')})"
+    appends = [
+        (
+            "codeNode.csv",
+            f"{icdo} SELECT 'ICDO3#' || c0, 'ICDO3', c0, 'Code;ICDO3' FROM icdo;",
+            None,
+        ),
+        (
+            "cui_code_rel.csv",
+            f"""{icdo}, {rel}
+            SELECT DISTINCT IFNULL(rel.c0, ''), 'ICDO3#' || icdo.c0, 'HAS_SOURCE_CODE'
+            FROM icdo JOIN rel ON rel.c1 = icdo.c1;""",
+            None,
+        ),
+    ]
+    return jobs, appends
+
+
+def stream_settings(memory_limit_mb: int) -> tuple:
+    """
+    Summary:
+    --------
+    Split a memory ceiling between sqlite3 (page cache & soft heap limit, sorts
+    spill to temporary files beyond it) and the rows fetched per chunk.
+
+    Returns:
+    --------
+    (PRAGMAs, rows per fetchmany() call)
+
+    """
+    budget = memory_limit_mb * 1024 * 1024 // 2
+    pragmas = {
+        "cache_size": -(budget // 1024),  # negative value -> KiB
+        "soft_heap_limit": budget,
+        "temp_store": "FILE",
+    }
+    return pragmas, max(1000, budget // STREAM_ROW_BYTES)
+
+
+def stream_nodes_edges(
+    conn: sqlite3.Connection,
+    queries: dict = QUERIES,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+):
+    """
+    Summary:
+    --------
+    Bounded memory alternative to the pandas based export of
+    `extract_nodes_edges` - every output (and the ICD-O-3 appends) is
+    deduplicated in SQL & streamed to its .csv file in chunks.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    queries : dict.
+        Query name -> SQL (QUERIES, or WS_QUERIES formatted with the tables
+        of a working set).
+    memory_limit_mb : int.
+        Memory ceiling (MiB).
+
+    """
+    pragmas, chunk_rows = stream_settings(memory_limit_mb)
+    apply_pragmas(conn, pragmas)
+
+    jobs, appends = stream_jobs(queries)
+    for file_name, sql, header in jobs + appends:
+        rows = stream_query(conn, sql, import_dir + file_name, header, chunk_rows)
+        action = "written out" if header else "appended"
+        print(f"{file_name} successfully {action} ({rows} rows)...")
+
+
+def run_export_job(
+    db: str, sql: str, file_name: str, header: list, memory_limit_mb: int
+) -> int:
+    """
+    Summary:
+    --------
+    Run a single streaming export job over its own read-only connection (used
+    by worker processes in parallel_nodes_edges()).
+
+    """
+    conn = sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    pragmas, chunk_rows = stream_settings(memory_limit_mb)
+    apply_pragmas(conn, pragmas)
+    try:
+        return stream_query(conn, sql, file_name, header, chunk_rows)
+    finally:
+        conn.close()
+
+
+def parallel_nodes_edges(
+    db: str,
+    queries: dict = QUERIES,
+    workers: int = 4,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+):
+    """
+    Summary:
+    --------
+    Run the streaming export jobs (see stream_jobs()) across a pool of worker
+    processes, each with its own read-only sqlite3 connection. Each ICD-O-3
+    append is submitted once the file it appends to has been written.
+
+    Parameters:
+    -----------
+    db : str.
+        Path to the sqlite3 database.
+    queries : dict.
+        Query name -> SQL (see stream_nodes_edges()).
+    workers : int.
+        Number of worker processes.
+    memory_limit_mb : int.
+        Memory ceiling (MiB), shared evenly between the workers.
+
+    """
+    per_worker = max(1, memory_limit_mb // workers)
+    jobs, appends = stream_jobs(queries)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def submit(file_name, sql, header):
+            future = pool.submit(
+                run_export_job, db, sql, import_dir + file_name, header, per_worker
+            )
+            return future, file_name, header
+
+        running = [submit(*job) for job in jobs]
+        while running:
+            futures = {
+                future: (file_name, header) for future, file_name, header in running
+            }
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            running = [job for job in running if job[0] not in done]
+            for future in done:
+                file_name, header = futures[future]
+                action = "written out" if header else "appended"
+                print(f"{file_name} successfully {action} ({future.result()} rows)...")
+                if header:
+                    running.extend(
+                        submit(*append) for append in appends if append[0] == file_name
+                    )
+
+
+# gzip level of the data shards (fast - neo4j-admin import is read bound)
+SHARD_COMPRESSLEVEL = 1
+
+# Name of the `neo4j-admin import` argument file within the import directory
+ADMIN_ARGS_FILE = "neo4j_admin_import.args"
+
+# Chunks queued ahead of each shard writer thread (bounds memory use)
+SHARD_QUEUE_CHUNKS = 4
+
+
+def shard_of(value: str, shards: int) -> int:
+    # stable hash partition of a key
+    return zlib.crc32(str(value).encode("utf-8")) % shards
+
+
+def shard_jobs(queries: dict, shards: int) -> tuple:
+    """
+    Summary:
+    --------
+    Sharded export tasks - the query of every output (see stream_jobs()) &
+    the names of its `shards` data shards <stem>_partNN.csv.gz. The ICD-O-3
+    appends (a few thousand rows) are written as a single shard each.
+
+    Returns:
+    --------
+    tasks : list.
+        (file name, data file names, sql) of every task.
+    headers : dict.
+        File name -> header of every output.
+
+    """
+    jobs, appends = stream_jobs(queries)
+    headers = {file_name: header for file_name, _, header in jobs}
+    tasks = [
+        (
+            file_name,
+            [f"{file_name[:-4]}_part{i:02d}.csv.gz" for i in range(shards)],
+            sql,
+        )
+        for file_name, sql, _ in jobs
+    ]
+    tasks += [
+        (file_name, [f"{file_name[:-4]}_icdo3_part00.csv.gz"], sql)
+        for file_name, sql, _ in appends
+    ]
+    return tasks, headers
+
+
+def run_shard_job(db: str, sql: str, paths: list, memory_limit_mb: int) -> list:
+    """
+    Summary:
+    --------
+    Run `sql` once over its own read-only connection & route every row by
+    shard_of() of its leading (:ID / :START_ID) column to one of the gzipped
+    data shards `paths` (without header) - used by worker processes in
+    shard_nodes_edges(). Each shard is written by a thread of its own
+    (zlib releases the GIL, so shards compress in parallel) fed through a
+    bounded queue. The query deduplicates, so shards hold distinct rows.
+    Empty shards are removed.
+
+    Returns:
+    --------
+    rows : list.
+        Number of rows written to each shard.
+
+    """
+    errors = []
+    queues = [queue.Queue(maxsize=SHARD_QUEUE_CHUNKS) for _ in paths]
+
+    def write(path, chunks):
+        try:
+            with gzip.open(
+                path, "wt", newline="", compresslevel=SHARD_COMPRESSLEVEL
+            ) as csvfile:
+                writer = csv.writer(csvfile, lineterminator="\n")
+                while (chunk := chunks.get()) is not None:
+                    writer.writerows(chunk)
+        except Exception as e:
+            errors.append(e)
+            # keep consuming so that the fetching thread never blocks
+            while chunks.get() is not None:
+                pass
+
+    conn = sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    pragmas, chunk_rows = stream_settings(memory_limit_mb)
+    apply_pragmas(conn, pragmas)
+    writers = [
+        threading.Thread(target=write, args=(path, chunks), daemon=True)
+        for path, chunks in zip(paths, queues)
+    ]
+    for writer in writers:
+        writer.start()
+    rows = [0] * len(paths)
+    try:
+        cursor = conn.execute(sql)
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                break
+            routed = [[] for _ in paths]
+            for row in chunk:
+                routed[shard_of(row[0], len(paths))].append(row)
+            for i, shard in enumerate(routed):
+                if shard:
+                    queues[i].put(shard)
+                    rows[i] += len(shard)
+        cursor.close()
+    finally:
+        for chunks in queues:
+            chunks.put(None)
+        for writer in writers:
+            writer.join()
+        conn.close()
+    if errors:
+        raise errors[0]
+    for path, count in zip(paths, rows):
+        if not count:
+            os.remove(path)
+    return rows
+
+
+def neo4j_admin_args(groups: list, prefix: str = "import/") -> list:
+    """
+    Summary:
+    --------
+    `neo4j-admin import` arguments of the header & data files of every output
+    (one --nodes/--relationships group each).
+
+    Parameters:
+    -----------
+    groups : list.
+        (header file name, data file names, is node file) of every output.
+    prefix : str.
+        Directory of the files as seen by neo4j-admin.
+
+    """
+    args = ["--database=neo4j"]
+    for header_file, data_files, nodes in groups:
+        kind = "nodes" if nodes else "relationships"
+        files = ",".join(prefix + name for name in [header_file] + data_files)
+        args.append(f"--{kind}={files}")
+    args += ["--skip-bad-relationships=true", "--skip-duplicate-nodes=true"]
+    return args
+
+
+def shard_nodes_edges(
+    db: str,
+    queries: dict = QUERIES,
+    shards: int = 4,
+    workers: int = 4,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+    out_dir: str = import_dir,
+    prefix: str = "import/",
+) -> list:
+    """
+    Summary:
+    --------
+    `neo4j-admin import` optimized variant of the streaming export - every
+    output is written as a separate header file <stem>_header.csv & up to
+    `shards` gzipped data shards <stem>_partNN.csv.gz, which neo4j-admin
+    reads in parallel. Each output's query runs once, its rows routed by key
+    to shards compressed in parallel threads (see run_shard_job()). Outputs
+    (and the ICD-O-3 appends, written to a shard of their own) are exported
+    across a pool of worker processes. The matching argument list is written
+    to ADMIN_ARGS_FILE & printed.
+
+    Parameters:
+    -----------
+    db : str.
+        Path to the sqlite3 database.
+    queries : dict.
+        Query name -> SQL (see stream_nodes_edges()).
+    shards : int.
+        Number of key partitions (data shards) per output.
+    workers : int.
+        Number of worker processes.
+    memory_limit_mb : int.
+        Memory ceiling (MiB), shared evenly between the workers.
+    out_dir : str.
+        Directory the files are written to.
+    prefix : str.
+        Directory of the files as seen by neo4j-admin (i.e. within the
+        container).
+
+    Returns:
+    --------
+    args : list.
+        `neo4j-admin import` arguments.
+
+    """
+    per_worker = max(1, memory_limit_mb // workers)
+    tasks, headers = shard_jobs(queries, shards)
+
+    data_files = {file_name: [] for file_name in headers}
+    for file_name, header in headers.items():
+        with open(
+            os.path.join(out_dir, f"{file_name[:-4]}_header.csv"), "w", newline=""
+        ) as csvfile:
+            csv.writer(csvfile, lineterminator="\n").writerow(header)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (
+                pool.submit(
+                    run_shard_job,
+                    db,
+                    sql,
+                    [os.path.join(out_dir, name) for name in names],
+                    per_worker,
+                ),
+                file_name,
+                names,
+            )
+            for file_name, names, sql in tasks
+        ]
+        for future, file_name, names in futures:
+            rows = future.result()
+            data_files[file_name].extend(
+                name for name, count in zip(names, rows) if count
+            )
+            print(
+                f"{names[0].rsplit('_part', 1)[0]} successfully written out "
+                f"({sum(rows)} rows, {sum(1 for count in rows if count)} shards)..."
+            )
+
+    args = neo4j_admin_args(
+        [
+            (
+                f"{file_name[:-4]}_header.csv",
+                data_files[file_name],
+                header[0].endswith(":ID"),
+            )
+            for file_name, header in headers.items()
+        ],
+        prefix,
+    )
+    with open(os.path.join(out_dir, ADMIN_ARGS_FILE), "w") as f:
+        f.write("\n".join(args) + "\n")
+    print(" \\\n    ".join(["./bin/neo4j-admin import"] + args))
+    return args
+
+
 ################################################################
 # EXTRACT NEO4J GRAPH LABELS, NODES, PROPERTIES & RELATIONSHIPS
 ################################################################
 
 
-def extract_nodes_edges(db_dir: str, db_name: str):
+def extract_nodes_edges(
+    db_dir: str,
+    db_name: str,
+    cache_dir: str = None,
+    fused: bool = False,
+    working_set: bool = False,
+    streaming: bool = False,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+    workers: int = 1,
+    shards: int = 0,
+):
     """
     Summary:
     --------
@@ -75,6 +1107,27 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     Relative directory containing sqlite3 database 'umls_py.db'
         db_name : str.
     Name of sqlite3 database ("umls_py.db')
+        cache_dir : str.
+    Optional root directory of the Parquet cache (see parquet_cache.py) - when
+    provided every query is read from the cache instead of sqlite3.
+        fused : bool.
+    Derive every MRCONSO/MRSTY based output from a single streamed scan of
+    MRCONSO (see scan_mrconso()) instead of one query per output.
+        working_set : bool.
+    Materialize (or reuse) the filtered atoms/CUIs/codes/SABs once (see
+    working_set.py) & run the queries of WS_QUERIES against them.
+        streaming : bool.
+    Deduplicate in SQL & write every output in chunks (see
+    stream_nodes_edges()) rather than via pandas DataFrames.
+        memory_limit_mb : int.
+    Memory ceiling (MiB) of the streaming export.
+        workers : int.
+    Number of processes running the streaming export jobs in parallel (> 1
+    implies `streaming`).
+        shards : int.
+    When > 0, write separate header files & up to this many gzipped data
+    shards per output along with the `neo4j-admin import` argument list (see
+    shard_nodes_edges()). Implies `streaming`.
 
     Returns:
     --------
@@ -83,25 +1136,51 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # Establish database connection
     db = os.path.join(os.path.dirname(db_dir), db_name)
-    conn = sqlite3.connect(db)  # Create connection object
+    conn = sqlite3.connect(db) if cache_dir is None else None
+
+    ws_tables = None
+    if working_set and cache_dir is None:
+        ws_tables = materialize_working_set(conn, sab_list)
+
+    if streaming or workers > 1 or shards > 0:
+        if cache_dir is not None or fused:
+            raise ValueError("streaming export reads from sqlite3 only")
+        queries = QUERIES
+        if ws_tables is not None:
+            queries = {
+                name: query.format(**ws_tables) for name, query in WS_QUERIES.items()
+            }
+        if shards > 0:
+            conn.close()
+            shard_nodes_edges(db, queries, shards, workers, memory_limit_mb)
+        elif workers > 1:
+            conn.close()
+            parallel_nodes_edges(db, queries, workers, memory_limit_mb)
+        else:
+            stream_nodes_edges(conn, queries, memory_limit_mb)
+            conn.close()
+        return
+
+    fused_frames = {}
+    if fused:
+        print("Scanning MRCONSO (fused)...")
+        fused_frames = scan_mrconso(conn, cache_dir)
+
+    def read_query(name: str) -> pd.DataFrame:
+        if name in fused_frames:
+            return fused_frames.pop(name)
+        if cache_dir is not None:
+            return read_cached(cache_dir, name)
+        if ws_tables is not None:
+            return pd.read_sql_query(WS_QUERIES[name].format(**ws_tables), conn)
+        return pd.read_sql_query(QUERIES[name], conn)
 
     ################################################################
     ################################################################
 
     # Label: SemanticType
     # Import: semanticTypeNode.csv
-    semantic_node = """
-    SELECT DISTINCT s.TUI, s.STY, s.STN, 'TUI' AS ":LABEL"
-    FROM MRSTY s
-    JOIN MRCONSO c ON s.CUI = c.CUI
-    WHERE c.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND c.SUPPRESS = 'N'
-    AND c.LAT = 'ENG';
-    """
-
-    semanticTypeNode = (
-        pd.read_sql_query(semantic_node, conn).drop_duplicates().replace(np.nan, "")
-    )
+    semanticTypeNode = read_query("semantic_node").drop_duplicates().replace(np.nan, "")
 
     semanticTypeNode.columns = ["TUI:ID", "STY", "STN", ":LABEL"]
 
@@ -115,20 +1194,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # Label: Concept
     # Import: conceptNode.csv
-    concept_node = """
-    SELECT DISTINCT CUI, STR, 'Concept' AS ':LABEL'
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG'
-    AND ISPREF = 'Y'
-    AND TS = 'P'
-    AND STT = 'PF';
-    """
-
-    conceptNode = (
-        pd.read_sql_query(concept_node, conn).drop_duplicates().replace(np.nan, "")
-    )
+    conceptNode = read_query("concept_node").drop_duplicates().replace(np.nan, "")
 
     conceptNode.columns = ["Concept:ID", "STR", ":LABEL"]
 
@@ -142,19 +1208,8 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # Label: Atom
     # Import: atomNode.csv
-    atom_node = """
-    SELECT DISTINCT AUI,STR,SAB,CODE,TTY,ISPREF,TS,'AUI'
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI', 'RXNORM', 'SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG'
-    AND STT = 'PF';
-    """
-
     atomNode = (
-        pd.read_sql_query(atom_node, conn)
-        .drop_duplicates(subset=["AUI"])
-        .replace(np.nan, "")
+        read_query("atom_node").drop_duplicates(subset=["AUI"]).replace(np.nan, "")
     )
 
     atomNode.columns = ["AUI:ID", "STR", "SAB", "CODE", "TTY", "ISPREF", "TS", ":LABEL"]
@@ -169,15 +1224,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # Label: Code
     # Import: codeNode.csv
-    code_node = """
-    SELECT DISTINCT (SAB||'#'||CODE), SAB, CODE, ('Code'||';'||SAB)
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG';
-    """
-
-    codeNode = pd.read_sql_query(code_node, conn).drop_duplicates().replace(np.nan, "")
+    codeNode = read_query("code_node").drop_duplicates().replace(np.nan, "")
 
     codeNode.columns = ["Code:ID", "SAB", "CODE", ":LABEL"]
 
@@ -191,18 +1238,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     ################################################################
 
     # has_sty.csv
-    has_sty_r = """
-    SELECT DISTINCT MRCONSO.CUI, MRSTY.TUI, 'HAS_STY' AS ":TYPE"
-    FROM MRSTY
-    JOIN MRCONSO ON MRSTY.CUI = MRCONSO.CUI
-    WHERE MRCONSO.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND MRCONSO.SUPPRESS = 'N'
-    AND MRCONSO.LAT = 'ENG';
-    """
-
-    has_sty_rel = (
-        pd.read_sql_query(has_sty_r, conn).drop_duplicates().replace(np.nan, "")
-    )
+    has_sty_rel = read_query("has_sty_r").drop_duplicates().replace(np.nan, "")
 
     has_sty_rel.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -216,17 +1252,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # import: has_aui_rel.csv
 
-    has_umls_aui = """
-    SELECT DISTINCT (SAB || '#' || CODE), AUI, 'HAS_AUI'
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG';
-    """
-
-    has_aui_rel = (
-        pd.read_sql_query(has_umls_aui, conn).drop_duplicates().replace(np.nan, "")
-    )
+    has_aui_rel = read_query("has_umls_aui").drop_duplicates().replace(np.nan, "")
 
     has_aui_rel.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -254,17 +1280,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     # --> Adding only 'has_string' (AUI)-[has_string]->(CUI) OR exact cypher being: \
     # `(Atom)-[:has_string]->(Concept)`
 
-    has_concept = """
-    SELECT DISTINCT AUI, CUI, 'HAS_CUI'
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG';
-    """
-
-    has_cui_rel = (
-        pd.read_sql_query(has_concept, conn).drop_duplicates().replace(np.nan, "")
-    )
+    has_cui_rel = read_query("has_concept").drop_duplicates().replace(np.nan, "")
 
     has_cui_rel.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -278,18 +1294,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
     # import: tui_tui_rel.csv
     # Limit to SRSTR.RL = 'ISA' -> most useful part of semantic network
-    tui_tui = """
-    SELECT DISTINCT s2.UI, s3.UI, s.RL
-    FROM SRSTR s
-    JOIN SRDEF s2 ON s.STY_RL1 = s2.STY_RL
-    JOIN SRDEF s3 ON s.STY_RL2 = s3.STY_RL
-    WHERE s2.UI != s3.UI
-    AND s.RL = 'isa';
-    """
-
-    tui_tui_rel_df = (
-        pd.read_sql_query(tui_tui, conn).drop_duplicates().replace(np.nan, "")
-    )
+    tui_tui_rel_df = read_query("tui_tui").drop_duplicates().replace(np.nan, "")
 
     tui_tui_rel_df.columns = [":START_ID", ":END_ID", ":TYPE"]
     tui_tui_rel = (
@@ -318,21 +1323,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     # 'vocab' assigned to be a property of the relationship \
     # (i.e. Concept -- Concept relationship can be filtered to \
     # the vocabulary for which the relationship exists)
-    concept_concept = """
-    WITH q AS (
-        SELECT DISTINCT SAB
-        FROM MRCONSO
-        WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-        AND SUPPRESS = 'N'
-        AND LAT = 'ENG')
-    SELECT CUI2, CUI1, CASE WHEN RELA = '' THEN REL ELSE RELA END AS ":TYPE"
-    FROM MRREL r
-    JOIN q ON r.SAB = q.SAB
-    WHERE r.SUPPRESS = 'N'
-    GROUP BY CUI2, CUI1, ":TYPE";
-    """
-
-    concept_concept_rel = pd.read_sql_query(concept_concept, conn)
+    concept_concept_rel = read_query("concept_concept")
 
     concept_concept_rel.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -363,21 +1354,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     ################################################################
 
     # import: child_of_rel.csv -> alternative option to running edges_part2.py
-    child_of = """
-    SELECT DISTINCT h.PAUI, c.AUI, 'CHILD_OF'
-    FROM MRHIER h
-    JOIN MRCONSO c ON h.AUI = c.AUI
-    JOIN MRCONSO c2 ON h.PAUI = c2.AUI
-    WHERE h.SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND c.SUPPRESS = 'N'
-    AND c2.SUPPRESS = 'N'
-    AND c.LAT = 'ENG'
-    AND c2.LAT = 'ENG'
-    AND c.CODE != c2.CODE
-    AND c.CUI != c2.CUI;
-    """
-
-    child_of_rel = pd.read_sql_query(child_of, conn)
+    child_of_rel = read_query("child_of")
 
     child_of_rel.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -396,17 +1373,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     ################################################################
 
     # import: cui_code_rel.csv
-    cui_code_rel = """
-    SELECT DISTINCT CUI, (SAB || '#' || CODE), 'HAS_SOURCE_CODE'
-    FROM MRCONSO
-    WHERE SAB IN ('ATC','HGNC','ICD9CM','ICD10CM','NCI','RXNORM','SNOMEDCT_US')
-    AND SUPPRESS = 'N'
-    AND LAT = 'ENG';
-    """
-
-    has_source_code = (
-        pd.read_sql_query(cui_code_rel, conn).drop_duplicates().replace(np.nan, "")
-    )
+    has_source_code = read_query("cui_code_rel").drop_duplicates().replace(np.nan, "")
 
     has_source_code.columns = [":START_ID", ":END_ID", ":TYPE"]
 
@@ -421,16 +1388,7 @@ def extract_nodes_edges(db_dir: str, db_name: str):
     ################################################################
 
     # Append both codeNode.csv & cui_code_rel.csv w/ ICDO3T & ICDO3M CODEs
-    icdo = """
-    SELECT DISTINCT ATV, (SAB||'#'||CODE), SAB
-    FROM MRSAT
-    WHERE SAB = 'NCI'
-    AND ATN = 'ICD-O-3_CODE'
-    AND SUPPRESS = 'N'
-    AND ATV != '0000/0';
-    """
-
-    icdo_df = pd.read_sql_query(icdo, conn).drop_duplicates().replace(np.nan, "")
+    icdo_df = read_query("icdo").drop_duplicates().replace(np.nan, "")
 
     icdo_df.columns = ["CODE", ":END_ID", "SAB"]
     icdo_df["SAB"] = "ICDO3"
@@ -465,7 +1423,52 @@ def extract_nodes_edges(db_dir: str, db_name: str):
 
 
 if __name__ == "__main__":
-    extract_nodes_edges(db_dir, db_name)
+    parser = argparse.ArgumentParser(description=extract_nodes_edges.__doc__)
+    parser.add_argument("--cache", default=None, help="Parquet cache directory")
+    parser.add_argument(
+        "--fused", action="store_true", help="Single pass scan of MRCONSO"
+    )
+    parser.add_argument(
+        "--working-set",
+        action="store_true",
+        help="Materialize the filtered MRCONSO atoms once & join against them",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Deduplicate in SQL & write each output in chunks",
+    )
+    parser.add_argument(
+        "--memory-limit-mb",
+        type=int,
+        default=STREAM_MEMORY_MB,
+        help="Memory ceiling of the streaming export (MiB)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes running the streaming export jobs (implies --streaming)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=0,
+        help="Header files & gzipped data shards per output for neo4j-admin import",
+    )
+    args = parser.parse_args()
+
+    extract_nodes_edges(
+        db_dir,
+        db_name,
+        cache_dir=args.cache,
+        fused=args.fused,
+        working_set=args.working_set,
+        streaming=args.streaming,
+        memory_limit_mb=args.memory_limit_mb,
+        workers=args.workers,
+        shards=args.shards,
+    )
 
 ################################################################
 # NOTE: Do not include both output of `edges_part2.py` and the last output \
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+"""
+Optional columnar (Parquet) cache of the UMLS .RRF tables.
+
+Each table is converted once from its .RRF file into a Parquet dataset
+(../parquet/<TABLE>/) partitioned by SAB (hive style - SAB=NCI/, SAB=RXNORM/, ...)
+with low cardinality columns dictionary encoded. Readers then only touch the
+SAB partitions, row groups and columns they need (predicate pushdown & column
+projection) instead of materializing whole tables via SQLite or pandas.
+
+Requires pyarrow (`poetry install -E parquet` or `pip install pyarrow`).
+
+Invoke via:
+`python parquet_cache.py --meta ../UMLS/subset/2022AA/META/ --cache ../parquet/`
+"""
+
+import argparse
+import os
+import sys
+import time
+
+if not sys.warnoptions:
+    import warnings
+
+    warnings.simplefilter("ignore")
+
+from clinical_informatics_umls import rrf
+
+umls_tables = "../UMLS/subset/2022AA/META/"
+cache_dir = "../parquet/"
+
+# Tables converted by build_cache()
+CACHED_TABLES = (
+    "MRSTY",
+    "MRCONSO",
+    "MRREL",
+    "MRHIER",
+    "MRRANK",
+    "SRDEF",
+    "SRSTR",
+    "SRSTRE1",
+    "SRSTRE2",
+    "MRSAB",
+    "MRDEF",
+    "MRSAT",
+    "SRGRP",
+)
+
+# Tables partitioned by SAB (SAB is stored in the directory name only)
+PARTITIONED_TABLES = ("MRCONSO", "MRREL", "MRHIER", "MRSAT", "MRDEF", "MRRANK")
+
+# Low cardinality columns stored (and read back) as dictionary arrays
+DICTIONARY_COLUMNS = {
+    "LAT",
+    "TS",
+    "STT",
+    "ISPREF",
+    "TTY",
+    "SRL",
+    "SUPPRESS",
+    "CVF",
+    "STYPE",
+    "STYPE1",
+    "STYPE2",
+    "REL",
+    "RELA",
+    "SL",
+    "RG",
+    "DIR",
+    "ATN",
+    "TUI",
+    "STN",
+    "STY",
+    "CXN",
+}
+
+# Rows per record batch (and at most per Parquet row group)
+BATCH_SIZE = 500000
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+    except ImportError:
+        raise ImportError(
+            "The parquet cache requires pyarrow -> `poetry install -E parquet` "
+            "or `pip install pyarrow`"
+        )
+    return pyarrow, pyarrow.dataset
+
+
+def table_schema(table: str):
+    """
+    Summary:
+    --------
+    Arrow schema of a cached table (all columns are strings, low cardinality
+    columns dictionary encoded).
+
+    """
+    pa, _ = import_pyarrow()
+    return pa.schema(
+        [
+            (
+                col,
+                pa.dictionary(pa.int32(), pa.string())
+                if col in DICTIONARY_COLUMNS
+                else pa.string(),
+            )
+            for col in rrf.RRF_COLUMNS[table]
+        ]
+    )
+
+
+def build_table(path: str, table: str, cache_dir: str) -> int:
+    """
+    Summary:
+    --------
+    Convert a single .RRF file into a Parquet dataset (<cache_dir>/<table>/).
+
+    Parameters:
+    -----------
+    path : str.
+        Path to the .RRF/.pipe file.
+    table : str.
+        Table name (key of rrf.RRF_COLUMNS).
+    cache_dir : str.
+        Root directory of the cache.
+
+    Returns:
+    --------
+    rows : int.
+        Number of rows written.
+
+    """
+    pa, ds = import_pyarrow()
+    schema = table_schema(table)
+    columns = rrf.RRF_COLUMNS[table]
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for chunk in rrf.iter_chunks(path, table, chunk_size=BATCH_SIZE):
+            rows += len(chunk)
+            arrays = []
+            for i, field in enumerate(schema):
+                values = pa.array([row[i] for row in chunk], pa.string())
+                if pa.types.is_dictionary(field.type):
+                    values = values.dictionary_encode()
+                arrays.append(values)
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    partitioning = None
+    if table in PARTITIONED_TABLES:
+        partitioning = ds.partitioning(
+            pa.schema([schema.field(columns.index("SAB"))]), flavor="hive"
+        )
+    ds.write_dataset(
+        batches(),
+        os.path.join(cache_dir, table),
+        schema=schema,
+        format="parquet",
+        partitioning=partitioning,
+        existing_data_behavior="delete_matching",
+        max_rows_per_group=BATCH_SIZE,
+    )
+    return rows
+
+
+def build_cache(umls_tables: str, cache_dir: str, tables: tuple = CACHED_TABLES):
+    """
+    Summary:
+    --------
+    Convert the .RRF files of a release into the Parquet cache.
+
+    Parameters:
+    -----------
+    umls_tables : str.
+        META directory (i.e. ../UMLS/subset/2022AA/META/).
+    cache_dir : str.
+        Root directory of the cache (one sub-directory per table).
+    tables : tuple.
+        Tables to convert.
+
+    """
+    for table in tables:
+        start = time.perf_counter()
+        rows = build_table(rrf.find_rrf(umls_tables, table), table, cache_dir)
+        print(f"\t{table}: {rows} rows cached ({time.perf_counter() - start:.2f}s)")
+
+
+def filter_expression(sabs=None, filters: dict = None):
+    """
+    Summary:
+    --------
+    Build a pyarrow.dataset filter expression from a SAB list and column ->
+    value equality filters (a list/set/tuple value means `IN`).
+
+    """
+    _, ds = import_pyarrow()
+    expression = None
+    conditions = dict(filters or {})
+    if sabs is not None:
+        conditions["SAB"] = list(sabs)
+    for col, value in conditions.items():
+        if isinstance(value, (list, set, tuple)):
+            condition = ds.field(col).isin(list(value))
+        else:
+            condition = ds.field(col) == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_dataset(cache_dir: str, table: str):
+    pa, ds = import_pyarrow()
+    partitioning = None
+    if table in PARTITIONED_TABLES:
+        partitioning = ds.partitioning(pa.schema([("SAB", pa.string())]), flavor="hive")
+    return ds.dataset(
+        os.path.join(cache_dir, table), format="parquet", partitioning=partitioning
+    )
+
+
+def iter_batches(
+    cache_dir: str,
+    table: str,
+    columns: list = None,
+    sabs=None,
+    filters: dict = None,
+):
+    """
+    Summary:
+    --------
+    Stream a cached table as pyarrow.RecordBatch objects.
+
+    Parameters:
+    -----------
+    cache_dir : str.
+        Root directory of the cache.
+    table : str.
+        Table name.
+    columns : list.
+        Columns to read (column projection) - all when None.
+    sabs : iterable.
+        Vocabularies to read (only those SAB partitions are opened).
+    filters : dict.
+        Column -> value (or list of values) equality filters pushed down to
+        the Parquet row groups.
+
+    """
+    dataset = open_dataset(cache_dir, table)
+    yield from dataset.to_batches(
+        columns=columns, filter=filter_expression(sabs, filters)
+    )
+
+
+def read_table(
+    cache_dir: str,
+    table: str,
+    columns: list = None,
+    sabs=None,
+    filters: dict = None,
+):
+    """
+    Summary:
+    --------
+    Read a cached table (see iter_batches() for parameters) into a
+    pandas.DataFrame - dictionary encoded columns are returned as str.
+
+    """
+    dataset = open_dataset(cache_dir, table)
+    df = dataset.to_table(
+        columns=columns, filter=filter_expression(sabs, filters)
+    ).to_pandas()
+    for col in df.columns:
+        if df[col].dtype.name == "category":
+            df[col] = df[col].astype(object)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--meta", default=umls_tables)
+    parser.add_argument("--cache", default=cache_dir)
+    parser.add_argument("--tables", nargs="*", default=list(CACHED_TABLES))
+    args = parser.parse_args()
+
+    build_cache(args.meta, args.cache, tuple(args.tables))
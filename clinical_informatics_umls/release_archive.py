@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Stream the tables of a UMLS release straight out of its archives/compressed
+files, without unpacking them to disk first.
+
+A release source is any combination of:
+    - directories holding .RRF/.pipe files, plain or compressed (.gz/.zst)
+    - zip archives (i.e. the 2022ab-1-meta.nlm & 2022ab-2-meta.nlm members of
+      umls-2022AB-full.zip, or a zip of a MetamorphoSys subset)
+Files split into parts (MRCONSO.RRF.aa.gz, MRCONSO.RRF.ab.gz, ...) are read
+part after part, in order, across every archive of the source. Zip archives
+nested within a zip (the .nlm members of the full release zip) are spooled to
+a temporary file first - their compressed size only - as zip members can only
+be opened from a seekable file.
+
+.zst files require zstandard (`poetry install -E zstd` or
+`pip install zstandard`).
+
+Example:
+--------
+from clinical_informatics_umls import rrf
+from clinical_informatics_umls.release_archive import ReleaseSource
+
+with ReleaseSource(["2022ab-1-meta.nlm", "2022ab-2-meta.nlm"]) as source:
+    for chunk in rrf.iter_block_chunks(source.iter_blocks("MRCONSO"), "MRCONSO"):
+        ...  # chunk -> list of MRCONSO row tuples
+
+"""
+
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from os.path import basename, isdir, join
+
+from clinical_informatics_umls import rrf
+
+# Bytes decompressed per block
+STREAM_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Archive members treated as nested zip archives
+NESTED_ARCHIVES = (".zip", ".nlm")
+
+# Compression suffixes (in order of preference when several are present)
+COMPRESSIONS = ("", ".gz", ".zst")
+
+# Tables not distributed within the release archives (semantic groups are
+# published separately) - skipped when absent
+OPTIONAL_TABLES = ("SRGRP",)
+
+
+def import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            "Reading .zst files requires zstandard -> `poetry install -E zstd` "
+            "or `pip install zstandard`"
+        )
+    return zstandard
+
+
+def member_pattern(name: str):
+    # MRCONSO.RRF, MRCONSO.RRF.gz, MRCONSO.RRF.aa.gz, MRCONSO.RRF.ab.zst, ...
+    return re.compile(rf"^{re.escape(name)}(\.[a-z]{{2}})?(\.gz|\.zst)?$")
+
+
+class ReleaseSource:
+    """
+    Index of the table files within release directories/archives.
+    """
+
+    def __init__(self, paths):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.archives = []
+        self.spooled = []
+        self.entries = {}  # file name -> opener of a binary stream
+        for path in self.paths:
+            if isdir(path):
+                self.scan_dir(path)
+            else:
+                self.scan_zip(zipfile.ZipFile(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for archive in self.archives:
+            archive.close()
+        for path in self.spooled:
+            os.remove(path)
+        self.archives, self.spooled = [], []
+
+    def add(self, name: str, opener):
+        # first occurrence of a file name wins
+        self.entries.setdefault(name, opener)
+
+    def scan_dir(self, path: str):
+        for root, _, files in os.walk(path):
+            for name in files:
+                full_path = join(root, name)
+                self.add(name, lambda full_path=full_path: open(full_path, "rb"))
+
+    def scan_zip(self, archive: zipfile.ZipFile):
+        self.archives.append(archive)
+        for info in archive.infolist():
+            name = basename(info.filename)
+            if info.is_dir() or not name:
+                continue
+            if name.lower().endswith(NESTED_ARCHIVES):
+                print(f"Spooling nested archive {name}")
+                with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as f:
+                    with archive.open(info) as member:
+                        shutil.copyfileobj(member, f, STREAM_BLOCK_BYTES)
+                self.spooled.append(f.name)
+                self.scan_zip(zipfile.ZipFile(f.name))
+            else:
+                self.add(name, lambda info=info: archive.open(info))
+
+    def members(self, table: str) -> list:
+        """
+        Summary:
+        --------
+        File names holding `table` in read order (parts sorted by suffix) -
+        empty when the source has none.
+
+        """
+        for name in rrf.RRF_FILE_NAMES.get(table, (f"{table}.RRF",)):
+            pattern = member_pattern(name)
+            matches = [m for m in map(pattern.match, self.entries) if m]
+            for compression in COMPRESSIONS:
+                parts = [m.string for m in matches if (m.group(2) or "") == compression]
+                if parts:
+                    return sorted(parts)
+        return []
+
+    def iter_blocks(self, table: str, block_bytes: int = STREAM_BLOCK_BYTES):
+        """
+        Summary:
+        --------
+        Yield the (decompressed) bytes of `table`, part after part, in blocks.
+
+        """
+        members = self.members(table)
+        if not members:
+            raise FileNotFoundError(f"No file to use for creating {table} table")
+        for name in members:
+            with self.entries[name]() as raw:
+                if name.endswith(".gz"):
+                    stream = gzip.GzipFile(fileobj=raw)
+                elif name.endswith(".zst"):
+                    stream = import_zstandard().ZstdDecompressor().stream_reader(raw)
+                else:
+                    stream = raw
+                with stream:
+                    for block in iter(lambda: stream.read(block_bytes), b""):
+                        yield block
+
+    def iter_chunks(
+        self, table: str, columns: tuple = None, chunk_size: int = rrf.CHUNK_SIZE
+    ):
+        """
+        Summary:
+        --------
+        Lazily yield the rows of `table` in chunks (see rrf.iter_block_chunks()).
+
+        """
+        yield from rrf.iter_block_chunks(
+            self.iter_blocks(table), table, columns, chunk_size
+        )
@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+"""
+Streaming reader for UMLS Rich Release Format (.RRF) files.
+
+Every .RRF (and Semantic Network SR*) file is a pipe delimited text file where
+each line is terminated by a trailing '|'. Files are memory-mapped and parsed
+block by block so that only one block of rows is materialized at a time, rather
+than the whole file (as with `pd.read_csv`).
+
+Column layouts follow the UMLS Reference Manual
+(https://www.ncbi.nlm.nih.gov/books/NBK9685/).
+
+Example:
+--------
+from clinical_informatics_umls import rrf
+
+for chunk in rrf.iter_chunks(
+    "../UMLS/subset/2022AA/META/MRHIER.RRF", "MRHIER", columns=("AUI", "PTR")
+):
+    ...  # chunk -> list of (AUI, PTR) tuples
+
+"""
+
+import mmap
+import os
+from operator import itemgetter
+from os.path import exists, join
+
+# Column order of each file as distributed by the NLM (MetamorphoSys output)
+RRF_COLUMNS = {
+    "MRSTY": ("CUI", "TUI", "STN", "STY", "ATUI", "CVF"),
+    "MRCONSO": (
+        "CUI",
+        "LAT",
+        "TS",
+        "LUI",
+        "STT",
+        "SUI",
+        "ISPREF",
+        "AUI",
+        "SAUI",
+        "SCUI",
+        "SDUI",
+        "SAB",
+        "TTY",
+        "CODE",
+        "STR",
+        "SRL",
+        "SUPPRESS",
+        "CVF",
+    ),
+    "MRREL": (
+        "CUI1",
+        "AUI1",
+        "STYPE1",
+        "REL",
+        "CUI2",
+        "AUI2",
+        "STYPE2",
+        "RELA",
+        "RUI",
+        "SRUI",
+        "SAB",
+        "SL",
+        "RG",
+        "DIR",
+        "SUPPRESS",
+        "CVF",
+    ),
+    "MRHIER": ("CUI", "AUI", "CXN", "PAUI", "SAB", "RELA", "PTR", "HCD", "CVF"),
+    "MRRANK": ("MRRANK_RANK", "SAB", "TTY", "SUPPRESS"),
+    "SRDEF": ("RT", "UI", "STY_RL", "STN_RTN", "DEF", "EX", "UN", "NH", "ABR", "RIN"),
+    "SRSTR": ("STY_RL1", "RL", "STY_RL2", "LS"),
+    "SRSTRE1": ("UI1", "UI2", "UI3"),
+    "SRSTRE2": ("STY1", "RL", "STY2"),
+    "MRSAB": (
+        "VCUI",
+        "RCUI",
+        "VSAB",
+        "RSAB",
+        "SON",
+        "SF",
+        "SVER",
+        "VSTART",
+        "VEND",
+        "IMETA",
+        "RMETA",
+        "SLC",
+        "SCC",
+        "SRL",
+        "TRF",
+        "CFR",
+        "CXTY",
+        "TTYL",
+        "ATNL",
+        "LAT",
+        "CENC",
+        "CURVER",
+        "SABIN",
+        "SSN",
+        "SCIT",
+    ),
+    "MRDEF": ("CUI", "AUI", "ATUI", "SATUI", "SAB", "DEF", "SUPPRESS", "CVF"),
+    "MRSAT": (
+        "CUI",
+        "LUI",
+        "SUI",
+        "METAUI",
+        "STYPE",
+        "CODE",
+        "ATUI",
+        "SATUI",
+        "ATN",
+        "SAB",
+        "ATV",
+        "SUPPRESS",
+        "CVF",
+    ),
+    "MRMAP": (
+        "MAPSETCUI",
+        "MAPSETSAB",
+        "MAPSUBSETID",
+        "MAPRANK",
+        "MAPID",
+        "MAPSID",
+        "FROMID",
+        "FROMSID",
+        "FROMEXPR",
+        "FROMTYPE",
+        "FROMRULE",
+        "FROMRES",
+        "REL",
+        "RELA",
+        "TOID",
+        "TOSID",
+        "TOEXPR",
+        "TOTYPE",
+        "TORULE",
+        "TORES",
+        "MAPRULE",
+        "MAPRES",
+        "MAPTYPE",
+        "MAPATN",
+        "MAPATV",
+        "CVF",
+    ),
+    "MRSMAP": (
+        "MAPSETCUI",
+        "MAPSETSAB",
+        "MAPID",
+        "MAPSID",
+        "FROMEXPR",
+        "FROMTYPE",
+        "REL",
+        "RELA",
+        "TOEXPR",
+        "TOTYPE",
+        "CVF",
+    ),
+    "SRGRP": ("STY_GROUP_ABBREV", "STY_GROUP", "TUI", "STY"),
+}
+
+# File names each table may be distributed under (in order of preference).
+# SR* files are copied from NET/ and are renamed *.pipe in later subsets.
+RRF_FILE_NAMES = {
+    "SRDEF": ("SRDEF.pipe", "SRDEF"),
+    "SRSTR": ("SRSTR.pipe", "SRSTR"),
+    "SRSTRE1": ("SRSTRE1.pipe", "SRSTRE1"),
+    "SRSTRE2": ("SRSTRE2.pipe", "SRSTRE2"),
+    "SRGRP": ("semantic_groups.pipe", "SemGroups.txt"),
+}
+
+# Rows per yielded chunk
+CHUNK_SIZE = 100000
+
+# Bytes of the memory-mapped file decoded at a time
+BLOCK_BYTES = 8 * 1024 * 1024
+
+
+def find_rrf(meta_dir: str, table: str) -> str:
+    """
+    Summary:
+    --------
+    Locate the file for `table` within a META directory.
+
+    Parameters:
+    -----------
+    meta_dir : str.
+        Directory containing the .RRF files (i.e. ../UMLS/subset/2022AA/META/)
+    table : str.
+        Table name (key of RRF_COLUMNS).
+
+    Returns:
+    --------
+    path : str.
+        Path to the file.
+
+    """
+    names = RRF_FILE_NAMES.get(table, (f"{table}.RRF",))
+    for name in names:
+        path = join(meta_dir, name)
+        if exists(path):
+            return path
+    raise FileNotFoundError(f"No file to use for creating {table} table in {meta_dir}")
+
+
+def byte_ranges(path: str, chunk_bytes: int) -> list:
+    """
+    Summary:
+    --------
+    Split a file into (start, end) byte ranges of roughly `chunk_bytes`, each
+    range beginning and ending on a line boundary.
+
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # advance to the end of the current line
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_lines(lines, table: str, columns: tuple = None) -> list:
+    """
+    Summary:
+    --------
+    Split .RRF lines into tuples, validating the number of fields.
+
+    Parameters:
+    -----------
+    lines : iterable of str.
+        Lines without their "\n" line terminator.
+    table : str.
+        Table name (key of RRF_COLUMNS).
+    columns : tuple.
+        Optional subset of RRF_COLUMNS[table] to project each row onto.
+
+    Returns:
+    --------
+    rows : list of tuples.
+
+    """
+    all_columns = RRF_COLUMNS[table]
+    n_columns = len(all_columns)
+    project = None
+    if columns is not None:
+        idx = [all_columns.index(col) for col in columns]
+        getter = itemgetter(*idx)
+        project = getter if len(idx) > 1 else (lambda fields: (getter(fields),))
+
+    rows = []
+    for line in lines:
+        line = line.rstrip("\r")
+        if not line:
+            continue
+        fields = line.split("|")
+        # lines are terminated with a trailing '|' (NLM's SemGroups.txt is not)
+        if len(fields) == n_columns + 1 and fields[-1] == "":
+            fields.pop()
+        if len(fields) != n_columns:
+            raise ValueError(
+                f"{table}: expected {n_columns} fields, found {len(fields)}: {line}"
+            )
+        rows.append(tuple(fields) if project is None else project(fields))
+    return rows
+
+
+def iter_chunks(
+    path: str,
+    table: str,
+    columns: tuple = None,
+    chunk_size: int = CHUNK_SIZE,
+    start: int = 0,
+    end: int = None,
+):
+    """
+    Summary:
+    --------
+    Memory-map an .RRF file and lazily yield its rows in chunks.
+
+    Parameters:
+    -----------
+    path : str.
+        Path to the .RRF/.pipe file.
+    table : str.
+        Table name (key of RRF_COLUMNS).
+    columns : tuple.
+        Optional subset of RRF_COLUMNS[table] to project each row onto.
+    chunk_size : int.
+        Maximum number of rows per chunk.
+    start, end : int.
+        Optional line aligned byte range of the file to read (see byte_ranges()).
+
+    Returns:
+    --------
+    Generator yielding lists of (at most `chunk_size`) tuples.
+
+    """
+    size = os.path.getsize(path)
+    end = size if end is None else min(end, size)
+    if start >= end:
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pending = []
+        pos = start
+        while pos < end:
+            stop = min(pos + BLOCK_BYTES, end)
+            if stop < end:
+                # extend the block to the end of the line it finishes within
+                newline = mm.find(b"\n", stop - 1, end)
+                stop = end if newline == -1 else newline + 1
+            # split on "\n" only - str.splitlines() would also break on
+            # unicode separators (i.e. U+0085) that occur within STR/DEF values
+            lines = mm[pos:stop].decode("utf-8").split("\n")
+            pos = stop
+
+            pending.extend(parse_lines(lines, table, columns))
+            while len(pending) >= chunk_size:
+                yield pending[:chunk_size]
+                pending = pending[chunk_size:]
+        if pending:
+            yield pending
+
+
+def iter_block_chunks(
+    blocks, table: str, columns: tuple = None, chunk_size: int = CHUNK_SIZE
+):
+    """
+    Summary:
+    --------
+    Lazily yield the rows of a table in chunks from an iterable of raw byte
+    blocks (i.e. decompressed blocks of an archived .RRF file, see
+    release_archive.py) - lines may span blocks.
+
+    Parameters:
+    -----------
+    blocks : iterable of bytes.
+    table : str.
+        Table name (key of RRF_COLUMNS).
+    columns : tuple.
+        Optional subset of RRF_COLUMNS[table] to project each row onto.
+    chunk_size : int.
+        Maximum number of rows per chunk.
+
+    Returns:
+    --------
+    Generator yielding lists of (at most `chunk_size`) tuples.
+
+    """
+    pending = []
+    tail = b""
+    for block in blocks:
+        data = tail + block
+        cut = data.rfind(b"\n")
+        if cut == -1:
+            tail = data
+            continue
+        tail = data[cut + 1 :]
+        pending.extend(
+            parse_lines(data[:cut].decode("utf-8").split("\n"), table, columns)
+        )
+        while len(pending) >= chunk_size:
+            yield pending[:chunk_size]
+            pending = pending[chunk_size:]
+    if tail:
+        pending.extend(parse_lines([tail.decode("utf-8")], table, columns))
+    while pending:
+        yield pending[:chunk_size]
+        pending = pending[chunk_size:]
+
+
+def iter_rows(path: str, table: str, columns: tuple = None, **kwargs):
+    """
+    Summary:
+    --------
+    Lazily yield each row (tuple) of an .RRF file - see iter_chunks().
+
+    """
+    for chunk in iter_chunks(path, table, columns, **kwargs):
+        yield from chunk
+
+
+def read_rows(path: str, table: str, start: int, end: int) -> list:
+    """
+    Summary:
+    --------
+    Read every row within a byte range into a single list (used by worker
+    processes in create_sqlite_db.parallel_insert()).
+
+    """
+    rows = []
+    for chunk in iter_chunks(path, table, start=start, end=end):
+        rows.extend(chunk)
+    return rows
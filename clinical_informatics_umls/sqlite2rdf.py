@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+"""
+Direct RDF export of the UMLS graph from umls_py.db (or from the node/edge
+.csv files of nodes_edges_part1.py) - no graph database involved.
+
+Rows are those of the graph import (see nodes_edges_part1.STREAM_OUTPUTS),
+each mapped onto triples:
+    - node files : <node> rdf:type <schema#Label> (one per :LABEL) &
+                   <node> <schema#COLUMN> "value" (one per property column)
+    - edge files : <start> <schema#:TYPE> <end>
+Node URIs only depend on UMLS identifiers (stable across releases & exports,
+unlike Neo4j internal ids), following the BioPortal/umls2rdf layout:
+    - Concept      : <BASE_URI>UMLS/<CUI>
+    - Atom         : <BASE_URI>UMLS/<AUI>
+    - Code         : <BASE_URI><SAB>/<CODE>
+    - SemanticType : <BASE_URI>STY/<TUI>
+
+Output is partitioned per predicate - <out_dir>/<predicate>/<source>.nt (or
+.ttl) - so every source (one query or .csv file) is converted by its own
+worker process without any two writing the same file.
+
+Invoke via:
+`python sqlite2rdf.py --db ../sqlite/umls_py.db --out ../output_data/rdf/ --workers 4`
+`python sqlite2rdf.py --csv-dir ../../../../import/ --format Turtle`
+"""
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from clinical_informatics_umls.create_sqlite_db import apply_pragmas
+from clinical_informatics_umls.nodes_edges_part1 import (
+    QUERIES,
+    STREAM_MEMORY_MB,
+    stream_jobs,
+    stream_settings,
+)
+
+db_path = "../sqlite/umls_py.db"
+rdf_dir = "../output_data/rdf/"
+
+BASE_URI = "http://purl.bioontology.org/ontology/"
+SCHEMA_URI = f"{BASE_URI}UMLS-graph#"
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+
+# Format -> file extension
+RDF_FORMATS = {"N-Triples": ".nt", "Turtle": ".ttl"}
+
+# Turtle prefixes (prefix -> namespace)
+TURTLE_PREFIXES = {
+    "umls": f"{BASE_URI}UMLS/",
+    "sty": f"{BASE_URI}STY/",
+    "schema": SCHEMA_URI,
+}
+
+# ID space of the :START_ID & :END_ID of each edge file
+EDGE_ENDPOINTS = {
+    "has_sty_rel.csv": ("Concept", "TUI"),
+    "has_aui_rel.csv": ("Code", "AUI"),
+    "has_cui_rel.csv": ("AUI", "Concept"),
+    "tui_tui_rel.csv": ("TUI", "TUI"),
+    "concept_concept_rel.csv": ("Concept", "Concept"),
+    "child_of_rel.csv": ("AUI", "AUI"),
+    "cui_code_rel.csv": ("Concept", "Code"),
+}
+
+# Rows converted per chunk
+RDF_CHUNK_SIZE = 100000
+
+LOCAL_NAME = re.compile(r"^[A-Za-z0-9_]+$")
+
+
+def node_uri(id_space: str, value: str) -> str:
+    """
+    Summary:
+    --------
+    Stable URI of a node from its ID space (header prefix of its :ID column)
+    & identifier (i.e. ("Code", "SNOMEDCT_US#73211009") ->
+    http://purl.bioontology.org/ontology/SNOMEDCT_US/73211009).
+
+    """
+    if id_space == "Code":
+        sab, _, code = value.partition("#")
+        return f"{BASE_URI}{quote(sab, safe='')}/{quote(code, safe='')}"
+    if id_space == "TUI":
+        return f"{BASE_URI}STY/{quote(value, safe='')}"
+    return f"{BASE_URI}UMLS/{quote(value, safe='')}"
+
+
+def literal(value: str) -> str:
+    escaped = (
+        value.replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+    return f'"{escaped}"'
+
+
+def term(uri: str, rdf_format: str) -> str:
+    """
+    Summary:
+    --------
+    IRI in N-Triples form, or as a prefixed name in Turtle when its local
+    part allows it.
+
+    """
+    if rdf_format == "Turtle":
+        if uri == RDF_TYPE:
+            return "a"
+        for prefix, namespace in TURTLE_PREFIXES.items():
+            local = uri[len(namespace) :]
+            if uri.startswith(namespace) and LOCAL_NAME.match(local):
+                return f"{prefix}:{local}"
+    return f"<{uri}>"
+
+
+def row_triples(file_name: str, header: list, row: tuple, rdf_format: str):
+    """
+    Summary:
+    --------
+    (predicate, triple line) of every triple of a node/edge row.
+
+    """
+    if file_name in EDGE_ENDPOINTS:
+        start_space, end_space = EDGE_ENDPOINTS[file_name]
+        start, end, rel_type = row[:3]
+        if start and end and rel_type:
+            subject = term(node_uri(start_space, start), rdf_format)
+            predicate = predicate_term(rel_type, rdf_format)
+            obj = term(node_uri(end_space, end), rdf_format)
+            yield rel_type, f"{subject} {predicate} {obj} .\n"
+        return
+
+    id_space = header[0].split(":")[0]
+    subject = term(node_uri(id_space, row[0]), rdf_format)
+    for column, value in zip(header[1:], row[1:]):
+        if column == ":LABEL":
+            predicate = term(RDF_TYPE, rdf_format)
+            for label in value.split(";"):
+                obj = term(f"{SCHEMA_URI}{quote(label, safe='')}", rdf_format)
+                yield "type", f"{subject} {predicate} {obj} .\n"
+        elif value:
+            predicate = predicate_term(column, rdf_format)
+            yield column, f"{subject} {predicate} {literal(value)} .\n"
+
+
+def predicate_term(name: str, rdf_format: str) -> str:
+    return term(f"{SCHEMA_URI}{quote(name, safe='')}", rdf_format)
+
+
+def convert_rows(
+    chunks, file_name: str, header: list, out_dir: str, source: str, rdf_format: str
+) -> dict:
+    """
+    Summary:
+    --------
+    Write the triples of an iterable of row chunks to the per predicate
+    partitions <out_dir>/<predicate>/<source><ext>.
+
+    Returns:
+    --------
+    triples : dict.
+        Predicate -> number of triples written.
+
+    """
+    files, counts = {}, {}
+    try:
+        for chunk in chunks:
+            lines = {}
+            for row in chunk:
+                for predicate, line in row_triples(file_name, header, row, rdf_format):
+                    lines.setdefault(predicate, []).append(line)
+            for predicate, triples in lines.items():
+                if predicate not in files:
+                    directory = os.path.join(
+                        out_dir, re.sub(r"[^A-Za-z0-9_]", "_", predicate)
+                    )
+                    os.makedirs(directory, exist_ok=True)
+                    path = os.path.join(directory, source + RDF_FORMATS[rdf_format])
+                    files[predicate] = open(path, "w", encoding="utf-8")
+                    if rdf_format == "Turtle":
+                        files[predicate].writelines(
+                            f"@prefix {prefix}: <{namespace}> .\n"
+                            for prefix, namespace in TURTLE_PREFIXES.items()
+                        )
+                files[predicate].writelines(triples)
+                counts[predicate] = counts.get(predicate, 0) + len(triples)
+    finally:
+        for f in files.values():
+            f.close()
+    return counts
+
+
+def iter_query(conn: sqlite3.Connection, sql: str, chunk_rows: int):
+    cursor = conn.execute(sql)
+    while True:
+        chunk = cursor.fetchmany(chunk_rows)
+        if not chunk:
+            break
+        yield chunk
+    cursor.close()
+
+
+def iter_csv(path: str, chunk_rows: int):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader)  # header
+        while True:
+            chunk = [row for _, row in zip(range(chunk_rows), reader)]
+            if not chunk:
+                break
+            yield chunk
+
+
+def csv_header(path: str) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return next(csv.reader(f))
+
+
+def convert_source(
+    task: tuple, out_dir: str, rdf_format: str, db: str, memory_limit_mb: int
+) -> dict:
+    """
+    Summary:
+    --------
+    Convert one source - an export query over its own read-only connection to
+    `db`, or a node/edge .csv file (sql is None) - within a worker process.
+
+    """
+    file_name, source, header, sql, path = task
+    if sql is None:
+        return convert_rows(
+            iter_csv(path, RDF_CHUNK_SIZE),
+            file_name,
+            header,
+            out_dir,
+            source,
+            rdf_format,
+        )
+    conn = sqlite3.connect(f"file:{os.path.abspath(db)}?mode=ro", uri=True)
+    pragmas, chunk_rows = stream_settings(memory_limit_mb)
+    apply_pragmas(conn, pragmas)
+    try:
+        chunks = iter_query(conn, sql, min(chunk_rows, RDF_CHUNK_SIZE))
+        return convert_rows(chunks, file_name, header, out_dir, source, rdf_format)
+    finally:
+        conn.close()
+
+
+def rdf_tasks(db: str = None, csv_dir: str = None, queries: dict = QUERIES) -> list:
+    """
+    Summary:
+    --------
+    (file name, source name, header, sql, csv path) of every source - the
+    export queries of nodes_edges_part1.stream_jobs() (including the ICD-O-3
+    appends) when converting from `db`, the node/edge .csv files of `csv_dir`
+    otherwise.
+
+    """
+    if csv_dir is not None:
+        tasks = []
+        for file_name in sorted(os.listdir(csv_dir)):
+            path = os.path.join(csv_dir, file_name)
+            if not file_name.endswith(".csv"):
+                continue
+            header = csv_header(path)
+            if file_name in EDGE_ENDPOINTS or header[0].endswith(":ID"):
+                tasks.append((file_name, file_name[:-4], header, None, path))
+        return tasks
+
+    jobs, appends = stream_jobs(queries)
+    headers = {file_name: header for file_name, _, header in jobs}
+    tasks = [
+        (file_name, file_name[:-4], header, sql, None)
+        for file_name, sql, header in jobs
+    ]
+    tasks.extend(
+        (file_name, f"{file_name[:-4]}_icdo3", headers[file_name], sql, None)
+        for file_name, sql, _ in appends
+    )
+    return tasks
+
+
+def sqlite_to_rdf(
+    db: str = db_path,
+    out_dir: str = rdf_dir,
+    csv_dir: str = None,
+    rdf_format: str = "N-Triples",
+    workers: int = 4,
+    memory_limit_mb: int = STREAM_MEMORY_MB,
+) -> dict:
+    """
+    Summary:
+    --------
+    Convert the UMLS graph to per predicate partitioned RDF files (see module
+    docstring), one worker process per source.
+
+    Parameters:
+    -----------
+    db : str.
+        Path to the sqlite3 database (umls_py.db).
+    out_dir : str.
+        Output directory.
+    csv_dir : str.
+        Directory of node/edge .csv files to convert instead of querying `db`.
+    rdf_format : str.
+        "N-Triples" or "Turtle".
+    workers : int.
+        Number of worker processes.
+    memory_limit_mb : int.
+        Memory ceiling (MiB) of the sqlite3 queries, shared evenly between the
+        workers.
+
+    Returns:
+    --------
+    triples : dict.
+        Predicate -> number of triples written.
+
+    """
+    if rdf_format not in RDF_FORMATS:
+        raise ValueError(f"rdf_format must be one of {list(RDF_FORMATS)}")
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = rdf_tasks(db, csv_dir)
+    per_worker = max(1, memory_limit_mb // workers)
+    totals = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(
+                convert_source, task, out_dir, rdf_format, db, per_worker
+            ): task[1]
+            for task in tasks
+        }
+        for future, source in futures.items():
+            counts = future.result()
+            print(f"{source}: {sum(counts.values())} triples")
+            for predicate, count in counts.items():
+                totals[predicate] = totals.get(predicate, 0) + count
+    print(f"{sum(totals.values())} triples written to {out_dir}")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--csv-dir", default=None)
+    parser.add_argument("--out", default=rdf_dir)
+    parser.add_argument("--format", default="N-Triples", choices=list(RDF_FORMATS))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--memory-limit-mb", type=int, default=STREAM_MEMORY_MB)
+    args = parser.parse_args()
+
+    sqlite_to_rdf(
+        args.db,
+        args.out,
+        csv_dir=args.csv_dir,
+        rdf_format=args.format,
+        workers=args.workers,
+        memory_limit_mb=args.memory_limit_mb,
+    )
@@ -0,0 +1,555 @@
+#!/usr/bin/env python
+"""
+Generate a synthetic, schema-correct UMLS release (META directory of .RRF &
+.pipe files) at any scale - no UMLS license required. Every file loaded by
+create_sqlite_db.py is written in the column order of rrf.RRF_COLUMNS, so the
+whole pipeline (create_db, extract_nodes_edges, create_nodes_edges, edges_part2
+...) can be run & benchmarked against it (see benchmark.py).
+
+The content is random (seeded, hence reproducible) but shaped after a full
+release:
+    - concepts hold 1 + Poisson(ATOMS_PER_CUI - 1) atoms, drawn from the
+      sources of SAB_MIX (mostly from one "home" source per concept), atoms of
+      the same concept & source sharing a code
+    - every atom of a source of HIER_BRANCHING has an MRHIER row, sources
+      forming trees of the given branching factor - PTR depth grows as
+      log(atoms of the source) / log(branching)
+    - MRREL holds Geometric(1 / REL_FANOUT) relationships per concept (plus
+      their inverse), targets skewed towards a few hub concepts
+      (REL_HUB_SKEW)
+
+Invoke via:
+`python synthetic_release.py --atoms 1000000 --out ../UMLS/synthetic/META/ --seed 0`
+"""
+
+import argparse
+import itertools
+import os
+from array import array
+
+import numpy as np
+
+from clinical_informatics_umls import rrf
+
+synthetic_dir = "../UMLS/synthetic/META/"
+
+# Approximate share of atoms per source (rounded from a full release) -
+# sources outside of nodes_edges_part1.sab_list are included, so the SAB/LAT
+# filters of the pipeline have rows to drop
+SAB_MIX = {
+    "SNOMEDCT_US": 0.10,
+    "NCI": 0.05,
+    "RXNORM": 0.06,
+    "ATC": 0.002,
+    "HGNC": 0.03,
+    "ICD10CM": 0.02,
+    "ICD9CM": 0.01,
+    "GO": 0.02,
+    "MSH": 0.06,
+    "LNC": 0.10,
+    "MDR": 0.07,
+    "MEDCIN": 0.10,
+    "NCBI": 0.15,
+    "OMIM": 0.02,
+    "SCTSPA": 0.07,
+    "MSHSPA": 0.05,
+    "MSHFRE": 0.04,
+}
+
+# Language of the sources not in English
+SAB_LAT = {"SCTSPA": "SPA", "MSHSPA": "SPA", "MSHFRE": "FRE"}
+
+# Branching factor of the hierarchy of each source with MRHIER rows
+HIER_BRANCHING = {
+    "SNOMEDCT_US": 3,
+    "NCI": 4,
+    "ATC": 5,
+    "ICD10CM": 8,
+    "ICD9CM": 8,
+    "GO": 3,
+    "MSH": 6,
+    "MDR": 10,
+    "MEDCIN": 8,
+    "SCTSPA": 3,
+    "MSHSPA": 6,
+    "MSHFRE": 6,
+}
+
+# Mean atoms per concept
+ATOMS_PER_CUI = 3.5
+
+# Probability of an atom coming from the "home" source of its concept
+HOME_SAB_SHARE = 0.6
+
+# Mean relationships per concept (each written along with its inverse)
+REL_FANOUT = 4
+
+# Exponent skewing relationship targets towards low concept ids (hubs)
+REL_HUB_SKEW = 3.0
+
+# (REL, inverse REL, RELA, inverse RELA, weight) of MRREL rows
+REL_TYPES = (
+    ("PAR", "CHD", "isa", "inverse_isa", 0.3),
+    ("RO", "RO", "has_finding_site", "finding_site_of", 0.3),
+    ("RB", "RN", "", "", 0.15),
+    ("SIB", "SIB", "", "", 0.15),
+    ("SY", "SY", "", "", 0.1),
+)
+
+# SUPPRESS values & their weights
+SUPPRESS = {"N": 0.94, "O": 0.04, "E": 0.01, "Y": 0.01}
+
+# Number of semantic types (TUIs T001, ...) & of semantic groups
+SEMANTIC_TYPES = 127
+SEMANTIC_GROUPS = 15
+
+# Share of atoms with a definition (MRDEF) & with an attribute (MRSAT)
+DEF_SHARE = 0.15
+SAT_SHARE = 0.2
+
+# Share of NCI atoms with an ICD-O-3_CODE attribute
+ICDO_SHARE = 0.1
+
+# Table of each file written
+TABLES = {
+    f"{table}.RRF": table
+    for table in (
+        "MRCONSO",
+        "MRHIER",
+        "MRDEF",
+        "MRSAT",
+        "MRSTY",
+        "MRREL",
+        "MRRANK",
+        "MRSAB",
+    )
+}
+TABLES.update(
+    {f"{table}.pipe": table for table in ("SRDEF", "SRSTR", "SRSTRE1", "SRSTRE2")}
+)
+TABLES["semantic_groups.pipe"] = "SRGRP"
+
+# Concepts generated per chunk
+CUI_CHUNK = 10000
+
+SYLLABLES = (
+    "ab ac ad al am an ar as at ba be bi bo ca ce ci co cu da de di do du "
+    "el em en er es ex fa fe fi fo ga ge gi go ha he hi ho hy id il im in io "
+    "is it la le li lo lu ma me mi mo mu na ne ni no nu ob oc ol om on op or "
+    "os ox pa pe pi po pu ra re ri ro ru sa se si so su ta te ti to tu ul um "
+    "un ur va ve vi vo"
+).split()
+
+
+def pseudo_words(rng: np.random.Generator, n: int = 4096) -> list:
+    lengths = rng.integers(2, 6, n)
+    picks = rng.integers(0, len(SYLLABLES), (n, 5))
+    return ["".join(SYLLABLES[i] for i in row[:k]) for row, k in zip(picks, lengths)]
+
+
+def weighted(mapping: dict) -> tuple:
+    keys = list(mapping)
+    weights = np.array([mapping[key] for key in keys], dtype=float)
+    return keys, weights / weights.sum()
+
+
+class RRFWriter:
+    """
+    Pipe delimited writers of the META files (rows terminated by '|').
+    """
+
+    def __init__(self, meta_dir: str):
+        self.meta_dir = meta_dir
+        self.files = {}
+        self.rows = {}
+
+    def write(self, name: str, rows: list):
+        table = TABLES[name]
+        if rows and len(rows[0]) != len(rrf.RRF_COLUMNS[table]):
+            raise ValueError(
+                f"{name}: {len(rows[0])} fields instead of {len(rrf.RRF_COLUMNS[table])}"
+            )
+        if name not in self.files:
+            self.files[name] = open(
+                os.path.join(self.meta_dir, name), "w", encoding="utf-8"
+            )
+            self.rows[name] = 0
+        self.files[name].write("".join("|".join(row) + "|\n" for row in rows))
+        self.rows[name] += len(rows)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def semantic_network(writer: RRFWriter) -> list:
+    """
+    Summary:
+    --------
+    Write a semantic network of SEMANTIC_TYPES types (an isa tree of
+    branching factor 4) - SRDEF, SRSTR, SRSTRE1, SRSTRE2 & semantic groups.
+
+    Returns:
+    --------
+    types : list.
+        (TUI, STY, STN) of every semantic type.
+
+    """
+    types = []
+    for k in range(SEMANTIC_TYPES):
+        path, j = [], k
+        while j > 0:
+            path.append(str((j - 1) % 4 + 1))
+            j = (j - 1) // 4
+        stn = ".".join(["A1"] + path[::-1])
+        types.append((f"T{k + 1:03d}", f"Semantic Type {k + 1}", stn))
+    isa = (
+        "RL",
+        "T186",
+        "isa",
+        "H",
+        "The basic hierarchical link",
+        "",
+        "",
+        "",
+        "IS",
+        "inverse_isa",
+    )
+    writer.write(
+        "SRDEF.pipe",
+        [
+            ("STY", tui, sty, stn, f"Definition of {sty}", "", "", "", tui, "")
+            for tui, sty, stn in types
+        ]
+        + [isa],
+    )
+    edges = [(types[k], types[(k - 1) // 4]) for k in range(1, SEMANTIC_TYPES)]
+    writer.write("SRSTR.pipe", [(c[1], "isa", p[1], "D") for c, p in edges])
+    writer.write("SRSTRE1.pipe", [(c[0], "T186", p[0]) for c, p in edges])
+    writer.write("SRSTRE2.pipe", [(c[1], "isa", p[1]) for c, p in edges])
+    writer.write(
+        "semantic_groups.pipe",
+        [
+            (f"GRP{k % SEMANTIC_GROUPS:02d}", f"Group {k % SEMANTIC_GROUPS}", tui, sty)
+            for k, (tui, sty, _) in enumerate(types)
+        ],
+    )
+    return types
+
+
+def generate_release(
+    out_dir: str = synthetic_dir, atoms: int = 10000, seed: int = 0
+) -> dict:
+    """
+    Summary:
+    --------
+    Write a synthetic release of (about) `atoms` MRCONSO rows to `out_dir`
+    (see module docstring). Memory use is bounded by CUI_CHUNK concepts, plus
+    4 bytes per atom of the sources of HIER_BRANCHING (AUIs of the trees).
+
+    Parameters:
+    -----------
+    out_dir : str.
+        META directory written to (created when missing).
+    atoms : int.
+        Number of atoms (MRCONSO rows).
+    seed : int.
+        Seed of the random generator.
+
+    Returns:
+    --------
+    rows : dict.
+        File name -> number of rows written.
+
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    words = pseudo_words(rng)
+    sabs, sab_p = weighted(SAB_MIX)
+    n_sabs = len(sabs)
+    suppress, suppress_p = weighted(SUPPRESS)
+    branching = [HIER_BRANCHING.get(sab, 0) for sab in sabs]
+    trees = [array("I") for _ in sabs]  # AUI numbers of each source tree
+    code_counts = np.zeros(n_sabs, dtype=np.int64)
+    atuis = itertools.count(1)  # attribute ids (MRSTY, MRDEF & MRSAT)
+    writer = RRFWriter(out_dir)
+    types = semantic_network(writer)
+
+    written, n_cui = 0, 0
+    while written < atoms:
+        # concepts & their atoms
+        counts = 1 + rng.poisson(ATOMS_PER_CUI - 1, CUI_CHUNK)
+        cum = np.cumsum(counts)
+        keep = min(int(np.searchsorted(cum, atoms - written)) + 1, CUI_CHUNK)
+        counts = counts[:keep]
+        counts[-1] -= max(0, int(counts.sum()) - (atoms - written))
+        n = int(counts.sum())
+        cuis = np.arange(n_cui, n_cui + keep)
+        cui_of = np.repeat(cuis, counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        pos = np.arange(n) - first
+        home = rng.choice(n_sabs, keep, p=sab_p)
+        sab_of = np.where(
+            rng.random(n) < HOME_SAB_SHARE,
+            np.repeat(home, counts),
+            rng.choice(n_sabs, n, p=sab_p),
+        )
+
+        # one code per (concept, source) - numbered per source
+        pairs, first_of_pair, pair_of = np.unique(
+            cui_of * n_sabs + sab_of, return_index=True, return_inverse=True
+        )
+        pair_sab = pairs % n_sabs
+        order = np.argsort(pair_sab, kind="stable")
+        rank = np.empty(len(pairs), dtype=np.int64)
+        sorted_sab = pair_sab[order]
+        starts = np.searchsorted(sorted_sab, np.arange(n_sabs))
+        rank[order] = np.arange(len(pairs)) - starts[sorted_sab]
+        pair_code = code_counts[pair_sab] + rank
+        code_counts += np.bincount(pair_sab, minlength=n_sabs)
+        code_of = pair_code[pair_of]
+        is_pt = np.zeros(n, dtype=bool)
+        is_pt[first_of_pair] = True
+
+        aui_of = np.arange(written + 1, written + n + 1)
+        preferred = pos == 0
+        ts = np.where(preferred | (rng.random(n) < 0.3), "P", "S")
+        stt = np.where(preferred | (rng.random(n) < 0.7), "PF", "VO")
+        ispref = np.where(preferred | (rng.random(n) < 0.5), "Y", "N")
+        supp = np.array(suppress)[rng.choice(len(suppress), n, p=suppress_p)]
+        n_words = rng.integers(1, 6, n)
+        picks = rng.integers(0, len(words), (n, 5))
+
+        conso, hier, defs, sats = [], [], [], []
+        def_draw, sat_draw = rng.random(n), rng.random(n)
+        for i in range(n):
+            s = sab_of[i]
+            sab = sabs[s]
+            cui = f"C{cui_of[i] + 1:07d}"
+            aui = f"A{aui_of[i]:07d}"
+            code = f"{sab[:3]}{code_of[i]:06d}"
+            text = " ".join(words[w] for w in picks[i, : n_words[i]])
+            lat = SAB_LAT.get(sab, "ENG")
+            conso.append(
+                (
+                    cui,
+                    lat,
+                    ts[i],
+                    f"L{aui_of[i]:07d}",
+                    stt[i],
+                    f"S{aui_of[i]:07d}",
+                    ispref[i],
+                    aui,
+                    "",
+                    code,
+                    "",
+                    sab,
+                    "PT" if is_pt[i] else "SY",
+                    code,
+                    text,
+                    "0",
+                    supp[i],
+                    "",
+                )
+            )
+            if branching[s]:
+                tree = trees[s]
+                j, ptr = len(tree), []
+                tree.append(int(aui_of[i]))
+                while j > 0:
+                    j = (j - 1) // branching[s]
+                    ptr.append(f"A{tree[j]:07d}")
+                hier.append(
+                    (
+                        cui,
+                        aui,
+                        "1",
+                        ptr[0] if ptr else "",
+                        sab,
+                        "isa",
+                        ".".join(ptr[::-1]),
+                        "",
+                        "",
+                    )
+                )
+            if def_draw[i] < DEF_SHARE:
+                defs.append(
+                    (
+                        cui,
+                        aui,
+                        f"AT{next(atuis):08d}",
+                        "",
+                        sab,
+                        f"Definition of {text}",
+                        "N",
+                        "",
+                    )
+                )
+            if sab == "NCI" and sat_draw[i] < ICDO_SHARE:
+                atv = f"{8000 + code_of[i] % 1000:04d}/{code_of[i] % 4}"
+                sats.append(
+                    (
+                        cui,
+                        "",
+                        "",
+                        aui,
+                        "AUI",
+                        code,
+                        f"AT{next(atuis):08d}",
+                        "",
+                        "ICD-O-3_CODE",
+                        sab,
+                        atv,
+                        "N",
+                        "",
+                    )
+                )
+            elif sat_draw[i] < SAT_SHARE:
+                sats.append(
+                    (
+                        cui,
+                        "",
+                        "",
+                        aui,
+                        "AUI",
+                        code,
+                        f"AT{next(atuis):08d}",
+                        "",
+                        "SOURCE_ATTR",
+                        sab,
+                        text[:20],
+                        "N",
+                        "",
+                    )
+                )
+        writer.write("MRCONSO.RRF", conso)
+        writer.write("MRHIER.RRF", hier)
+        writer.write("MRDEF.RRF", defs)
+        writer.write("MRSAT.RRF", sats)
+
+        # semantic types (1, sometimes 2 per concept - skewed towards few types)
+        n_types = 1 + (rng.random(keep) < 0.2)
+        sty_cui = np.repeat(cuis, n_types)
+        sty = np.minimum(
+            (SEMANTIC_TYPES * rng.random(len(sty_cui)) ** 2).astype(int),
+            SEMANTIC_TYPES - 1,
+        )
+        writer.write(
+            "MRSTY.RRF",
+            [
+                (
+                    f"C{c + 1:07d}",
+                    types[t][0],
+                    types[t][2],
+                    types[t][1],
+                    f"AT{next(atuis):08d}",
+                    "",
+                )
+                for c, t in zip(sty_cui, sty)
+            ],
+        )
+        written += n
+        n_cui += keep
+
+    # relationships, once the number of concepts is known
+    rel_p = np.array([rel[-1] for rel in REL_TYPES])
+    rel_p /= rel_p.sum()
+    rui = 0
+    for chunk_start in range(0, n_cui, CUI_CHUNK):
+        cuis = np.arange(chunk_start, min(chunk_start + CUI_CHUNK, n_cui))
+        fanout = rng.geometric(1 / REL_FANOUT, len(cuis)) - 1
+        sources = np.repeat(cuis, fanout)
+        targets = (n_cui * rng.random(len(sources)) ** REL_HUB_SKEW).astype(int)
+        mask = sources != targets
+        sources, targets = sources[mask], targets[mask]
+        kinds = rng.choice(len(REL_TYPES), len(sources), p=rel_p)
+        rel_sabs = rng.choice(n_sabs, len(sources), p=sab_p)
+        rel_supp = np.array(suppress)[
+            rng.choice(len(suppress), len(sources), p=suppress_p)
+        ]
+        rels = []
+        for a, b, k, s, sup in zip(sources, targets, kinds, rel_sabs, rel_supp):
+            rel, inverse, rela, inverse_rela, _ = REL_TYPES[k]
+            cui1, cui2 = f"C{a + 1:07d}", f"C{b + 1:07d}"
+            for x, y, r, ra in (
+                (cui1, cui2, rel, rela),
+                (cui2, cui1, inverse, inverse_rela),
+            ):
+                rui += 1
+                rels.append(
+                    (
+                        x,
+                        "",
+                        "CUI",
+                        r,
+                        y,
+                        "",
+                        "CUI",
+                        ra,
+                        f"R{rui:08d}",
+                        "",
+                        sabs[s],
+                        sabs[s],
+                        "",
+                        "",
+                        sup,
+                        "",
+                    )
+                )
+        writer.write("MRREL.RRF", rels)
+
+    ranked = [(sab, tty) for sab in sabs for tty in ("PT", "SY")]
+    writer.write(
+        "MRRANK.RRF",
+        [
+            (f"{len(ranked) - k:04d}", sab, tty, "N")
+            for k, (sab, tty) in enumerate(ranked)
+        ],
+    )
+    writer.write(
+        "MRSAB.RRF",
+        [
+            (
+                f"C{9000000 + k:07d}",
+                f"C{9100000 + k:07d}",
+                f"{sab}_SYNTHETIC",
+                sab,
+                f"Synthetic {sab}",
+                sab,
+                "SYNTHETIC",
+                "",
+                "",
+                "",
+                "",
+                "0",
+                "0",
+                "0",
+                "",
+                str(int(code_counts[k])),
+                "",
+                "PT,SY",
+                "",
+                SAB_LAT.get(sab, "ENG"),
+                "UTF-8",
+                "Y",
+                "Y",
+                "",
+                "",
+            )
+            for k, sab in enumerate(sabs)
+        ],
+    )
+    writer.close()
+    for name, rows in writer.rows.items():
+        print(f"{name}: {rows} rows")
+    return dict(writer.rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--atoms", type=int, default=10000)
+    parser.add_argument("--out", default=synthetic_dir)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate_release(args.out, args.atoms, args.seed)
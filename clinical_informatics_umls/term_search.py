@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Optional FTS5 full-text index over MRCONSO.STR & MRDEF.DEF.
+
+`build_fts()` (create_db(fts=True) or `python term_search.py`) creates:
+    - MRCONSO_FTS : STR (indexed, with 2 & 3 character prefix indexes) along
+      with CUI, SAB, TTY, LAT & whether the atom is the preferred term
+    - MRDEF_FTS   : DEF (indexed) along with CUI & SAB
+Both store their own copy of the text, so they work for the compact schema
+(compact_sqlite_db.py) where MRCONSO/MRDEF are views without a rowid.
+
+`search()` resolves a term to CUIs, preferred terms ranked first and then by
+bm25, optionally filtered by SAB/TTY/LAT.
+
+Example:
+--------
+from clinical_informatics_umls import term_search
+
+conn = sqlite3.connect("../sqlite/umls_py.db")
+term_search.search(conn, "diab mell", sabs=["SNOMEDCT_US"])  # prefix search
+term_search.search(conn, "heart attack", mode="phrase")
+"""
+
+import argparse
+import re
+import sqlite3
+import time
+
+db_path = "../sqlite/umls_py.db"
+
+# FTS5 tokenizer (case & diacritic insensitive)
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+# Weight of a definition (MRDEF) match relative to a term (MRCONSO) match
+DEFINITION_WEIGHT = 0.5
+
+# Match modes of search()
+SEARCH_MODES = ("prefix", "phrase", "raw")
+
+
+def build_fts(conn: sqlite3.Connection, suppressed: bool = False):
+    """
+    Summary:
+    --------
+    (Re)build MRCONSO_FTS & MRDEF_FTS from the loaded MRCONSO & MRDEF tables.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    suppressed : bool.
+        Also index suppressible atoms/definitions (SUPPRESS != 'N').
+
+    """
+    start = time.perf_counter()
+    # committed here unless run within the caller's transaction
+    owned = not conn.in_transaction
+    where = "" if suppressed else "WHERE SUPPRESS = 'N'"
+    conn.execute("DROP TABLE IF EXISTS MRCONSO_FTS;")
+    conn.execute(
+        f"""CREATE VIRTUAL TABLE MRCONSO_FTS USING fts5(
+            STR,
+            CUI UNINDEXED,
+            SAB UNINDEXED,
+            TTY UNINDEXED,
+            LAT UNINDEXED,
+            PREF UNINDEXED,
+            tokenize = '{FTS_TOKENIZER}',
+            prefix = '2 3'
+        );"""
+    )
+    conn.execute(
+        f"""INSERT INTO MRCONSO_FTS( STR, CUI, SAB, TTY, LAT, PREF )
+        SELECT STR, CUI, SAB, TTY, LAT, (TS = 'P' AND STT = 'PF' AND ISPREF = 'Y')
+        FROM MRCONSO {where};"""
+    )
+    conn.execute("DROP TABLE IF EXISTS MRDEF_FTS;")
+    conn.execute(
+        f"""CREATE VIRTUAL TABLE MRDEF_FTS USING fts5(
+            DEF,
+            CUI UNINDEXED,
+            SAB UNINDEXED,
+            tokenize = '{FTS_TOKENIZER}'
+        );"""
+    )
+    conn.execute(
+        f"INSERT INTO MRDEF_FTS( DEF, CUI, SAB ) SELECT DEF, CUI, SAB FROM MRDEF {where};"
+    )
+    for table in ("MRCONSO_FTS", "MRDEF_FTS"):
+        conn.execute(f"INSERT INTO {table}( {table} ) VALUES( 'optimize' );")
+    if owned:
+        conn.commit()
+    print(f"\tFTS5 indexes built ({time.perf_counter() - start:.2f}s)")
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    (count,) = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'MRCONSO_FTS';"
+    ).fetchone()
+    return bool(count)
+
+
+def match_expression(text: str, mode: str = "prefix") -> str:
+    """
+    Summary:
+    --------
+    FTS5 MATCH expression of a search string.
+        - prefix : every word as a prefix ('diab mell' -> '"diab"* "mell"*')
+        - phrase : the words as a phrase ('"heart attack"')
+        - raw    : `text` as is (full FTS5 query syntax)
+
+    """
+    if mode == "raw":
+        return text
+    words = re.findall(r"\w+", text)
+    if not words:
+        raise ValueError(f"Nothing to search for in {text!r}")
+    if mode == "prefix":
+        return " ".join(f'"{word}"*' for word in words)
+    if mode == "phrase":
+        return '"' + " ".join(words) + '"'
+    raise ValueError(f"mode must be one of {SEARCH_MODES}")
+
+
+def search(
+    conn: sqlite3.Connection,
+    text: str,
+    sabs: list = None,
+    ttys: list = None,
+    lat: str = "ENG",
+    limit: int = 20,
+    mode: str = "prefix",
+    definitions: bool = False,
+) -> list:
+    """
+    Summary:
+    --------
+    Search MRCONSO_FTS (& optionally MRDEF_FTS) for `text`.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    text : str.
+        Search string (see match_expression()).
+    sabs, ttys : list.
+        Optional vocabularies/term types to restrict atoms to.
+    lat : str.
+        Language of the atoms (None for any).
+    limit : int.
+        Maximum number of CUIs returned.
+    mode : str.
+        "prefix", "phrase" or "raw" (see match_expression()).
+    definitions : bool.
+        Also match definitions (scored with DEFINITION_WEIGHT).
+
+    Returns:
+    --------
+    results : list.
+        (CUI, matched string, score) tuples - CUIs with a matching preferred
+        term first, then by descending score (-bm25).
+
+    """
+    match = match_expression(text, mode)
+    filters, params = [], [match]
+    for col, values in (("SAB", sabs), ("TTY", ttys)):
+        if values:
+            filters.append(f"AND {col} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+    if lat:
+        filters.append("AND LAT = ?")
+        params.append(lat)
+
+    matches = f"""
+        SELECT CUI, STR, PREF, -bm25(MRCONSO_FTS) AS SCORE
+        FROM MRCONSO_FTS
+        WHERE MRCONSO_FTS MATCH ? {' '.join(filters)}"""
+    if definitions:
+        matches += f"""
+        UNION ALL
+        SELECT CUI, DEF, 0, -bm25(MRDEF_FTS) * {DEFINITION_WEIGHT}
+        FROM MRDEF_FTS
+        WHERE MRDEF_FTS MATCH ?"""
+        params.append(match)
+        if sabs:
+            matches += f" AND SAB IN ({', '.join('?' * len(sabs))})"
+            params.extend(sabs)
+
+    # best match of each CUI (its preferred term when that matched)
+    return conn.execute(
+        f"""SELECT CUI, STR, SCORE
+        FROM (
+            SELECT CUI, STR, PREF, SCORE, ROW_NUMBER() OVER (
+                PARTITION BY CUI ORDER BY PREF DESC, SCORE DESC
+            ) AS N
+            FROM ({matches})
+        )
+        WHERE N = 1
+        ORDER BY PREF DESC, SCORE DESC
+        LIMIT ?;""",
+        (*params, limit),
+    ).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--suppressed", action="store_true")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    build_fts(conn, args.suppressed)
+    conn.close()
@@ -1,55 +1,357 @@
 #! /usr/bin/env python3
+"""
+Download a UMLS release file (i.e. umls-2022AB-full.zip) from the UTS.
+
+The file is split into byte ranges (PART_SIZE) fetched concurrently over one
+pooled session & written in place into <name>.part. Completed ranges are
+recorded within <name>.part.json, so an interrupted download resumes with the
+ranges still missing (as long as the remote file's size & ETag did not
+change). Once complete, the file is verified against an optional MD5/SHA
+checksum & renamed to <name>. Servers not accepting range requests are
+downloaded as a single stream.
+
+Invoke via:
+`python umls_downloader.py --url https://download.nlm.nih.gov/umls/kss/2022AB/umls-2022AB-full.zip --apikey <UMLS API KEY> --checksum md5:<hex digest>`
+"""
 
 import argparse
+import hashlib
+import json
 import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import requests
 from lxml import html as lhtml
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 
+# Bytes per streamed chunk
+CHUNK_SIZE = 512 * 1024
 
-def download_umls_full(__doc__):
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--url", default=None, required=True)
-    parser.add_argument("--apikey", default=None, required=True)
-    args = parser.parse_args()
+# Bytes per byte range (unit of resumption)
+PART_SIZE = 64 * 1024 * 1024
 
-    # Obtain a Ticket Granting Ticket - (TGT)
-    session = requests.session()
-    response = requests.post(
-        "https://utslogin.nlm.nih.gov/cas/v1/api-key",
-        data={"apikey": args.apikey},
+# Concurrent range requests
+DOWNLOAD_WORKERS = 8
+
+# Seconds without data before a request is abandoned
+REQUEST_TIMEOUT = 60
+
+# Attempts per byte range (a body cut short mid-stream is not retried by the
+# session's Retry)
+PART_RETRIES = 3
+
+# Supported checksum algorithms (i.e. "md5:<hex digest>")
+CHECKSUM_ALGORITHMS = ("md5", "sha1", "sha256", "sha512")
+
+
+def pooled_session(workers: int = DOWNLOAD_WORKERS) -> requests.Session:
+    """
+    Summary:
+    --------
+    Session with a connection pool sized for `workers` concurrent requests,
+    retrying failed connections & 5xx responses with backoff.
+
+    """
+    session = requests.Session()
+    retry = Retry(
+        total=5,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=("HEAD", "GET", "POST"),
     )
+    adapter = HTTPAdapter(
+        pool_connections=workers, pool_maxsize=workers, max_retries=retry
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
 
-    # Extract the TGT
+def service_ticket(session: requests.Session, apikey: str, url: str) -> str:
+    """
+    Summary:
+    --------
+    Obtain a Ticket Granting Ticket (TGT) & a single use Service Ticket (ST)
+    for `url` from the UTS.
+
+    """
+    response = session.post(
+        "https://utslogin.nlm.nih.gov/cas/v1/api-key",
+        data={"apikey": apikey},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
     doc = lhtml.fromstring(response.text)
-    print(doc)
     TGT = doc.xpath("//form/@action")[0]
+    r = session.post(TGT, data={"service": url}, timeout=REQUEST_TIMEOUT)
+    r.raise_for_status()
+    return r.text
 
-    # Obtain a Service Ticket (ST)
-    r = session.post(TGT, data={"service": args.url})
-    ST = r.text
 
-    print(f"Ticket Granting Ticket - TGT: {TGT}")
-    print(f"Service Ticket (ST):          {ST}")
-    print(f"URL: {args.url}")
+def probe(session: requests.Session, url: str) -> tuple:
+    """
+    Summary:
+    --------
+    Resolve redirects of `url` with a single byte range request.
+
+    Returns:
+    --------
+    (final url, size in bytes, whether ranges are accepted, ETag)
+
+    """
+    r = session.get(
+        url, headers={"Range": "bytes=0-0"}, stream=True, timeout=REQUEST_TIMEOUT
+    )
+    r.raise_for_status()
+    r.close()
+    etag = r.headers.get("ETag", "")
+    content_range = r.headers.get("Content-Range", "")
+    if r.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        if total != "*":
+            return r.url, int(total), True, etag
+    return r.url, int(r.headers.get("Content-Length", 0)), False, etag
+
+
+def plan_parts(size: int, part_size: int) -> list:
+    return [
+        [start, min(start + part_size, size) - 1] for start in range(0, size, part_size)
+    ]
+
+
+def load_state(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
 
-    # Step 3 - Download release file
-    r = session.get(f"{args.url}?ticket={ST}", stream=True)
-    size = int(r.headers.get("length", 0))
+
+def save_state(path: str, state: dict):
+    # written to a temporary file & renamed, so the state is never partial
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def fetch_part(
+    session: requests.Session,
+    url: str,
+    part_path: str,
+    start: int,
+    end: int,
+    progress: tqdm,
+    lock: threading.Lock,
+):
+    """
+    Summary:
+    --------
+    Fetch bytes [start, end] of `url` & write them in place into `part_path`,
+    retrying failed or truncated responses up to PART_RETRIES times.
+
+    """
+    for attempt in range(1, PART_RETRIES + 1):
+        written = 0
+        try:
+            r = session.get(
+                url,
+                headers={"Range": f"bytes={start}-{end}"},
+                stream=True,
+                timeout=REQUEST_TIMEOUT,
+            )
+            r.raise_for_status()
+            if r.status_code != 206:
+                r.close()
+                raise IOError(
+                    f"Range bytes={start}-{end} not honoured ({r.status_code})"
+                )
+            with open(part_path, "r+b") as f:
+                f.seek(start)
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+                    with lock:
+                        progress.update(len(chunk))
+            if written != end - start + 1:
+                raise IOError(f"Range bytes={start}-{end} truncated ({written} bytes)")
+            return
+        except IOError as e:
+            # requests' exceptions (i.e. ChunkedEncodingError) are IOErrors
+            with lock:
+                progress.update(-written)
+            if attempt == PART_RETRIES:
+                raise
+            print(f"Range bytes={start}-{end} failed ({e}), retrying")
+
+
+def verify_checksum(path: str, checksum: str):
+    """
+    Summary:
+    --------
+    Raise a ValueError unless the digest of `path` matches `checksum`
+    ("<algorithm>:<hex digest>").
+
+    """
+    algorithm, _, expected = checksum.partition(":")
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS or not expected:
+        raise ValueError(
+            f"checksum must be <algorithm>:<hex digest> ({CHECKSUM_ALGORITHMS})"
+        )
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE * 16), b""):
+            digest.update(block)
+    if digest.hexdigest().lower() != expected.lower():
+        raise ValueError(
+            f"{algorithm} mismatch for {path}: {digest.hexdigest()} != {expected}"
+        )
+    print(f"{algorithm} verified: {expected}")
+
+
+def download_file(
+    session: requests.Session,
+    url: str,
+    out_path: str,
+    workers: int = DOWNLOAD_WORKERS,
+    part_size: int = PART_SIZE,
+    checksum: str = None,
+) -> str:
+    """
+    Summary:
+    --------
+    Resumable, parallel ranged download of `url` (see module docstring).
+
+    Parameters:
+    -----------
+    session : requests.Session.
+        Session (see pooled_session()) - authenticated/ticketed as required.
+    url : str.
+        File url.
+    out_path : str.
+        Destination path.
+    workers : int.
+        Concurrent range requests.
+    part_size : int.
+        Bytes per range.
+    checksum : str.
+        Optional "<algorithm>:<hex digest>" verified once downloaded.
+
+    Returns:
+    --------
+    out_path : str.
+
+    """
+    part_path = f"{out_path}.part"
+    state_path = f"{part_path}.json"
+    url, size, ranged, etag = probe(session, url)
     print(f"Total size {size/1e+9:2.2f} GB")
 
-    with open(os.path.basename(args.url), "wb") as outfile:
-        with tqdm(
-            total=size / (512 * 1024.0),
-            unit="B",
-            unit_scale=True,
-            unit_divisor=1024,
-        ) as progress_bar:
-            for chunk in r.iter_content(chunk_size=512 * 1024):
-                if chunk:  # filter out keep-alive new chunks
-                    outfile.write(chunk)
-                    progress_bar.update(len(chunk))
+    state = load_state(state_path)
+    fresh = {"size": size, "etag": etag, "part_size": part_size}
+    if (
+        not ranged
+        or not os.path.exists(part_path)
+        or {key: state.get(key) for key in fresh} != fresh
+    ):
+        state = dict(fresh, done=[])
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+    elif state["done"]:
+        print(f"Resuming {part_path} ({len(state['done'])} parts done)")
+    save_state(state_path, state)
+
+    parts = plan_parts(size, part_size)
+    done = set(state["done"])
+    done_bytes = sum(
+        end - start + 1 for i, (start, end) in enumerate(parts) if i in done
+    )
+    lock = threading.Lock()
+    with tqdm(
+        total=size, initial=done_bytes, unit="B", unit_scale=True, unit_divisor=1024
+    ) as progress:
+        if not ranged:
+            r = session.get(url, stream=True, timeout=REQUEST_TIMEOUT)
+            r.raise_for_status()
+            with open(part_path, "wb") as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    progress.update(len(chunk))
+        else:
+            # at most 2 * workers ranges are submitted at once - on failure,
+            # the ranges in flight are finished & recorded as done, the
+            # others left to the resumed download
+            queue = [i for i in reversed(range(len(parts))) if i not in done]
+            running, error = {}, None
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                while queue or running:
+                    while queue and len(running) < 2 * workers:
+                        i = queue.pop()
+                        start, end = parts[i]
+                        future = executor.submit(
+                            fetch_part,
+                            session,
+                            url,
+                            part_path,
+                            start,
+                            end,
+                            progress,
+                            lock,
+                        )
+                        running[future] = i
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        i = running.pop(future)
+                        if future.exception() is not None:
+                            error = error or future.exception()
+                            continue
+                        state["done"].append(i)
+                        save_state(state_path, state)
+                    if error is not None:
+                        queue = []
+                        for future in [f for f in running if f.cancel()]:
+                            running.pop(future)
+            if error is not None:
+                raise error
+
+    if checksum:
+        verify_checksum(part_path, checksum)
+    os.replace(part_path, out_path)
+    os.remove(state_path)
+    print(f"{out_path} downloaded")
+    return out_path
+
+
+def download_umls_full(__doc__):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=None, required=True)
+    parser.add_argument("--apikey", default=None)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--checksum", default=None, help="i.e. md5:<hex digest>")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS)
+    parser.add_argument("--part-size-mb", type=int, default=PART_SIZE // 2**20)
+    args = parser.parse_args()
+
+    session = pooled_session(args.workers)
+    url = args.url
+    if args.apikey:
+        # the ticket is redeemed by probe(), later range requests reuse the
+        # redirected url & session cookies
+        ST = service_ticket(session, args.apikey, args.url)
+        print(f"Service Ticket (ST):          {ST}")
+        url = f"{args.url}?ticket={ST}"
+    print(f"URL: {args.url}")
+
+    download_file(
+        session,
+        url,
+        args.out or os.path.basename(args.url),
+        workers=args.workers,
+        part_size=args.part_size_mb * 2**20,
+        checksum=args.checksum,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+"""
+Upgrade an existing umls_py.db (created via `create_sqlite_db.py`) to a newer
+UMLS release in place, rather than deleting it and running `create_db()` from
+scratch.
+
+Rows of each large table are matched between the loaded database and the new
+release's .RRF files on their natural key (i.e. MRCONSO.AUI, MRREL.RUI,
+MRSAT.ATUI, MRSTY.CUI + TUI). A hash of every row is kept within the
+UMLS_ROW_HASH table, so only rows that were inserted, deleted or changed are
+written. Small tables (MRSAB, MRRANK, SR*) are simply reloaded.
+
+The whole upgrade - tables, the rebuilt MRHIER_CLOSURE/FTS/FUZZY_* tables
+& the recorded release - is a single transaction, so a failure (i.e. a
+malformed row) leaves the database entirely on its previous release.
+
+Invoke via:
+`python upgrade_sqlite_db.py --meta ../UMLS/subset/2022AB/META/`
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import sys
+import time
+
+if not sys.warnoptions:
+    import warnings
+
+    warnings.simplefilter("ignore")
+
+from clinical_informatics_umls import rrf
+from clinical_informatics_umls.compact_sqlite_db import is_compact
+from clinical_informatics_umls.fuzzy_match import build_fuzzy_index, fuzzy_index_config
+from clinical_informatics_umls.hierarchy_closure import build_closure, closure_sabs
+from clinical_informatics_umls.term_search import build_fts, has_fts
+from clinical_informatics_umls.working_set import drop_working_sets
+from clinical_informatics_umls.create_sqlite_db import (
+    apply_pragmas,
+    record_release,
+    release_from_path,
+)
+
+db_path = "../sqlite/umls_py.db"
+umls_tables = "../UMLS/subset/2022AB/META/"
+
+# Columns identifying a row across releases
+NATURAL_KEYS = {
+    "MRCONSO": ("AUI",),
+    "MRREL": ("RUI",),
+    "MRSAT": ("ATUI",),
+    "MRSTY": ("CUI", "TUI"),
+    "MRDEF": ("ATUI",),
+    "MRHIER": ("AUI", "CXN"),
+}
+
+# Tables small enough to be deleted and reloaded on every upgrade
+RELOADED_TABLES = ("MRRANK", "SRDEF", "SRSTR", "SRSTRE1", "SRSTRE2", "MRSAB", "SRGRP")
+
+# PRAGMAs applied for the duration of an upgrade
+UPGRADE_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -1048576,  # negative value -> KiB (i.e. 1 GiB)
+    "temp_store": "FILE",
+}
+
+# Rows per executemany() call
+BATCH_SIZE = 100000
+
+KEY_SEPARATOR = "|"
+
+
+def row_hash(*values) -> bytes:
+    """
+    Summary:
+    --------
+    128 bit digest of a row. Registered as the `umls_row_hash` SQL function so
+    rows already loaded hash identically to rows read from the .RRF files.
+
+    """
+    return hashlib.md5("\x1f".join(values).encode("utf-8")).digest()
+
+
+def key_expression(key: tuple) -> str:
+    return f" || '{KEY_SEPARATOR}' || ".join(key)
+
+
+def index_existing_rows(conn: sqlite3.Connection, table: str):
+    """
+    Summary:
+    --------
+    Populate UMLS_ROW_HASH for a table loaded via create_db() (first upgrade
+    only - later upgrades keep UMLS_ROW_HASH current).
+
+    """
+    indexed = conn.execute(
+        "SELECT 1 FROM UMLS_ROW_HASH WHERE TBL = ? LIMIT 1;", (table,)
+    ).fetchone()
+    if indexed:
+        return
+    columns = ", ".join(rrf.RRF_COLUMNS[table])
+    print(f"\tHashing rows of {table} loaded by create_db() (first upgrade only)")
+    conn.execute(
+        f"""INSERT OR REPLACE INTO UMLS_ROW_HASH( TBL, KEY, HASH )
+        SELECT ?, {key_expression(NATURAL_KEYS[table])}, umls_row_hash({columns})
+        FROM {table};""",
+        (table,),
+    )
+
+
+def upgrade_table(conn: sqlite3.Connection, table: str, path: str) -> dict:
+    """
+    Summary:
+    --------
+    Apply the difference between a table and its .RRF file from a new release.
+
+    The file is streamed twice: first to hash every row into a temporary
+    table which is compared against UMLS_ROW_HASH, then to insert the rows
+    whose key is new or whose hash changed. Deleted and changed rows are
+    removed from the table beforehand (i.e. updates are delete + insert).
+    Runs within the caller's transaction (see upgrade_db()).
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+        Connection with the `umls_row_hash` function registered.
+    table : str.
+        Table name (key of NATURAL_KEYS).
+    path : str.
+        Path to the table's .RRF file within the new release.
+
+    Returns:
+    --------
+    counts : dict.
+        Number of rows inserted, deleted & updated.
+
+    """
+    columns = rrf.RRF_COLUMNS[table]
+    key_idx = [columns.index(col) for col in NATURAL_KEYS[table]]
+
+    def key_of(row):
+        return KEY_SEPARATOR.join(row[i] for i in key_idx)
+
+    index_existing_rows(conn, table)
+
+    # 1. hash the new release
+    conn.execute("DROP TABLE IF EXISTS temp.NEW_HASH;")
+    conn.execute(
+        "CREATE TEMP TABLE NEW_HASH( KEY varchar PRIMARY KEY, HASH blob ) WITHOUT ROWID;"
+    )
+    for chunk in rrf.iter_chunks(path, table, chunk_size=BATCH_SIZE):
+        conn.executemany(
+            "INSERT OR REPLACE INTO temp.NEW_HASH( KEY, HASH ) VALUES( ?, ? );",
+            [(key_of(row), row_hash(*row)) for row in chunk],
+        )
+
+    # 2. classify keys
+    conn.execute("DROP TABLE IF EXISTS temp.DELTA;")
+    conn.execute(
+        "CREATE TEMP TABLE DELTA( KEY varchar PRIMARY KEY, OP varchar ) WITHOUT ROWID;"
+    )
+    conn.execute(
+        """INSERT INTO temp.DELTA( KEY, OP )
+        SELECT o.KEY, 'D' FROM UMLS_ROW_HASH o
+        WHERE o.TBL = ? AND NOT EXISTS (SELECT 1 FROM temp.NEW_HASH n WHERE n.KEY = o.KEY);""",
+        (table,),
+    )
+    conn.execute(
+        """INSERT INTO temp.DELTA( KEY, OP )
+        SELECT n.KEY, CASE WHEN o.KEY IS NULL THEN 'I' ELSE 'U' END
+        FROM temp.NEW_HASH n
+        LEFT JOIN UMLS_ROW_HASH o ON o.TBL = ? AND o.KEY = n.KEY
+        WHERE o.KEY IS NULL OR o.HASH != n.HASH;""",
+        (table,),
+    )
+    counts = dict(
+        conn.execute("SELECT OP, COUNT(*) FROM temp.DELTA GROUP BY OP;").fetchall()
+    )
+
+    # 3. remove deleted & changed rows
+    if counts.get("D") or counts.get("U"):
+        conn.execute(
+            f"""DELETE FROM {table} WHERE {key_expression(NATURAL_KEYS[table])} IN
+            (SELECT KEY FROM temp.DELTA WHERE OP IN ('D', 'U'));"""
+        )
+        conn.execute(
+            """DELETE FROM UMLS_ROW_HASH WHERE TBL = ? AND KEY IN
+            (SELECT KEY FROM temp.DELTA WHERE OP = 'D');""",
+            (table,),
+        )
+
+    # 4. insert new & changed rows
+    if counts.get("I") or counts.get("U"):
+        changed = {
+            key
+            for (key,) in conn.execute(
+                "SELECT KEY FROM temp.DELTA WHERE OP IN ('I', 'U');"
+            )
+        }
+        insert = f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );"
+        for chunk in rrf.iter_chunks(path, table, chunk_size=BATCH_SIZE):
+            conn.executemany(insert, [row for row in chunk if key_of(row) in changed])
+        conn.execute(
+            """INSERT OR REPLACE INTO UMLS_ROW_HASH( TBL, KEY, HASH )
+            SELECT ?, n.KEY, n.HASH FROM temp.NEW_HASH n
+            JOIN temp.DELTA d ON d.KEY = n.KEY AND d.OP IN ('I', 'U');""",
+            (table,),
+        )
+
+    conn.execute("DROP TABLE temp.NEW_HASH;")
+    conn.execute("DROP TABLE temp.DELTA;")
+    return {
+        "inserted": counts.get("I", 0),
+        "deleted": counts.get("D", 0),
+        "updated": counts.get("U", 0),
+    }
+
+
+def reload_table(conn: sqlite3.Connection, table: str, path: str) -> int:
+    """
+    Summary:
+    --------
+    Replace the contents of a (small) table with its .RRF file (within the
+    caller's transaction).
+
+    """
+    columns = rrf.RRF_COLUMNS[table]
+    insert = f"INSERT INTO {table}( {', '.join(columns)} ) VALUES( {', '.join('?' * len(columns))} );"
+    rows = 0
+    conn.execute(f"DELETE FROM {table};")
+    for chunk in rrf.iter_chunks(path, table, chunk_size=BATCH_SIZE):
+        conn.executemany(insert, chunk)
+        rows += len(chunk)
+    return rows
+
+
+def upgrade_db(db_path: str, umls_tables: str, release: str = None) -> dict:
+    """
+    Summary:
+    --------
+    Incrementally upgrade umls_py.db to the release found in `umls_tables`.
+
+    Parameters:
+    -----------
+    db_path : str.
+        Path to the existing sqlite3 database (umls_py.db).
+    umls_tables : str.
+        META directory of the new release (i.e. ../UMLS/subset/2022AB/META/).
+    release : str.
+        Release recorded within UMLS_METADATA (inferred from `umls_tables` when
+        not provided).
+
+    Returns:
+    --------
+    summary : dict.
+        Table name -> counts of rows inserted/deleted/updated (or reloaded).
+
+    """
+    release = release or release_from_path(umls_tables)
+    # every file is located before the first write, so a release missing one
+    # fails without leaving the database on a mix of two releases
+    paths = {
+        table: rrf.find_rrf(umls_tables, table)
+        for table in list(NATURAL_KEYS) + list(RELOADED_TABLES)
+    }
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    compacted = [table for table in NATURAL_KEYS if is_compact(conn, table)]
+    if compacted:
+        raise ValueError(
+            f"{db_path} uses the compact schema ({compacted}) - rebuild it via create_db()"
+        )
+    conn.create_function("umls_row_hash", -1, row_hash, deterministic=True)
+    apply_pragmas(conn, UPGRADE_PRAGMAS)
+    conn.execute("BEGIN;")
+    try:
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS UMLS_ROW_HASH(
+                TBL varchar,
+                KEY varchar,
+                HASH blob,
+                PRIMARY KEY (TBL, KEY)
+            ) WITHOUT ROWID;"""
+        )
+        previous = None
+        try:
+            previous = conn.execute(
+                "SELECT VALUE FROM UMLS_METADATA WHERE KEY = 'release';"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            pass  # database created before UMLS_METADATA existed
+        print(f"Upgrading {db_path}: {previous[0] if previous else '?'} -> {release}")
+
+        summary = {}
+        for table in NATURAL_KEYS:
+            start = time.perf_counter()
+            summary[table] = upgrade_table(conn, table, paths[table])
+            print(f"\t{table}: {summary[table]} ({time.perf_counter() - start:.2f}s)")
+
+        for table in RELOADED_TABLES:
+            summary[table] = {"reloaded": reload_table(conn, table, paths[table])}
+            print(f"\t{table}: {summary[table]}")
+
+        drop_working_sets(conn)
+        rebuilt = closure_sabs(conn)
+        if rebuilt:
+            build_closure(conn, rebuilt)
+        if has_fts(conn):
+            build_fts(conn)
+        fuzzy_config = fuzzy_index_config(conn)
+        if fuzzy_config:
+            build_fuzzy_index(conn, fuzzy_config["sabs"], fuzzy_config["lat"])
+        conn.execute("ANALYZE;")
+        record_release(conn, release)
+        conn.execute("COMMIT;")
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK;")
+        conn.close()
+        raise
+    conn.close()
+    print(f"\n{db_path} upgraded to {release}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--meta", default=umls_tables)
+    parser.add_argument("--release", default=None)
+    args = parser.parse_args()
+
+    upgrade_db(args.db, args.meta, args.release)
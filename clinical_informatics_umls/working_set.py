@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Materialized working set of the vocabulary/language/suppression filter applied
+by the extraction queries (nodes_edges_part1.py).
+
+Rather than re-evaluating `SAB IN (...) AND SUPPRESS = 'N' AND LAT = 'ENG'`
+against the full MRCONSO within every query, the filtered atoms are written
+once into indexed tables:
+    - WS_<key>_ATOM : filtered MRCONSO atoms (AUI, CUI, SAB, CODE, STR, ...)
+    - WS_<key>_CUI  : distinct CUIs of those atoms
+    - WS_<key>_CODE : distinct SAB#CODE keys of those atoms
+    - WS_<key>_SAB  : distinct SABs of those atoms
+where <key> is a hash of the filter configuration & of the load/upgrade time
+of the database (UMLS_METADATA), so repeated exports with the same vocabulary
+selection reuse the tables while a rebuilt or upgraded database does not.
+Working sets are registered within the UMLS_WORKING_SET table.
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+
+# Prefix of every working set table
+WS_PREFIX = "WS_"
+
+# Columns of MRCONSO kept within WS_<key>_ATOM
+ATOM_COLUMNS = ("AUI", "CUI", "SAB", "CODE", "STR", "TTY", "ISPREF", "TS", "STT")
+
+
+def filter_config(sabs, lat: str = "ENG", suppress: str = "N") -> dict:
+    return {"sabs": sorted(sabs), "lat": lat, "suppress": suppress}
+
+
+def database_version(conn: sqlite3.Connection) -> str:
+    """
+    Summary:
+    --------
+    Release & load/upgrade time recorded by create_db()/upgrade_db() within
+    UMLS_METADATA ('' for databases created before UMLS_METADATA existed).
+
+    """
+    try:
+        rows = conn.execute(
+            "SELECT KEY, VALUE FROM UMLS_METADATA WHERE KEY IN ('release', 'updated') ORDER BY KEY;"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return ""
+    return "/".join(str(value) for _, value in rows)
+
+
+def working_set_key(config: dict, version: str = "") -> str:
+    payload = json.dumps({"filter": config, "version": version}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
+
+
+def working_set_tables(key: str) -> dict:
+    return {
+        name: f"{WS_PREFIX}{key}_{name.upper()}"
+        for name in ("atom", "cui", "code", "sab")
+    }
+
+
+def materialize_working_set(
+    conn: sqlite3.Connection, sabs, lat: str = "ENG", suppress: str = "N"
+) -> dict:
+    """
+    Summary:
+    --------
+    Create (or reuse) the working set tables of a filter configuration.
+
+    Parameters:
+    -----------
+    conn : sqlite3.Connection.
+    sabs : iterable.
+        Vocabularies (MRCONSO.SAB) to keep.
+    lat : str.
+        Language (MRCONSO.LAT) to keep.
+    suppress : str.
+        Suppression flag (MRCONSO.SUPPRESS) to keep.
+
+    Returns:
+    --------
+    tables : dict.
+        "atom", "cui", "code" & "sab" -> table name (for str.format() of the
+        extraction query templates).
+
+    """
+    config = filter_config(sabs, lat, suppress)
+    key = working_set_key(config, database_version(conn))
+    tables = working_set_tables(key)
+
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS UMLS_WORKING_SET(
+            KEY varchar PRIMARY KEY,
+            CONFIG varchar,
+            CREATED varchar
+        ) ;"""
+    )
+    (registered,) = conn.execute(
+        "SELECT COUNT(*) FROM UMLS_WORKING_SET WHERE KEY = ?;", (key,)
+    ).fetchone()
+    if registered:
+        print(f"Reusing working set {key}")
+        return tables
+
+    start = time.perf_counter()
+    sab_params = ", ".join("?" * len(config["sabs"]))
+    columns = ", ".join(ATOM_COLUMNS)
+    conn.execute(f"DROP TABLE IF EXISTS {tables['atom']};")
+    conn.execute(
+        f"""CREATE TABLE {tables['atom']}(
+            AUI varchar PRIMARY KEY,
+            {', '.join(f'{col} varchar' for col in ATOM_COLUMNS[1:])}
+        ) WITHOUT ROWID;"""
+    )
+    conn.execute(
+        f"""INSERT OR IGNORE INTO {tables['atom']}( {columns} )
+        SELECT {columns} FROM MRCONSO
+        WHERE SAB IN ({sab_params}) AND SUPPRESS = ? AND LAT = ?;""",
+        (*config["sabs"], suppress, lat),
+    )
+    conn.execute(f"CREATE INDEX {tables['atom']}_CUI ON {tables['atom']} (CUI, STR);")
+    derived = {
+        "cui": ("CUI varchar PRIMARY KEY", "CUI", "CUI"),
+        "code": (
+            "CODE_ID varchar PRIMARY KEY, SAB varchar, CODE varchar",
+            "CODE_ID, SAB, CODE",
+            "SAB || '#' || CODE, SAB, CODE",
+        ),
+        "sab": ("SAB varchar PRIMARY KEY", "SAB", "SAB"),
+    }
+    for name, (definition, insert_columns, select) in derived.items():
+        conn.execute(f"DROP TABLE IF EXISTS {tables[name]};")
+        conn.execute(f"CREATE TABLE {tables[name]}( {definition} ) WITHOUT ROWID;")
+        conn.execute(
+            f"""INSERT OR IGNORE INTO {tables[name]}( {insert_columns} )
+            SELECT {select} FROM {tables['atom']};"""
+        )
+    conn.execute(
+        "INSERT INTO UMLS_WORKING_SET( KEY, CONFIG, CREATED ) VALUES( ?, ?, ? );",
+        (key, json.dumps(config), time.strftime("%Y-%m-%dT%H:%M:%S")),
+    )
+    conn.commit()
+    print(f"Working set {key} created ({time.perf_counter() - start:.2f}s)")
+    return tables
+
+
+def drop_working_sets(conn: sqlite3.Connection):
+    """
+    Summary:
+    --------
+    Drop every working set (i.e. after the underlying tables changed).
+
+    """
+    try:
+        keys = [key for (key,) in conn.execute("SELECT KEY FROM UMLS_WORKING_SET;")]
+    except sqlite3.OperationalError:
+        return  # no working set was ever created
+    for key in keys:
+        for table in working_set_tables(key).values():
+            conn.execute(f"DROP TABLE IF EXISTS {table};")
+    conn.execute("DELETE FROM UMLS_WORKING_SET;")